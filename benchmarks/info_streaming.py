@@ -0,0 +1,116 @@
+"""
+Benchmark de /info con buzón grande: lectura completa (`State.update`)
+frente a lectura en streaming (`State.stream_update`). Mide el tiempo
+hasta tener la primera carta, el tiempo total y el pico de memoria
+(tracemalloc) contra un servidor local que envía el cuerpo por trozos.
+
+Uso: python -m benchmarks.info_streaming --cartas 5000
+"""
+
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from src.config import configure
+from src.game_state import State
+
+
+def _info(cartas: int) -> bytes:
+    buzon = {
+        f"id{i:06d}": {
+            "remi": f"agente{i % 50}",
+            "dest": "bench",
+            "asunto": f"Oferta {i}",
+            "cuerpo": "Te propongo intercambiar 1 madera que necesito por 1 piedra que te ofrezco. " * 4,
+            "id": f"id{i:06d}",
+            "fecha": f"2026-01-01T00:00:{i % 60:02d}",
+        }
+        for i in range(cartas)
+    }
+    # Mismo orden de campos que documenta api_doc.txt para /info.
+    info = {
+        "Alias": ["bench"],
+        "Buzon": buzon,
+        "Recursos": {"madera": 4, "piedra": 9, "oro": 2},
+        "Objetivo": {"madera": 8, "piedra": 2, "oro": 2},
+    }
+    return json.dumps(info, ensure_ascii=False).encode()
+
+
+class _FakeGame(BaseHTTPRequestHandler):
+    cuerpo = b""
+    trozo = 16 * 1024
+    pausa = 0.0005
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.cuerpo)))
+        self.end_headers()
+        # Cuerpo por trozos con una pequeña pausa: simula una red lenta.
+        for i in range(0, len(self.cuerpo), self.trozo):
+            self.wfile.write(self.cuerpo[i:i + self.trozo])
+            time.sleep(self.pausa)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def _nuevo_estado() -> State:
+    return State(alias="", inventario={}, objetivo={}, needs={}, surplus={}, buzon={})
+
+
+def medir(streaming: bool) -> Dict[str, Any]:
+    state = _nuevo_estado()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    primera = None
+    n = 0
+    if streaming:
+        for _ in state.stream_update():
+            if primera is None:
+                primera = time.perf_counter() - inicio
+            n += 1
+    else:
+        state.update()
+        for _ in state.buzon.items():
+            if primera is None:
+                primera = time.perf_counter() - inicio
+            n += 1
+    total = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "cartas": n,
+        "primera_carta_ms": round((primera or total) * 1000, 1),
+        "total_ms": round(total * 1000, 1),
+        "pico_memoria_mb": round(pico / 2**20, 2),
+        "estado_completo": bool(state.inventario) and not state.pendientes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lectura de /info completa frente a streaming")
+    parser.add_argument("--cartas", type=int, default=5000)
+    args = parser.parse_args()
+
+    _FakeGame.cuerpo = _info(args.cartas)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGame)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    configure(api_base=f"http://127.0.0.1:{server.server_address[1]}")
+
+    resultado = {
+        "tamano_cuerpo_mb": round(len(_FakeGame.cuerpo) / 2**20, 2),
+        "completa": medir(streaming=False),
+        "streaming": medir(streaming=True),
+    }
+    server.shutdown()
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark de regresión de la compactación de prompts: compara el prompt
+original de analizar_carta (carta completa en JSON con sangría) con el
+compacto de `src.prompts` sobre un conjunto fijo de cartas etiquetadas.
+
+Por defecto usa el modelo de Ollama configurado (`model`, `FDI_MODEL` o
+`--modelo`); `--fake` usa el LLM determinista del simulador, sin Ollama.
+
+Uso:
+  python -m benchmarks.prompt_compaction              # Ollama, modelo configurado
+  python -m benchmarks.prompt_compaction --modelo M   # Ollama, otro modelo
+  python benchmarks/prompt_compaction.py --fake       # LLM determinista
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+if not __package__:
+    # Lanzado como fichero: `src` se importa desde la raíz del repositorio.
+    sys.path.insert(0, str(ROOT))
+
+from src.config import configure, get_config  # noqa: E402
+from src.letters import ANALIZAR_CARTA_JSON_SCHEMA  # noqa: E402
+from src.ollama_client import generate  # noqa: E402
+from src.prompts import build_prompt_carta, count_tokens  # noqa: E402
+from src.simulator import DeterministicLLM  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "cartas.jsonl"
+
+NEEDS = {"piedra": 2, "tela": 1, "trigo": 2}
+SURPLUS = {"madera": 3, "lana": 1, "hierro": 2}
+
+
+def build_prompt_carta_original(
+    carta_dict: Dict[str, Any], needs: Dict[str, Any], surplus: Dict[str, int]
+) -> str:
+    """Prompt de analizar_carta tal y como estaba antes de la compactación."""
+    return f"""
+Eres un asistente que ayuda a interpretar cartas de intercambio de recursos
+entre agentes en un juego.
+
+Tu tarea es LEER la carta y devolver un JSON estructurado con esta forma:
+
+{{
+  "tipo": "oferta" | "confirmacion" | "otro",
+  "oferta": {{
+    "recurso": cantidad entero
+  }},
+  "pide": {{
+    "recurso": cantidad entero
+  }},
+  "recursos_recibidos": {{
+    "recurso": cantidad entero
+  }}
+}}
+
+Donde:
+- "tipo" = "oferta" si la carta propone un intercambio (yo te doy X, tú me das Y).
+- "tipo" = "confirmacion" si la carta dice que ya nos han enviado recursos.
+- "tipo" = "otro" si no encaja claramente en ninguno de los casos.
+- "oferta" describe lo que EL OTRO agente nos ofrece.
+- "pide" describe lo que EL OTRO agente quiere que le enviemos.
+- "recursos_recibidos" son los recursos que el agente afirma que YA nos ha enviado.
+
+IMPORTANTE:
+- Devuelve SIEMPRE un JSON VÁLIDO, sin texto adicional.
+- Si algún campo no está claro en la carta, devuélvelo como un objeto vacío {{}}.
+
+OFRECEMOS:
+{json.dumps(surplus, ensure_ascii=False, indent=2)}
+
+NECESITAMOS:
+{json.dumps(needs, ensure_ascii=False, indent=2)}
+
+CARTA RECIBIDA (como JSON bruto de la API):
+{json.dumps(carta_dict, ensure_ascii=False, indent=2)}
+"""
+
+
+def load_fixtures() -> List[Dict[str, Any]]:
+    with open(FIXTURES, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(
+    build: Callable[..., str],
+    llm: Callable[[str, Any], str],
+    fixtures: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    tokens: List[int] = []
+    latencias: List[float] = []
+    aciertos = 0
+    for fx in fixtures:
+        prompt = build(fx["carta"], NEEDS, SURPLUS)
+        tokens.append(count_tokens(prompt))
+        inicio = time.perf_counter()
+        respuesta = llm(prompt, ANALIZAR_CARTA_JSON_SCHEMA)
+        latencias.append(time.perf_counter() - inicio)
+        try:
+            tipo = json.loads(respuesta).get("tipo")
+        except (json.JSONDecodeError, AttributeError):
+            tipo = None
+        aciertos += int(tipo == fx["tipo"])
+    return {
+        "tokens_medios": round(statistics.mean(tokens), 1),
+        "tokens_max": max(tokens),
+        "latencia_media_ms": round(statistics.mean(latencias) * 1000, 3),
+        "precision_tipo": round(aciertos / len(fixtures), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fake", action="store_true", help="LLM determinista del simulador, sin Ollama")
+    parser.add_argument("--modelo", default=None, help="modelo de Ollama (por defecto, el configurado)")
+    args = parser.parse_args()
+
+    configure(model=args.modelo)
+    llm = DeterministicLLM() if args.fake else generate
+    fixtures = load_fixtures()
+    try:
+        completo = run(build_prompt_carta_original, llm, fixtures)
+        compacto = run(build_prompt_carta, llm, fixtures)
+    except requests.RequestException as e:
+        raise SystemExit(f"No se pudo usar Ollama en {get_config().ollama_url} ({e}); prueba con --fake")
+
+    # Cada métrica con el prompt completo y el compacto, uno al lado del otro.
+    resultado = {
+        "llm": "determinista" if args.fake else get_config().model,
+        "cartas": len(fixtures),
+        **{
+            metrica: {"completo": completo[metrica], "compacto": compacto[metrica]}
+            for metrica in completo
+        },
+    }
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    print(
+        f"Reducción de tokens: {1 - compacto['tokens_medios'] / completo['tokens_medios']:.1%}; "
+        f"latencia: {completo['latencia_media_ms']} ms -> {compacto['latencia_media_ms']} ms; "
+        f"precisión: {completo['precision_tipo']} -> {compacto['precision_tipo']}"
+    )
+    if compacto["precision_tipo"] < completo["precision_tipo"]:
+        raise SystemExit("REGRESIÓN: el prompt compacto clasifica peor que el completo")
+
+
+if __name__ == "__main__":
+    main()
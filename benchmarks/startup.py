@@ -0,0 +1,97 @@
+"""
+Benchmark de arranque: mide el tiempo desde que se lanza `python -m src`
+hasta su primer GET /info (primer sondeo) contra un servidor del juego
+local y falso, que responde con el objetivo ya cumplido para que el bot
+termine enseguida.
+
+Uso: python -m benchmarks.startup --repeticiones 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+INFO = {
+    "Alias": ["bench"],
+    "Buzon": {},
+    "Recursos": {"madera": 4, "oro": 2},
+    "Objetivo": {"madera": 4, "oro": 2},
+}
+
+
+class _FakeGame(BaseHTTPRequestHandler):
+    primer_info: Optional[float] = None
+
+    def _json(self, body: object) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/info":
+            if _FakeGame.primer_info is None:
+                _FakeGame.primer_info = time.perf_counter()
+            self._json(INFO)
+        else:
+            self._json(["bench", "otro"])
+
+    def do_POST(self) -> None:
+        self._json({})
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def medir(url: str) -> float:
+    _FakeGame.primer_info = None
+    inicio = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "src", "--api-base", url, "--alias", "bench"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if _FakeGame.primer_info is None:
+        raise RuntimeError("El bot terminó sin consultar /info")
+    return _FakeGame.primer_info - inicio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tiempo de arranque hasta el primer sondeo")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGame)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    tiempos: List[float] = [medir(url) for _ in range(args.repeticiones)]
+    server.shutdown()
+    print(
+        json.dumps(
+            {
+                "repeticiones": args.repeticiones,
+                "arranque_hasta_primer_sondeo_ms_mediana": round(statistics.median(tiempos) * 1000, 1),
+                "arranque_hasta_primer_sondeo_ms_min": round(min(tiempos) * 1000, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
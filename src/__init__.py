@@ -2,6 +2,15 @@
 Bot de intercambio de recursos: API + Ollama (multi-agente).
 """
 
-from .app import main
+from typing import Any
 
 __all__ = ["main"]
+
+
+def __getattr__(name: str) -> Any:
+    # Import diferido: `python -m src` no carga el bot hasta validar la configuración.
+    if name == "main":
+        from .app import main
+
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
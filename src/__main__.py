@@ -1,8 +1,8 @@
 """
-Punto de entrada: python -m src
+Punto de entrada: python -m src [opciones]
 """
 
-from .app import main
+from .cli import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,35 +2,64 @@
 Llamadas a la API externa: info, gente, cartas y paquetes.
 """
 
-import requests
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional, Tuple
 from uuid import uuid4
 
-from .config import (
-    API_BASE,
-    LETTER_ENDPOINT,
-    MAILBOX_ENDPOINT,
-    PACKAGE_ENDPOINT,
-    ALIAS,
-)
+from .config import get_config
+from .info_stream import iter_info
+
+# Tamaño de los trozos leídos de /info en modo streaming.
+STREAM_CHUNK = 64 * 1024
+
+_session: Optional[Any] = None
+
+
+def _http() -> Any:
+    """
+    Sesión HTTP compartida (reutiliza la conexión entre llamadas).
+    `requests` se importa aquí para no pagar su carga al arrancar.
+    """
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+    return _session
 
 
 def get_info() -> Dict[str, Any]:
-    r = requests.get(f"{API_BASE}/info")
+    r = _http().get(f"{get_config().api_base}/info")
     r.raise_for_status()
     return r.json()
 
 
+def stream_info() -> Iterator[Tuple[str, Any]]:
+    """
+    GET /info leído en streaming: emite cada campo en cuanto se ha parseado
+    y las cartas del buzón una a una (ver `info_stream.iter_info`).
+    """
+    with _http().get(f"{get_config().api_base}/info", stream=True) as r:
+        r.raise_for_status()
+        yield from iter_info(r.iter_content(chunk_size=STREAM_CHUNK))
+
+
 def get_people() -> Any:
-    r = requests.get(f"{API_BASE}/gente")
+    r = _http().get(f"{get_config().api_base}/gente")
     r.raise_for_status()
     return r.json()
 
 
+def get_dashboard() -> str:
+    """HTML del dashboard con el estado de todos los puestos (GET /dashboard)."""
+    r = _http().get(get_config().dashboard_url)
+    r.raise_for_status()
+    return r.text
+
+
 def set_alias(nombre: str) -> Any:
     """Configura nuestro alias en el servidor (POST /alias/{nombre})."""
-    r = requests.post(f"{API_BASE}/alias/{nombre}")
+    r = _http().post(f"{get_config().api_base}/alias/{nombre}")
     r.raise_for_status()
     return r.json()
 
@@ -57,28 +86,28 @@ def send_letter(to_alias: str, subject: str, body: str) -> Any:
     }
     """
     payload = {
-        "remi": ALIAS or "",
+        "remi": get_config().alias or "",
         "dest": to_alias,
         "asunto": subject,
         "cuerpo": body,
         "id": str(uuid4()),
         "fecha": datetime.utcnow().isoformat(),
     }
-    r = requests.post(LETTER_ENDPOINT, json=payload)
+    r = _http().post(get_config().letter_url, json=payload)
     r.raise_for_status()
     return r.json()
 
 
 def get_mailbox() -> Any:
     """Obtiene las cartas del buzón."""
-    r = requests.get(MAILBOX_ENDPOINT)
+    r = _http().get(get_config().mailbox_url)
     r.raise_for_status()
     return r.json()
 
 
 def delete_letter(uid: str) -> Any:
     """Elimina una carta del buzón (DELETE /mail/{uid})."""
-    r = requests.delete(f"{API_BASE}/mail/{uid}")
+    r = _http().delete(f"{get_config().api_base}/mail/{uid}")
     r.raise_for_status()
     return r.json()
 
@@ -98,6 +127,6 @@ def send_package(to_alias: str, resources: Dict[str, int]) -> Any:
     """
     # La API espera el alias del destinatario en el path y directamente
     # un objeto con los recursos en el cuerpo.
-    r = requests.post(f"{PACKAGE_ENDPOINT}/{to_alias}", json=resources)
+    r = _http().post(f"{get_config().package_url}/{to_alias}", json=resources)
     r.raise_for_status()
     return r.json()
@@ -2,11 +2,13 @@
 Lógica principal del bot: flujo de negociación (main) y flujo legacy.
 """
 
-import json
 import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from . import api
-from .config import ALIAS
+from . import ollama_client
+from . import protocol
+from .config import get_config
 from .game_state import State
 from .letters import (
     analizar_carta,
@@ -14,6 +16,17 @@ from .letters import (
     build_simple_offer_letter,
 )
 from . import logs
+from .budget import LetterBudget
+from .coalition import Coalition
+from .cycles import CycleCoordinator
+from .dashboard import DashboardClient
+from .dedup import Fingerprint, NearDuplicateDetector
+from .llm_router import LLMRouter
+from .mailbox import MailboxTracker, letter_hash, oldest_first
+from .negotiation import NegotiationManager
+from .optimizer import choose_offers
+from .pricing import PricingEngine
+from .settlement import Settlement
 from .logs import (
     print_section,
     print_kv,
@@ -25,7 +38,7 @@ from .logs import (
     print_bot_dim,
     print_buzon,
 )
-from .trader import handle_offer, handle_confirmation
+from .trader import handle_offer, handle_confirmation, prescore_offer
 
 
 def main() -> None:
@@ -38,35 +51,53 @@ def main() -> None:
     """
     print_section("INICIO DEL BOT")
 
+    config = get_config()
+
     # Configuramos nuestro alias según la configuración (doc: POST /alias/{nombre})
-    if ALIAS:
+    if config.alias:
         try:
-            print_kv("Alias configurado", ALIAS)
-            api.set_alias(ALIAS)
+            print_kv("Alias configurado", config.alias)
+            api.set_alias(config.alias)
         except Exception as e:
-            print_error(f"No se pudo configurar el alias '{ALIAS}': {e}")
+            print_error(f"No se pudo configurar el alias '{config.alias}': {e}")
+
+    router = None
+    if config.llm_backends:
+        router = LLMRouter.from_config()
+        ollama_client.set_backend(router)
+        print_kv("Backends LLM", ", ".join(f"{b.url} ({b.model})" for b in router.backends))
 
     print_kv("Acción", "Obteniendo nuestros recursos (/info)")
 
     state = State(alias="", inventario={}, objetivo={}, needs={}, surplus={}, buzon={})
-    state.update()
+    # En modo streaming las cartas se procesan a medida que se descargan.
+    letters: Optional[Iterable[Tuple[str, Dict[str, Any]]]] = None
+    if config.info_streaming:
+        letters = state.stream_update()
+    else:
+        state.update()
 
     print_section("ESTADO INICIAL")
     print_kv("Alias", state.alias)
-    print_kv("Inventario inicial", json.dumps(state.inventario, ensure_ascii=False))
-    print_kv("Objetivo de recursos", json.dumps(state.objetivo, ensure_ascii=False))
+    if state.pendientes:
+        # En streaming, Recursos y Objetivo llegan después del buzón.
+        print_kv("Inventario y objetivo", "se leen tras el buzón (streaming)")
+    else:
+        print_kv("Inventario inicial", state.inventario)
+        print_kv("Objetivo de recursos", state.objetivo)
 
     print_section("AGENTES")
     print_kv("Acción", "Obteniendo agentes (/gente)")
     people = api.remove_myself({"Alias": state.alias}, api.get_people())
     print_kv("Otros agentes", people)
 
-    print_section("NECESIDADES Y EXCEDENTES")
-    print_kv("Necesitamos", json.dumps(state.needs, ensure_ascii=False))
-    print_kv(
-        "Podemos ofrecer (incluido oro, aunque luego lo filtraremos al enviar)",
-        json.dumps(state.surplus, ensure_ascii=False),
-    )
+    if not state.pendientes:
+        print_section("NECESIDADES Y EXCEDENTES")
+        print_kv("Necesitamos", state.needs)
+        print_kv(
+            "Podemos ofrecer (incluido oro, aunque luego lo filtraremos al enviar)",
+            state.surplus,
+        )
 
     # En lugar de una carta gigante, mandamos "mini cartas" 1 a 1
     # combinando cada recurso que necesitamos con cada recurso que nos sobra.
@@ -93,7 +124,7 @@ def main() -> None:
                 except Exception as e:
                     print_error(f"al enviar mini oferta a {p}: {e}")
     """
-    if state.has_reached_objective():
+    if not state.pendientes and state.has_reached_objective():
         print_bot(
             "Ya hemos alcanzado el 100% de los recursos objetivo. "
             "No es necesario negociar más.",
@@ -104,83 +135,414 @@ def main() -> None:
     # 1) Leer buzón una vez (ya está en state.buzon); luego bucle 2–4
     print_section("BUZÓN INICIAL")
     print_kv("Acción", "Leyendo cartas del buzón")
-    print_buzon(state.buzon)
+    if letters is None:
+        print_buzon(state.buzon)
 
+    tracker = MailboxTracker()
+    detector = NearDuplicateDetector()
+    negotiator = NegotiationManager() if config.negotiation_enabled else None
+    pricing = None
+    if config.gold_pricing_enabled:
+        # En streaming el objetivo puede no haber llegado: `process_mailbox`
+        # lo fija antes de actuar.
+        pricing = PricingEngine(objetivo_oro=state.objetivo.get(config.gold_resource_name, 0))
+    otros = [p["alias"] if isinstance(p, dict) else p for p in people]
+    coalition = Coalition.from_config()
+    dashboard = DashboardClient() if config.dashboard_enabled else None
+    cycles = CycleCoordinator() if config.trade_cycles_enabled else None
+    budget = LetterBudget() if config.llm_letter_budget > 0 else None
     while True:
-        # 2) Ordenar cartas por fecha (más antiguas primero)
-        sorted_letters = sorted(
-            state.buzon.items(),
-            key=lambda item: item[1].get("fecha", ""),
-        )
+        # 1a) Necesidades y excedentes de los demás según el dashboard
+        if dashboard is not None:
+            state.market = dashboard.market(state.alias)
+        # 1b) Repartos directos con los alias de nuestra coalición
+        if coalition is not None:
+            coalition.exchange(state)
+        # 2–3) Procesar las cartas nuevas de más antigua a más nueva
+        process_mailbox(state, tracker, detector, negotiator, pricing, letters, cycles, budget)
+        letters = None
 
-        # 3) Procesar de más antigua a más nueva y eliminar del buzón
-        for id_carta, content in sorted_letters:
+        if state.has_reached_objective():
+            print_bot(
+                "Ya hemos alcanzado el 100% de los recursos objetivo.",
+                success=True,
+            )
+            if cycles is not None:
+                cycles.release(state)
+            return
 
-            remitente = content.get("remi", "??")
-            asunto = content.get("asunto", "")
-            fecha = content.get("fecha", "")
+        if router is not None:
+            print_kv("Router LLM", router.stats())
+        if budget is not None:
+            print_kv("Presupuesto LLM por carta", budget.stats())
+        if negotiator is not None:
+            negotiator.expire()
+            print_kv("Negociaciones", negotiator.stats())
+        if coalition is not None:
+            print_kv("Coalición", coalition.stats())
+        if dashboard is not None:
+            print_kv("Dashboard", dashboard.stats())
+        if pricing is not None:
+            # Oro por encima del objetivo: ofrecer comprar lo que falta.
+            pricing.send_offers(state.needs, state.inventario, otros, state.market)
+            print_kv("Precios (oro)", pricing.stats())
+        if cycles is not None:
+            # Sin intercambio bilateral posible: cadenas de 3 o más jugadores.
+            cycles.step(state)
+            print_kv("Ciclos", cycles.stats())
 
-            if remitente == state.alias:
-                api.delete_letter(id_carta)
-                continue
+        # 4) No hay cartas (o ya se procesaron): esperar 5 s y volver a leer buzón
+        print_section("BUZÓN VACÍO")
+        print_bot(
+            "Sin cartas en buzón. Esperando 5 s y releyendo buzón...",
+            warning=True,
+        )
+        time.sleep(5)
+        if config.info_streaming:
+            letters = state.stream_update()
+        else:
+            state.update()
+            print_buzon(state.buzon)
 
-            print_section(f"CARTA RECIBIDA de {remitente}")
-            print_kv("ID", id_carta)
-            print_kv("Remitente", remitente)
-            print_kv("Asunto", asunto)
-            print_kv("Fecha", fecha)
-            print_carta_cruda(content)
 
-            analisis = analizar_carta(content, state.needs, state.surplus)
-            print_section("ANÁLISIS LLM DE LA CARTA")
-            print_llm(analisis)
+def process_mailbox(
+    state: State,
+    tracker: Optional[MailboxTracker] = None,
+    detector: Optional[NearDuplicateDetector] = None,
+    negotiator: Optional[NegotiationManager] = None,
+    pricing: Optional[PricingEngine] = None,
+    letters: Optional[Iterable[Tuple[str, Dict[str, Any]]]] = None,
+    cycles: Optional[CycleCoordinator] = None,
+    budget: Optional[LetterBudget] = None,
+) -> None:
+    """
+    Procesa el buzón actual del estado: ordena las cartas por fecha (más
+    antiguas primero), las analiza una a una, actúa sobre cada una según se
+    analiza (las ofertas, en bloque al final) y las elimina del buzón.
+    Con `tracker`, solo se analizan las cartas que no se hayan tratado ya;
+    las ya tratadas que siguen en el buzón solo se vuelven a borrar.
+    Con `detector`, las cartas casi idénticas a otra del mismo remitente
+    reutilizan su análisis, y si son ofertas de esta misma pasada se
+    descartan. Las cartas del protocolo no pasan por el detector.
+    Con `negotiator`, las ofertas rechazadas reciben una contraoferta.
+    Con `pricing`, las ofertas observadas actualizan los precios en oro y se
+    puede pagar con el oro que sobra por encima del objetivo.
+    Con `letters` (cartas de `State.stream_update`), se analizan en orden
+    de llegada a medida que se descargan, en lugar de leer `state.buzon`;
+    mientras falten Recursos/Objetivo (`state.pendientes`) se analizan con
+    las necesidades de la lectura anterior y se actúa sobre ellas al llegar.
+    Si `state.market` tiene datos del dashboard, las ofertas que el
+    remitente no puede cumplir no entran en el optimizador.
+    Con `cycles`, las cartas de estado y las ofertas alimentan el grafo
+    quiere/tiene de los intercambios en ciclo.
+    Con `budget`, el LLM de cada carta tiene un tiempo máximo: las que lo
+    agotan se reintentan en la siguiente pasada o se deciden sin LLM.
+    """
+    streaming = letters is not None
+    repetidas: List[str] = []
+    if streaming:
+        if tracker is not None:
+            letters = tracker.diff_stream(letters, repetidas)
+    elif tracker is None:
+        # 2) Ordenar cartas por fecha (más antiguas primero)
+        letters = oldest_first(state.buzon)
+    else:
+        letters, repetidas = tracker.diff(state.buzon)
 
-            tipo = analisis.get("tipo", "otro")
+    # 3) Analizar de más antigua a más nueva y actuar sobre cada carta según
+    # llega, salvo las ofertas: de ellas solo se guarda el análisis hasta
+    # decidirlas todas a la vez con el optimizador. Los envíos aprobados se
+    # agrupan por destinatario y se liquidan al final, aunque falle una carta
+    # (el inventario ya se descontó en `apply_reservations`).
+    ofertas: List[Tuple[str, str, str, Dict[str, Any]]] = []
+    # Cartas que no son ofertas analizadas antes de conocer nuestro estado.
+    diferidas: List[Tuple[str, str, str, Dict[str, Any]]] = []
+    duplicadas = 0
+    settlement = Settlement()
+    inventario_base: Optional[Dict[str, int]] = None
 
+    def al_dia() -> Dict[str, int]:
+        # Inventario antes de los envíos de esta pasada. En streaming el
+        # estado ya se actualizó al leer Recursos/Objetivo.
+        if not streaming:
             state.update()
+        if pricing is not None:
+            pricing.objetivo_oro = state.objetivo.get(get_config().gold_resource_name, 0)
+        return dict(state.inventario)
 
-            if tipo == "oferta":
-                remitente = content.get("remi")
-                if not remitente:
-                    print_bot("Oferta sin remitente claro, se ignora.", warning=True)
-                else:
-                    print_kv("Acción", f"Gestionando OFERTA de {remitente}", color=logs.GREEN)
-                    handle_offer(
-                        remitente, analisis, state.needs, state.surplus, state.inventario
+    def actuar_sin_carta(
+        id_carta: str,
+        remitente: str,
+        huella_carta: str,
+        analisis: Dict[str, Any],
+        decision: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        # Sin el contenido de la carta: se marca como tratada con su hash.
+        act_on_letter(
+            state,
+            id_carta,
+            {"remi": remitente},
+            analisis,
+            None,
+            settlement,
+            decision,
+            negotiator,
+            pricing,
+            budget,
+        )
+        if tracker is not None:
+            tracker.mark_handled_hash(id_carta, huella_carta)
+        settlement.apply_reservations(state, inventario_base)
+    if detector is not None:
+        detector.new_pass()
+    try:
+        for id_carta, content in letters:
+            remitente = content.get("remi", "??")
+            # Las cartas del protocolo llevan su propio id de intercambio: dos
+            # iguales son dos intercambios distintos, no un duplicado.
+            if (
+                detector is None
+                or remitente == state.alias
+                or protocol.PREFIX in content.get("cuerpo", "")
+            ):
+                analisis = analyze_letter(state, id_carta, content, tracker, budget)
+            else:
+                huella = Fingerprint.of(content)
+                previa = detector.lookup(remitente, huella)
+                if (
+                    previa is not None
+                    and detector.is_current_pass(previa)
+                    and previa.analisis.get("tipo") == "oferta"
+                ):
+                    detector.descartadas += 1
+                    duplicadas += 1
+                    print_bot_dim(
+                        f"[BOT] Carta {id_carta} duplicada de {previa.id_carta} ({remitente}), se descarta"
                     )
-            elif tipo == "confirmacion":
-                remitente = content.get("remi")
-                if not remitente:
-                    print_bot(
-                        "Confirmación sin remitente claro, se ignora.",
-                        warning=True,
+                    if tracker is not None:
+                        tracker.mark_handled(id_carta, content)
+                    try:
+                        api.delete_letter(id_carta)
+                    except Exception as e:
+                        print_error(f"al borrar la carta duplicada {id_carta}: {e}")
+                    continue
+                if previa is not None:
+                    detector.reutilizadas += 1
+                    print_bot_dim(
+                        f"[BOT] Carta {id_carta} casi idéntica a {previa.id_carta} "
+                        f"de {remitente}: se reutiliza su análisis"
                     )
+                    analisis = previa.analisis
                 else:
-                    print_kv(
-                        "Acción",
-                        f"Gestionando CONFIRMACIÓN de {remitente}",
-                        color=logs.GREEN,
-                    )
-                    handle_confirmation(
-                        remitente, analisis, state.inventario, state.needs
-                    )
-
-            print_bot_dim(f"[BOT] Eliminando carta del buzón (id={id_carta})")
-            api.delete_letter(id_carta)
+                    analisis = analyze_letter(state, id_carta, content, tracker, budget)
+                if analisis is not None:
+                    detector.add(remitente, huella, id_carta, analisis)
+            if analisis is None:
+                continue
+            if pricing is not None and analisis.get("tipo") == "oferta":
+                pricing.observe(analisis)
+            if cycles is not None:
+                cycles.observe(content.get("remi", ""), analisis)
 
-        if state.has_reached_objective():
-            print_bot(
-                "Ya hemos alcanzado el 100% de los recursos objetivo.",
-                success=True,
+            if analisis.get("tipo") == "oferta" or state.pendientes:
+                huella_carta = letter_hash(content) if tracker is not None else ""
+                pendiente = (id_carta, content.get("remi", ""), huella_carta, analisis)
+                if analisis.get("tipo") == "oferta":
+                    ofertas.append(pendiente)
+                else:
+                    diferidas.append(pendiente)
+                continue
+            # 4) Actuar y eliminar del buzón, empezando por las que esperaban
+            # a Recursos/Objetivo.
+            if inventario_base is None:
+                inventario_base = al_dia()
+            for pendiente in diferidas:
+                actuar_sin_carta(*pendiente)
+            diferidas = []
+            act_on_letter(
+                state,
+                id_carta,
+                content,
+                analisis,
+                tracker,
+                settlement,
+                negotiator=negotiator,
+                pricing=pricing,
+                budget=budget,
             )
+            settlement.apply_reservations(state, inventario_base)
+
+        if diferidas:
+            if state.pendientes:
+                print_error(f"/info sin {', '.join(sorted(state.pendientes))}: se usa el estado anterior")
+            if inventario_base is None:
+                inventario_base = al_dia()
+            for pendiente in diferidas:
+                actuar_sin_carta(*pendiente)
+        for id_carta in repetidas:
+            print_bot_dim(f"[BOT] Carta ya tratada, reintentando borrado (id={id_carta})")
+            try:
+                api.delete_letter(id_carta)
+            except Exception as e:
+                print_error(f"al borrar la carta {id_carta}: {e}")
+        if duplicadas:
+            print_section("CARTAS DUPLICADAS")
+            print_kv("Descartadas", duplicadas)
+        if not ofertas:
             return
 
-        # 4) No hay cartas (o ya se procesaron): esperar 5 s y volver a leer buzón
-        print_section("BUZÓN VACÍO")
-        print_bot(
-            "Sin cartas en buzón. Esperando 5 s y releyendo buzón...",
-            warning=True,
+        # 5) Todas las ofertas decididas a la vez por el optimizador.
+        if inventario_base is None:
+            inventario_base = al_dia()
+        decisiones: Dict[str, Dict[str, Any]] = {}
+        creibles = {
+            id_carta: analisis
+            for id_carta, remitente, _, analisis in ofertas
+            if prescore_offer(remitente, analisis, state.market) is None
+        }
+        if creibles and get_config().offer_optimizer:
+            surplus = state.surplus
+            if negotiator is not None:
+                # Las ofertas nuevas responden a nuestras contraofertas a esos
+                # remitentes; lo reservado para los demás no se reparte.
+                for _, remitente, _, _ in ofertas:
+                    negotiator.release(remitente)
+                surplus = negotiator.available(surplus)
+            decisiones = choose_offers(
+                creibles,
+                state.needs,
+                surplus,
+                pricing,
+                pricing.gold_budget(state.inventario) if pricing is not None else 0,
+            )
+            print_section("DECISIÓN CONJUNTA DE OFERTAS")
+            print_kv("Optimizador", decisiones)
+
+        for id_carta, remitente, huella_carta, analisis in ofertas:
+            actuar_sin_carta(id_carta, remitente, huella_carta, analisis, decisiones.get(id_carta))
+    finally:
+        if len(settlement):
+            print_section("LIQUIDACIÓN DE INTERCAMBIOS")
+            settlement.flush()
+
+
+def analyze_letter(
+    state: State,
+    id_carta: str,
+    content: Dict[str, Any],
+    tracker: Optional[MailboxTracker] = None,
+    budget: Optional[LetterBudget] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Muestra una carta del buzón y la analiza con el LLM. Las cartas propias
+    se borran directamente y devuelven None. Con `budget`, también devuelve
+    None la carta cuyo análisis se difiere por agotar su tiempo de LLM.
+    """
+    remitente = content.get("remi", "??")
+    asunto = content.get("asunto", "")
+    fecha = content.get("fecha", "")
+
+    if remitente == state.alias:
+        if tracker is not None:
+            tracker.mark_handled(id_carta, content)
+        api.delete_letter(id_carta)
+        return None
+
+    print_section(f"CARTA RECIBIDA de {remitente}")
+    print_kv("ID", id_carta)
+    print_kv("Remitente", remitente)
+    print_kv("Asunto", asunto)
+    print_kv("Fecha", fecha)
+    print_carta_cruda(content)
+
+    if budget is None:
+        analisis = analizar_carta(content, state.needs, state.surplus)
+    else:
+        analisis = budget.analyze(
+            id_carta, lambda: analizar_carta(content, state.needs, state.surplus)
         )
-        time.sleep(5)
-        state.update()
-        print_buzon(state.buzon)
+        if analisis is None:
+            return None
+    print_section("ANÁLISIS LLM DE LA CARTA")
+    print_llm(analisis)
+    return analisis
+
+
+def act_on_letter(
+    state: State,
+    id_carta: str,
+    content: Dict[str, Any],
+    analisis: Dict[str, Any],
+    tracker: Optional[MailboxTracker] = None,
+    settlement: Optional[Settlement] = None,
+    decision: Optional[Dict[str, Any]] = None,
+    negotiator: Optional[NegotiationManager] = None,
+    pricing: Optional[PricingEngine] = None,
+    budget: Optional[LetterBudget] = None,
+) -> None:
+    """
+    Gestiona la oferta o confirmación de una carta ya analizada y la elimina
+    del buzón. `decision` es la del optimizador para las ofertas, si la hay;
+    si no, con `budget` se toma dentro del tiempo de LLM de la carta.
+    """
+    tipo = analisis.get("tipo", "otro")
+
+    if tipo == "oferta":
+        remitente = content.get("remi")
+        if not remitente:
+            print_bot("Oferta sin remitente claro, se ignora.", warning=True)
+        else:
+            print_kv("Acción", f"Gestionando OFERTA de {remitente}", color=logs.GREEN)
+            if (
+                decision is None
+                and budget is not None
+                and prescore_offer(remitente, analisis, state.market) is None
+            ):
+                decision = budget.decide_offer(
+                    id_carta, analisis, state.needs, state.surplus, state.inventario, pricing
+                )
+            handle_offer(
+                remitente,
+                analisis,
+                state.needs,
+                state.surplus,
+                state.inventario,
+                settlement,
+                decision,
+                negotiator,
+                pricing,
+                state.market,
+            )
+    elif tipo == "confirmacion":
+        remitente = content.get("remi")
+        if not remitente:
+            print_bot(
+                "Confirmación sin remitente claro, se ignora.",
+                warning=True,
+            )
+        else:
+            print_kv(
+                "Acción",
+                f"Gestionando CONFIRMACIÓN de {remitente}",
+                color=logs.GREEN,
+            )
+            handle_confirmation(
+                remitente,
+                analisis,
+                state.inventario,
+                state.needs,
+                settlement,
+                negotiator,
+                pricing,
+            )
+
+    if budget is not None:
+        budget.finish(id_carta)
+    # Marcada antes de borrar: si el borrado falla no se vuelve a analizar.
+    if tracker is not None:
+        tracker.mark_handled(id_carta, content)
+    print_bot_dim(f"[BOT] Eliminando carta del buzón (id={id_carta})")
+    try:
+        api.delete_letter(id_carta)
+    except Exception as e:
+        print_error(f"al borrar la carta {id_carta}: {e}")
@@ -0,0 +1,126 @@
+"""
+Presupuesto de tiempo de LLM por carta: el análisis de una carta y, si
+hace falta, la decisión sobre su oferta comparten `llm_letter_budget`
+segundos. Al agotarse, la generación en curso se cancela (ver
+`ollama_client.deadline`) y:
+- si fallaba el análisis, la carta se deja en el buzón para reintentarla
+  en la siguiente pasada; tras `llm_budget_retries` reintentos se trata
+  como "otro" (no se mueve ningún recurso);
+- si fallaba la decisión sobre una oferta, se decide sin LLM con el
+  optimizador, y la decisión pasa las mismas comprobaciones de
+  `process_offer`.
+
+Con `offer_optimizer` activo las ofertas se deciden
+sin LLM en `choose_offers`, así que el presupuesto solo limita el análisis:
+`decide_offer` se usa únicamente con el optimizador desactivado.
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from .config import get_config
+from .ollama_client import BudgetExceeded, deadline
+from .optimizer import choose_offers
+from .pricing import PricingEngine
+from .trader import analizar_oferta
+
+# Muestras de tiempo de LLM por carta para los percentiles.
+MAX_MUESTRAS = 512
+
+
+class LetterBudget:
+    """Aplica el presupuesto por carta y cuenta las veces que se supera."""
+
+    def __init__(
+        self,
+        segundos: Optional[float] = None,
+        reintentos: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        config = get_config()
+        self.segundos = segundos if segundos is not None else config.llm_letter_budget
+        self.reintentos = reintentos if reintentos is not None else config.llm_budget_retries
+        self.clock = clock
+        self.excedidas_analisis = 0
+        self.excedidas_decision = 0
+        self.diferidas = 0
+        self.conservadoras = 0
+        self._gastado: Dict[str, float] = {}
+        self._fallos: Dict[str, int] = {}
+        self._muestras: Deque[float] = deque(maxlen=MAX_MUESTRAS)
+
+    def analyze(self, id_carta: str, fn: Callable[[], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Ejecuta el análisis `fn` de la carta dentro del presupuesto.
+        Devuelve None si se difiere a la siguiente pasada.
+        """
+        inicio = self.clock()
+        try:
+            with deadline(self.segundos):
+                analisis = fn()
+        except BudgetExceeded as e:
+            self.excedidas_analisis += 1
+            self._muestras.append(self.clock() - inicio)
+            fallos = self._fallos.get(id_carta, 0) + 1
+            if fallos <= self.reintentos:
+                self._fallos[id_carta] = fallos
+                self.diferidas += 1
+                print(f"Análisis de {id_carta} fuera de plazo ({e}): se reintentará ({fallos}/{self.reintentos}).")
+                return None
+            self._fallos.pop(id_carta, None)
+            self.conservadoras += 1
+            print(f"Análisis de {id_carta} fuera de plazo tras {self.reintentos} reintentos: se trata como 'otro'.")
+            return {"tipo": "otro", "oferta": {}, "pide": {}, "recursos_recibidos": {}}
+        self._fallos.pop(id_carta, None)
+        self._gastado[id_carta] = self.clock() - inicio
+        return analisis
+
+    def decide_offer(
+        self,
+        id_carta: str,
+        analisis: Dict[str, Any],
+        needs: Dict[str, int],
+        surplus: Dict[str, int],
+        inventario: Dict[str, int],
+        pricing: Optional[PricingEngine] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Decisión sobre una oferta con lo que queda del presupuesto de la
+        carta; si se agota, la del optimizador. None si la oferta no tiene
+        datos (la rechaza `process_offer` sin consultar al LLM).
+        """
+        if not analisis.get("oferta") or not analisis.get("pide"):
+            return None
+        gastado = self._gastado.get(id_carta, 0.0)
+        inicio = self.clock()
+        try:
+            with deadline(max(self.segundos - gastado, 0.0)):
+                decision = analizar_oferta(analisis, needs, surplus)
+        except BudgetExceeded as e:
+            self.excedidas_decision += 1
+            self.conservadoras += 1
+            print(f"Decisión sobre {id_carta} fuera de plazo ({e}): se decide sin LLM.")
+            presupuesto_oro = pricing.gold_budget(inventario) if pricing is not None else 0
+            decision = choose_offers({id_carta: analisis}, needs, surplus, pricing, presupuesto_oro)[id_carta]
+        self._gastado[id_carta] = gastado + self.clock() - inicio
+        return decision
+
+    def finish(self, id_carta: str) -> None:
+        """La carta se ha tratado: registra su tiempo total de LLM."""
+        gastado = self._gastado.pop(id_carta, None)
+        if gastado is not None:
+            self._muestras.append(gastado)
+
+    def stats(self) -> Dict[str, Any]:
+        muestras = sorted(self._muestras)
+        return {
+            "presupuesto_s": self.segundos,
+            "excedidas_analisis": self.excedidas_analisis,
+            "excedidas_decision": self.excedidas_decision,
+            "diferidas": self.diferidas,
+            "conservadoras": self.conservadoras,
+            "p50_s": round(muestras[len(muestras) // 2], 3) if muestras else None,
+            "p95_s": round(muestras[int(0.95 * (len(muestras) - 1))], 3) if muestras else None,
+            "max_s": round(muestras[-1], 3) if muestras else None,
+        }
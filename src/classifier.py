@@ -0,0 +1,375 @@
+"""
+Clasificador ligero de cartas entrenado con las etiquetas del LLM.
+
+- `tipo`: regresión logística multiclase sobre n-gramas con hashing.
+- Recursos y cantidades: cada mención "cantidad + recurso" del texto se
+  clasifica en oferta / pide / recursos_recibidos / nada con otro modelo
+  lineal sobre las palabras de su alrededor.
+
+Los pesos se guardan como `array('f')` en un JSON (base64). Si la
+confianza de una predicción no llega al umbral, analizar_carta recurre a
+Ollama y guarda su respuesta como nuevo ejemplo de entrenamiento.
+
+Uso:
+  python -m src.classifier train  [--datos llm_labels.jsonl] [--modelo classifier_model.json]
+  python -m src.classifier report [--datos ...] [--modelo ...]
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import sys
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import get_config
+from .prompts import strip_letter
+
+TIPOS = ["oferta", "confirmacion", "otro"]
+ROLES = ["oferta", "pide", "recursos_recibidos", "nada"]
+DIM = 1 << 15
+
+_RE_TOKEN = re.compile(r"\w+", re.UNICODE)
+_NUMEROS = {
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+    "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
+}
+# Palabras a izquierda/derecha de una mención que se usan como contexto.
+_VENTANA_IZQ = 8
+_VENTANA_DER = 3
+
+Sample = Tuple[List[int], int]
+
+
+def _tokens(text: str) -> List[str]:
+    return [t.lower() for t in _RE_TOKEN.findall(text)]
+
+
+def _number(token: str) -> Optional[int]:
+    if token.isdigit():
+        return int(token)
+    return _NUMEROS.get(token)
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % DIM
+
+
+class HashedLinearModel:
+    """Regresión logística multiclase con características por hashing."""
+
+    def __init__(self, labels: Sequence[str], weights: Optional[array] = None) -> None:
+        self.labels = list(labels)
+        n = len(self.labels)
+        self.weights = weights if weights is not None else array("f", bytes(4 * DIM * n))
+
+    def _scores(self, features: List[int]) -> List[float]:
+        n = len(self.labels)
+        w = self.weights
+        scores = [0.0] * n
+        for f in features:
+            base = f * n
+            for k in range(n):
+                scores[k] += w[base + k]
+        return scores
+
+    def predict_proba(self, features: List[int]) -> List[float]:
+        scores = self._scores(features)
+        m = max(scores)
+        exps = [math.exp(s - m) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, features: List[int]) -> Tuple[str, float]:
+        probs = self.predict_proba(features)
+        k = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[k], probs[k]
+
+    def fit(self, samples: List[Sample], epochs: int = 15, lr: float = 0.3, seed: int = 0) -> None:
+        """SGD sobre la entropía cruzada."""
+        rng = random.Random(seed)
+        n = len(self.labels)
+        w = self.weights
+        orden = list(samples)
+        for epoch in range(epochs):
+            rng.shuffle(orden)
+            paso = lr / (1 + epoch * 0.2)
+            for features, y in orden:
+                probs = self.predict_proba(features)
+                escala = paso / max(len(features), 1) ** 0.5
+                for f in features:
+                    base = f * n
+                    for k in range(n):
+                        w[base + k] -= escala * (probs[k] - (1.0 if k == y else 0.0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "labels": self.labels,
+            "weights": base64.b64encode(zlib.compress(self.weights.tobytes())).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HashedLinearModel":
+        weights = array("f")
+        weights.frombytes(zlib.decompress(base64.b64decode(data["weights"])))
+        return cls(data["labels"], weights)
+
+
+def _tipo_features(carta: Dict[str, Any]) -> List[int]:
+    feats = ["bias"]
+    asunto = _tokens(str(carta.get("asunto", "")))
+    cuerpo = _tokens(str(carta.get("cuerpo", "")))
+    norm = ["<num>" if _number(t) is not None else t for t in cuerpo]
+    feats += [f"a:{t}" for t in asunto]
+    feats += [f"w:{t}" for t in norm]
+    feats += [f"b:{a}_{b}" for a, b in zip(norm, norm[1:])]
+    return sorted({_hash(f) for f in feats})
+
+
+def _mentions(
+    tokens: List[str], recursos: Iterable[str]
+) -> List[Tuple[int, str, int]]:
+    """
+    Menciones (posición, recurso, cantidad): "3 madera", "tres maderas"
+    o "madera 3" (como en el JSON de nuestras cartas).
+    """
+    conocidos = set(recursos)
+
+    def recurso(t: str) -> Optional[str]:
+        if t in conocidos:
+            return t
+        if t.endswith("s") and t[:-1] in conocidos:
+            return t[:-1]
+        if t.endswith("es") and t[:-2] in conocidos:
+            return t[:-2]
+        return None
+
+    menciones = []
+    usados = set()
+    for i, t in enumerate(tokens):
+        n = _number(t)
+        if n is None:
+            continue
+        # "madera 1" (JSON) antes que "1 madera" para no emparejar mal "madera 1 piedra 2".
+        for j in (i - 1, i + 1, i + 2):
+            if 0 <= j < len(tokens) and j not in usados:
+                r = recurso(tokens[j])
+                if r is not None and not (j == i + 2 and tokens[i + 1] != "de"):
+                    menciones.append((j, r, n))
+                    usados.add(j)
+                    break
+    return menciones
+
+
+def _role_features(tokens: List[str], pos: int, tipo: str) -> List[int]:
+    feats = ["bias", f"tipo:{tipo}"]
+    izq = tokens[max(0, pos - _VENTANA_IZQ):pos]
+    der = tokens[pos + 1:pos + 1 + _VENTANA_DER]
+    feats += [f"L:{t}" for t in izq]
+    feats += [f"L{d}:{t}" for d, t in enumerate(reversed(izq[-3:]), start=1)]
+    feats += [f"R:{t}" for t in der]
+    return sorted({_hash(f) for f in feats})
+
+
+def _role_label(analisis: Dict[str, Any], recurso: str, cantidad: int) -> str:
+    candidatos = [
+        rol
+        for rol in ROLES[:-1]
+        if isinstance(analisis.get(rol), dict) and recurso in analisis[rol]
+    ]
+    for rol in candidatos:
+        try:
+            if int(analisis[rol][recurso]) == cantidad:
+                return rol
+        except (TypeError, ValueError):
+            continue
+    return candidatos[0] if candidatos else "nada"
+
+
+class LetterClassifier:
+    """Clasificador completo: tipo + extracción de recursos por mención."""
+
+    def __init__(
+        self,
+        tipo_model: Optional[HashedLinearModel] = None,
+        role_model: Optional[HashedLinearModel] = None,
+        recursos: Optional[List[str]] = None,
+    ) -> None:
+        self.tipo_model = tipo_model or HashedLinearModel(TIPOS)
+        self.role_model = role_model or HashedLinearModel(ROLES)
+        self.recursos = sorted(recursos or [])
+
+    def _text_tokens(self, carta: Dict[str, Any]) -> List[str]:
+        return _tokens(f"{carta.get('asunto', '')} . {carta.get('cuerpo', '')}")
+
+    def predict(self, carta: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """Devuelve (análisis con la forma de analizar_carta, confianza)."""
+        carta = strip_letter(carta)
+        tipo, confianza = self.tipo_model.predict(_tipo_features(carta))
+        analisis: Dict[str, Any] = {"tipo": tipo, "oferta": {}, "pide": {}, "recursos_recibidos": {}}
+        tokens = self._text_tokens(carta)
+        for pos, recurso, cantidad in _mentions(tokens, self.recursos):
+            rol, p = self.role_model.predict(_role_features(tokens, pos, tipo))
+            confianza = min(confianza, p)
+            if rol != "nada":
+                destino = analisis[rol]
+                destino[recurso] = max(destino.get(recurso, 0), cantidad)
+        return analisis, confianza
+
+    def fit(self, registros: List[Dict[str, Any]], epochs: int = 15) -> None:
+        """Entrena con registros {"carta": ..., "analisis": ...} del LLM."""
+        recursos = set(self.recursos)
+        for reg in registros:
+            for rol in ROLES[:-1]:
+                valor = reg["analisis"].get(rol)
+                if isinstance(valor, dict):
+                    recursos.update(str(r).lower() for r in valor)
+        self.recursos = sorted(recursos)
+
+        tipo_samples: List[Sample] = []
+        role_samples: List[Sample] = []
+        for reg in registros:
+            carta, analisis = strip_letter(reg["carta"]), reg["analisis"]
+            tipo = analisis.get("tipo")
+            if tipo not in TIPOS:
+                continue
+            tipo_samples.append((_tipo_features(carta), TIPOS.index(tipo)))
+            tokens = self._text_tokens(carta)
+            for pos, recurso, cantidad in _mentions(tokens, self.recursos):
+                rol = _role_label(analisis, recurso, cantidad)
+                role_samples.append((_role_features(tokens, pos, tipo), ROLES.index(rol)))
+        self.tipo_model.fit(tipo_samples, epochs=epochs)
+        self.role_model.fit(role_samples, epochs=epochs)
+
+    def save(self, path: str) -> None:
+        data = {
+            "recursos": self.recursos,
+            "tipo": self.tipo_model.to_dict(),
+            "roles": self.role_model.to_dict(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path: str) -> "LetterClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            HashedLinearModel.from_dict(data["tipo"]),
+            HashedLinearModel.from_dict(data["roles"]),
+            data["recursos"],
+        )
+
+
+_classifier: Optional[LetterClassifier] = None
+_classifier_path: Optional[str] = None
+
+
+def get_classifier() -> Optional[LetterClassifier]:
+    """Clasificador de `classifier_model` (cargado una vez), o None si no hay."""
+    global _classifier, _classifier_path
+    path = get_config().classifier_model
+    if path != _classifier_path:
+        _classifier_path = path
+        _classifier = LetterClassifier.load(path) if path and Path(path).exists() else None
+    return _classifier
+
+
+def record_label(carta: Dict[str, Any], analisis: Dict[str, Any]) -> None:
+    """Añade la respuesta del LLM al conjunto de entrenamiento (classifier_dataset)."""
+    path = get_config().classifier_dataset
+    if not path:
+        return
+    linea = json.dumps({"carta": strip_letter(carta), "analisis": analisis}, ensure_ascii=False)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(linea + "\n")
+
+
+def load_dataset(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _same(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    def norm(d: Any) -> Dict[str, int]:
+        try:
+            return {str(k).lower(): int(v) for k, v in (d or {}).items() if int(v) > 0}
+        except (AttributeError, TypeError, ValueError):
+            return {}
+
+    return a.get("tipo") == b.get("tipo") and all(
+        norm(a.get(rol)) == norm(b.get(rol)) for rol in ROLES[:-1]
+    )
+
+
+def report(
+    clasificador: LetterClassifier, registros: List[Dict[str, Any]], umbral: float
+) -> Dict[str, Any]:
+    """Precisión (tipo y análisis completo), cobertura al umbral y latencia."""
+    aciertos_tipo = aciertos_total = servidas = aciertos_servidas = 0
+    inicio = time.perf_counter()
+    for reg in registros:
+        pred, confianza = clasificador.predict(reg["carta"])
+        tipo_ok = pred["tipo"] == reg["analisis"].get("tipo")
+        total_ok = _same(pred, reg["analisis"])
+        aciertos_tipo += tipo_ok
+        aciertos_total += total_ok
+        if confianza >= umbral:
+            servidas += 1
+            aciertos_servidas += total_ok
+    n = max(len(registros), 1)
+    return {
+        "ejemplos": len(registros),
+        "precision_tipo": round(aciertos_tipo / n, 3),
+        "precision_analisis": round(aciertos_total / n, 3),
+        "umbral": umbral,
+        "cobertura_sin_llm": round(servidas / n, 3),
+        "precision_sin_llm": round(aciertos_servidas / max(servidas, 1), 3),
+        "latencia_us": round((time.perf_counter() - inicio) / n * 1e6, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Entrenamiento del clasificador de cartas")
+    parser.add_argument("accion", choices=["train", "report"])
+    parser.add_argument("--datos", default=config.classifier_dataset)
+    parser.add_argument("--modelo", default=config.classifier_model)
+    parser.add_argument("--epocas", type=int, default=15)
+    parser.add_argument("--test", type=float, default=0.2, help="Fracción para evaluar")
+    args = parser.parse_args(argv)
+
+    if not args.datos or not Path(args.datos).exists():
+        print(f"No hay datos de entrenamiento en {args.datos!r}", file=sys.stderr)
+        raise SystemExit(1)
+    registros = load_dataset(args.datos)
+
+    if args.accion == "train":
+        random.Random(0).shuffle(registros)
+        corte = int(len(registros) * (1 - args.test))
+        entrenamiento, prueba = registros[:corte], registros[corte:]
+        clasificador = LetterClassifier()
+        inicio = time.perf_counter()
+        clasificador.fit(entrenamiento, epochs=args.epocas)
+        print(f"Entrenado con {len(entrenamiento)} ejemplos en {time.perf_counter() - inicio:.1f} s")
+        if prueba:
+            print(json.dumps(report(clasificador, prueba, config.classifier_threshold), indent=2))
+        # El modelo final se entrena con todos los ejemplos.
+        if prueba:
+            clasificador = LetterClassifier()
+            clasificador.fit(registros, epochs=args.epocas)
+        clasificador.save(args.modelo)
+        print(f"Modelo guardado en {args.modelo}")
+    else:
+        clasificador = LetterClassifier.load(args.modelo)
+        print(json.dumps(report(clasificador, registros, config.classifier_threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
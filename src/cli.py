@@ -0,0 +1,160 @@
+"""
+Línea de comandos de `python -m src`: sobrescrituras de configuración y
+arranque del bot. Los módulos pesados se importan después de validar la
+configuración.
+"""
+
+import argparse
+import functools
+import json
+import sys
+from typing import Any, Callable, List, Optional
+
+from .config import ConfigError, configure
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src",
+        description="Bot de intercambio de recursos (API + Ollama).",
+    )
+    parser.add_argument("--config", help="Ruta alternativa a config.json")
+    parser.add_argument("--api-base", help="URL base del servidor del juego")
+    parser.add_argument("--ollama-url", help="URL de /api/generate de Ollama")
+    parser.add_argument("--model", help="Modelo de Ollama")
+    parser.add_argument("--alias", help="Alias con el que jugamos")
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        help="Peticiones simultáneas por backend LLM (activa el router de LLM)",
+    )
+    parser.add_argument("--llm-queue-size", type=int, help="Tamaño máximo de la cola LLM")
+    parser.add_argument("--llm-timeout", type=float, help="Plazo máximo por petición LLM (s)")
+    parser.add_argument(
+        "--llm-letter-budget",
+        type=float,
+        help="Tiempo máximo de LLM por carta (s, 0 = sin límite)",
+    )
+    parser.add_argument(
+        "--llm-fallback-model",
+        help="Modelo de reserva para los backends que no tienen uno",
+    )
+    parser.add_argument(
+        "--offer-optimizer",
+        action="store_true",
+        default=None,
+        help="Decidir todas las ofertas de una pasada a la vez con el optimizador",
+    )
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        default=None,
+        help="Consultar /dashboard para dirigir y descartar ofertas",
+    )
+    parser.add_argument(
+        "--negotiation",
+        action="store_true",
+        default=None,
+        help="Contraofertar en lugar de rechazar ofertas desfavorables",
+    )
+    parser.add_argument(
+        "--gold-pricing",
+        action="store_true",
+        default=None,
+        help="Comprar y vender recursos por oro con precios estimados",
+    )
+    parser.add_argument(
+        "--trade-cycles",
+        action="store_true",
+        default=None,
+        help="Buscar y ejecutar cadenas de intercambio entre varios jugadores",
+    )
+    parser.add_argument(
+        "--classifier-dataset",
+        metavar="FICHERO",
+        help="Guardar en un JSONL las clasificaciones del LLM (datos de entrenamiento)",
+    )
+    parser.add_argument(
+        "--coalition-dir",
+        help="Directorio compartido con otros alias de la coalición",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfilar la ejecución (cProfile, pilas muestreadas, tiempos por iteración)",
+    )
+    parser.add_argument(
+        "--profile-out",
+        default="fdi_profile",
+        help="Prefijo de los ficheros de perfil (por defecto: fdi_profile)",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=0.005,
+        help="Intervalo de muestreo de pilas en segundos",
+    )
+    parser.add_argument("--record", metavar="FICHERO", help="Grabar llamadas a la API y al LLM en un JSONL")
+    parser.add_argument(
+        "--replay",
+        metavar="FICHERO",
+        help="Reproducir una partida grabada sin servidor ni Ollama",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Velocidad de reproducción (1 = original, 0 = sin esperas)",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    try:
+        configure(
+            path=args.config,
+            api_base=args.api_base,
+            ollama_url=args.ollama_url,
+            model=args.model,
+            alias=args.alias,
+            llm_concurrency=args.llm_concurrency,
+            llm_queue_size=args.llm_queue_size,
+            llm_timeout=args.llm_timeout,
+            llm_letter_budget=args.llm_letter_budget,
+            llm_fallback_model=args.llm_fallback_model,
+            offer_optimizer=args.offer_optimizer,
+            dashboard_enabled=args.dashboard,
+            negotiation_enabled=args.negotiation,
+            gold_pricing_enabled=args.gold_pricing,
+            trade_cycles_enabled=args.trade_cycles,
+            classifier_dataset=args.classifier_dataset,
+            coalition_dir=args.coalition_dir,
+        )
+    except ConfigError as e:
+        print(f"Configuración inválida: {e}", file=sys.stderr)
+        raise SystemExit(2)
+
+    from .app import main as run_bot
+
+    target: Callable[[], Any] = run_bot
+    if args.record:
+        from .recording import record
+
+        target = functools.partial(record, args.record, target)
+    if args.replay:
+        from .recording import replay
+
+        bot = target
+
+        def replay_bot() -> None:
+            informe = replay(args.replay, bot, args.replay_speed)
+            print(json.dumps(informe, ensure_ascii=False), file=sys.stderr)
+
+        target = replay_bot
+    if args.profile:
+        from .profiling import Profiler
+
+        Profiler(args.profile_out, args.profile_interval).run(target)
+    else:
+        target()
@@ -0,0 +1,193 @@
+"""
+Modo coalición: varios alias de la misma tienda comparten sus necesidades
+y excedentes por un canal local y se pasan recursos directamente con
+`api.send_package`, sin cartas ni LLM, antes de negociar con el resto.
+
+Cada miembro publica su estado con un número de versión. El reparto es
+determinista sobre la misma foto, y cada miembro ejecuta solo los envíos
+en los que es el donante (solo puede enviar sus propios recursos). A un
+miembro no se le vuelve a enviar hasta que publique una versión nueva,
+para no repetir envíos con un estado ya atendido.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import api
+from .config import get_config
+from .game_state import State
+
+# Envío directo: (donante, receptor, recurso, cantidad).
+Transfer = Tuple[str, str, str, int]
+
+
+class MemoryChannel:
+    """Canal en proceso, para varios alias en el mismo proceso (o el simulador)."""
+
+    def __init__(self) -> None:
+        self._miembros: Dict[str, Dict[str, Any]] = {}
+
+    def publish(self, alias: str, entrada: Dict[str, Any]) -> None:
+        self._miembros[alias] = dict(entrada)
+
+    def members(self) -> Dict[str, Dict[str, Any]]:
+        return {alias: dict(e) for alias, e in self._miembros.items()}
+
+
+class FileChannel:
+    """
+    Canal por directorio compartido: un fichero JSON por alias, escrito de
+    forma atómica (fichero temporal + rename), sin necesidad de bloqueos.
+    """
+
+    def __init__(self, directorio: str) -> None:
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def publish(self, alias: str, entrada: Dict[str, Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"alias": alias, **entrada}, f, ensure_ascii=False)
+            os.replace(tmp, os.path.join(self.directorio, f"{alias}.json"))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def members(self) -> Dict[str, Dict[str, Any]]:
+        miembros: Dict[str, Dict[str, Any]] = {}
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), encoding="utf-8") as f:
+                    entrada = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if isinstance(entrada, dict) and isinstance(entrada.get("alias"), str):
+                miembros[entrada.pop("alias")] = entrada
+        return miembros
+
+
+def match(miembros: Dict[str, Dict[str, Any]]) -> List[Transfer]:
+    """
+    Reparto voraz y determinista: por cada recurso, los excedentes de los
+    donantes cubren las necesidades de los receptores en orden de alias.
+    """
+    recursos = sorted({r for e in miembros.values() for r in e.get("needs", {})})
+    transfers: List[Transfer] = []
+    for recurso in recursos:
+        donantes = [
+            [alias, int(e.get("surplus", {}).get(recurso, 0))]
+            for alias, e in sorted(miembros.items())
+            if int(e.get("surplus", {}).get(recurso, 0)) > 0
+        ]
+        for receptor, entrada in sorted(miembros.items()):
+            falta = int(entrada.get("needs", {}).get(recurso, 0))
+            for donante in donantes:
+                if falta == 0:
+                    break
+                if donante[0] == receptor or donante[1] == 0:
+                    continue
+                cant = min(falta, donante[1])
+                transfers.append((donante[0], receptor, recurso, cant))
+                donante[1] -= cant
+                falta -= cant
+    return transfers
+
+
+class Coalition:
+    """Participación de un alias en la coalición a través de un canal."""
+
+    def __init__(
+        self,
+        channel: Any,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.channel = channel
+        self.ttl = ttl if ttl is not None else get_config().coalition_ttl
+        self.clock = clock
+        self.version = 0
+        self._publicado: Optional[Tuple[Dict[str, int], Dict[str, int]]] = None
+        self.enviados = 0
+        self.unidades_enviadas = 0
+        # Última versión de cada receptor a la que ya enviamos.
+        self._atendida: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls) -> Optional["Coalition"]:
+        """Coalición por directorio compartido, si `coalition_dir` está configurado."""
+        directorio = get_config().coalition_dir
+        return cls(FileChannel(directorio)) if directorio else None
+
+    def publish(self, state: State) -> None:
+        """
+        Publica (y refresca `actualizado`) nuestro estado. La versión solo
+        cambia si cambian las necesidades o los excedentes, de modo que los
+        demás no vuelvan a atender un estado que ya atendieron.
+        """
+        foto = (dict(state.needs), dict(state.surplus))
+        if foto != self._publicado:
+            self.version += 1
+            self._publicado = foto
+        self.channel.publish(
+            state.alias,
+            {
+                "needs": dict(state.needs),
+                "surplus": dict(state.surplus),
+                "version": self.version,
+                "actualizado": self.clock(),
+            },
+        )
+
+    def exchange(self, state: State) -> int:
+        """
+        Publica nuestro estado, calcula el reparto con los miembros activos
+        y envía nuestra parte, descontándola del inventario de `state`.
+        Devuelve el número de paquetes enviados.
+        """
+        self.publish(state)
+        ahora = self.clock()
+        miembros = {
+            alias: e
+            for alias, e in self.channel.members().items()
+            if ahora - float(e.get("actualizado", 0)) <= self.ttl
+        }
+        if len(miembros) < 2:
+            return 0
+
+        por_receptor: Dict[str, Dict[str, int]] = {}
+        for donante, receptor, recurso, cant in match(miembros):
+            if donante != state.alias:
+                continue
+            if self._atendida.get(receptor) == miembros[receptor].get("version"):
+                continue
+            paquete = por_receptor.setdefault(receptor, {})
+            paquete[recurso] = paquete.get(recurso, 0) + cant
+
+        enviados = 0
+        for receptor, paquete in por_receptor.items():
+            try:
+                print(f"Coalición: enviando a {receptor} {paquete}")
+                api.send_package(receptor, paquete)
+            except Exception as e:
+                print(f"ERROR enviando paquete de coalición a {receptor}: {e}")
+                continue
+            self._atendida[receptor] = miembros[receptor].get("version")
+            enviados += 1
+            self.unidades_enviadas += sum(paquete.values())
+            # Reflejamos el envío sin volver a leer /info.
+            for recurso, cant in paquete.items():
+                state.inventario[recurso] = state.inventario.get(recurso, 0) - cant
+        if enviados:
+            state.recompute()
+        self.enviados += enviados
+        return enviados
+
+    def stats(self) -> Dict[str, Any]:
+        return {"paquetes": self.enviados, "unidades": self.unidades_enviadas}
@@ -1,25 +1,273 @@
 """
-Configuración del bot: se carga desde config.json (mismo directorio que este módulo).
+Configuración del bot: se carga bajo demanda desde config.json (mismo
+directorio que este módulo), con sobrescrituras por variables de entorno
+(FDI_*) y por línea de comandos, y se valida antes de usarse.
+
+Los nombres en mayúsculas de versiones anteriores (API_BASE, MODEL, ...)
+siguen disponibles como atributos del módulo y se resuelven al acceder.
 """
 
 import json
+import os
+from dataclasses import dataclass, field, fields
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 
 _CONFIG_PATH = Path(__file__).resolve().parent / "config.json"
 
+# Variable de entorno -> clave de config.json que sobrescribe.
+ENV_OVERRIDES = {
+    "FDI_API_BASE": "api_base",
+    "FDI_OLLAMA_URL": "ollama_url",
+    "FDI_MODEL": "model",
+    "FDI_ALIAS": "alias",
+    "FDI_LLM_BACKENDS": "llm_backends",
+    "FDI_LLM_CONCURRENCY": "llm_concurrency",
+    "FDI_LLM_QUEUE_SIZE": "llm_queue_size",
+    "FDI_LLM_TIMEOUT": "llm_timeout",
+    "FDI_LLM_FALLBACK_MODEL": "llm_fallback_model",
+    "FDI_LLM_LETTER_BUDGET": "llm_letter_budget",
+    "FDI_OFFER_OPTIMIZER": "offer_optimizer",
+    "FDI_CLASSIFIER_DATASET": "classifier_dataset",
+    "FDI_CLASSIFIER_MODEL": "classifier_model",
+    "FDI_NEGOTIATION": "negotiation_enabled",
+    "FDI_GOLD_PRICING": "gold_pricing_enabled",
+    "FDI_COALITION_DIR": "coalition_dir",
+    "FDI_INFO_STREAMING": "info_streaming",
+    "FDI_DASHBOARD": "dashboard_enabled",
+    "FDI_TRADE_CYCLES": "trade_cycles_enabled",
+}
+
+
+class ConfigError(ValueError):
+    """Configuración inválida (clave desconocida, tipo o valor incorrecto)."""
+
+
+@dataclass
+class Config:
+    """
+    Valores de config.json ya combinados con las sobrescrituras.
+    Los backends de `llm_backends` sin 'url' o 'model' usan `ollama_url` y
+    `model`; `llm_concurrency`, si se indica, sustituye su concurrencia, y
+    `llm_fallback_model` da modelo de reserva a los que no lo tienen. Sin
+    backends no hay router, salvo que se pida una de esas dos opciones: en
+    ese caso se usa un backend con `ollama_url` y `model`.
+    """
+
+    api_base: str
+    ollama_url: str
+    model: str
+    gold_resource_name: str = "oro"
+    mailbox_endpoint: str = "/buzon"
+    letter_endpoint: str = "/carta"
+    package_endpoint: str = "/paquete"
+    dashboard_endpoint: str = "/dashboard"
+    alias: str = ""
+    llm_backends: List[Dict[str, Any]] = field(default_factory=list)
+    llm_concurrency: Optional[int] = None
+    llm_fallback_model: str = ""
+    llm_queue_size: int = 64
+    llm_fallback_latency: float = 20.0
+    llm_timeout: float = 180
+    llm_letter_budget: float = 0.0
+    llm_budget_retries: int = 1
+    prompt_max_body_chars: int = 1500
+    offer_optimizer: bool = False
+    classifier_dataset: str = ""
+    classifier_model: str = ""
+    classifier_threshold: float = 0.9
+    negotiation_enabled: bool = False
+    negotiation_timeout: float = 120.0
+    negotiation_max_rounds: int = 3
+    gold_pricing_enabled: bool = False
+    gold_price_initial: float = 1.0
+    gold_price_alpha: float = 0.2
+    gold_price_margin: float = 0.5
+    gold_offer_interval: float = 30.0
+    gold_offer_ttl: float = 120.0
+    coalition_dir: str = ""
+    coalition_ttl: float = 60.0
+    info_streaming: bool = False
+    dashboard_enabled: bool = False
+    dashboard_ttl: float = 30.0
+    trade_cycles_enabled: bool = False
+    trade_cycle_max_len: int = 4
+    trade_cycle_timeout: float = 120.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Config":
+        """Construye la configuración convirtiendo cada valor al tipo del campo."""
+        tipos = {f.name: f.type for f in fields(cls)}
+        desconocidas = set(data) - set(tipos)
+        if desconocidas:
+            raise ConfigError(f"Claves de configuración desconocidas: {sorted(desconocidas)}")
+        valores: Dict[str, Any] = {}
+        for clave, valor in data.items():
+            valores[clave] = _coerce(clave, tipos[clave], valor)
+        try:
+            config = cls(**valores)
+        except TypeError as e:
+            raise ConfigError(f"Falta una clave obligatoria en la configuración: {e}") from e
+        config.validate()
+        if not config.llm_backends and (config.llm_concurrency is not None or config.llm_fallback_model):
+            config.llm_backends = [{}]
+        if config.llm_concurrency is not None:
+            for backend in config.llm_backends:
+                backend["concurrency"] = config.llm_concurrency
+        if config.llm_fallback_model:
+            for backend in config.llm_backends:
+                backend.setdefault("fallback_model", config.llm_fallback_model)
+        return config
+
+    def validate(self) -> None:
+        """Comprueba URLs, números positivos y la forma de los backends."""
+        for clave in ("api_base", "ollama_url"):
+            valor = getattr(self, clave)
+            if not valor.startswith(("http://", "https://")):
+                raise ConfigError(f"'{clave}' debe ser una URL http(s): {valor!r}")
+        for clave in (
+            "llm_queue_size",
+            "llm_fallback_latency",
+            "llm_timeout",
+            "prompt_max_body_chars",
+            "negotiation_timeout",
+            "negotiation_max_rounds",
+            "gold_price_initial",
+            "gold_offer_interval",
+            "gold_offer_ttl",
+            "coalition_ttl",
+            "dashboard_ttl",
+            "trade_cycle_timeout",
+        ):
+            if getattr(self, clave) <= 0:
+                raise ConfigError(f"'{clave}' debe ser positivo")
+        if self.llm_letter_budget < 0:
+            raise ConfigError("'llm_letter_budget' no puede ser negativo (0 = sin límite)")
+        if self.llm_budget_retries < 0:
+            raise ConfigError("'llm_budget_retries' no puede ser negativo")
+        if self.trade_cycle_max_len < 3:
+            raise ConfigError("'trade_cycle_max_len' debe ser al menos 3")
+        if not 0.0 < self.gold_price_alpha <= 1.0:
+            raise ConfigError("'gold_price_alpha' debe estar en (0, 1]")
+        if self.gold_price_margin < 0:
+            raise ConfigError("'gold_price_margin' no puede ser negativo")
+        if not 0.0 <= self.classifier_threshold <= 1.0:
+            raise ConfigError("'classifier_threshold' debe estar entre 0 y 1")
+        if self.llm_concurrency is not None and self.llm_concurrency < 1:
+            raise ConfigError("'llm_concurrency' debe ser al menos 1")
+        for i, backend in enumerate(self.llm_backends):
+            if not isinstance(backend, dict):
+                raise ConfigError(f"llm_backends[{i}] debe ser un objeto")
+
+    @property
+    def mailbox_url(self) -> str:
+        return self.api_base + self.mailbox_endpoint
+
+    @property
+    def letter_url(self) -> str:
+        return self.api_base + self.letter_endpoint
+
+    @property
+    def package_url(self) -> str:
+        return self.api_base + self.package_endpoint
+
+    @property
+    def dashboard_url(self) -> str:
+        return self.api_base + self.dashboard_endpoint
 
-def _load_config() -> dict:
-    with open(_CONFIG_PATH, encoding="utf-8") as f:
+
+# Cadenas aceptadas para los campos booleanos; cualquier otra es un error.
+_VERDADERO = ("1", "true", "si", "sí", "yes")
+_FALSO = ("0", "false", "no")
+
+
+def _coerce(clave: str, tipo: Any, valor: Any) -> Any:
+    """Convierte valores (p. ej. cadenas de entorno) al tipo del campo."""
+    if valor is None:
+        return None
+    try:
+        if tipo in (int, Optional[int]):
+            return int(valor)
+        if tipo is bool:
+            if isinstance(valor, str):
+                texto = valor.strip().lower()
+                if texto in _VERDADERO:
+                    return True
+                if texto in _FALSO:
+                    return False
+                raise ValueError(valor)
+            if isinstance(valor, (bool, int)) and valor in (0, 1):
+                return bool(valor)
+            raise ValueError(valor)
+        if tipo is float:
+            return float(valor)
+        if tipo is str:
+            return str(valor)
+        if isinstance(valor, str):
+            # Listas (llm_backends) pasadas como JSON desde el entorno.
+            return json.loads(valor)
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"Valor inválido para '{clave}': {valor!r}") from e
+    return valor
+
+
+_config: Optional[Config] = None
+_overrides: Dict[str, Any] = {}
+
+
+def _load_config(path: Path) -> dict:
+    with open(path, encoding="utf-8") as f:
         return json.load(f)
 
 
-_c = _load_config()
+def configure(path: Optional[str] = None, **overrides: Any) -> Config:
+    """
+    Fija sobrescrituras (p. ej. de la línea de comandos) y recarga la
+    configuración. Los valores None se ignoran.
+    """
+    global _config, _CONFIG_PATH
+    if path:
+        _CONFIG_PATH = Path(path)
+    _overrides.update({k: v for k, v in overrides.items() if v is not None})
+    _config = None
+    return get_config()
+
+
+def get_config() -> Config:
+    """
+    Devuelve la configuración, leyéndola la primera vez que se pide.
+    Prioridad: línea de comandos > entorno (FDI_*) > config.json.
+    """
+    global _config
+    if _config is None:
+        data = _load_config(Path(os.environ.get("FDI_CONFIG", _CONFIG_PATH)))
+        for var, clave in ENV_OVERRIDES.items():
+            if var in os.environ:
+                data[clave] = os.environ[var]
+        data.update(_overrides)
+        _config = Config.from_dict(data)
+    return _config
+
+
+# Nombres antiguos del módulo, resueltos al acceder (ver __getattr__).
+_LEGACY: Dict[str, Callable[[Config], Any]] = {
+    "API_BASE": lambda c: c.api_base,
+    "OLLAMA_URL": lambda c: c.ollama_url,
+    "MODEL": lambda c: c.model,
+    "GOLD_RESOURCE_NAME": lambda c: c.gold_resource_name,
+    "MAILBOX_ENDPOINT": lambda c: c.mailbox_url,
+    "LETTER_ENDPOINT": lambda c: c.letter_url,
+    "PACKAGE_ENDPOINT": lambda c: c.package_url,
+    "ALIAS": lambda c: c.alias,
+    "LLM_BACKENDS": lambda c: c.llm_backends,
+    "LLM_QUEUE_SIZE": lambda c: c.llm_queue_size,
+    "LLM_FALLBACK_LATENCY": lambda c: c.llm_fallback_latency,
+    "LLM_TIMEOUT": lambda c: c.llm_timeout,
+    "PROMPT_MAX_BODY_CHARS": lambda c: c.prompt_max_body_chars,
+}
+
 
-API_BASE = _c["api_base"]
-OLLAMA_URL = _c["ollama_url"]
-MODEL = _c["model"]
-GOLD_RESOURCE_NAME = _c["gold_resource_name"]
-MAILBOX_ENDPOINT = API_BASE + _c["mailbox_endpoint"]
-LETTER_ENDPOINT = API_BASE + _c["letter_endpoint"]
-PACKAGE_ENDPOINT = API_BASE + _c["package_endpoint"]
-ALIAS = _c.get("alias", "")
+def __getattr__(name: str) -> Any:
+    if name in _LEGACY:
+        return _LEGACY[name](get_config())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,360 @@
+"""
+Intercambios en ciclo: grafo quiere/tiene entre jugadores y búsqueda de
+ciclos de longitud acotada que pasan por nosotros, para desbloquear
+partidas en las que no hay ningún intercambio bilateral posible (A
+necesita lo de B, B lo de C y C lo de A).
+
+El grafo se alimenta de las cartas de estado (bloque "estado" del
+protocolo), de las ofertas observadas, del dashboard (`State.market`) y
+de nuestro `State`. Hay una arista u -> v por cada recurso que le sobra a
+u y necesita v. Los índices por recurso se actualizan solo para el
+jugador que cambia y la búsqueda se repite solo si el grafo ha cambiado.
+
+Un ciclo  nosotros -r0-> v1 -r1-> v2 ... vk -rk-> nosotros  se ejecuta
+como una cadena de intercambios 1 a 1 en la que hacemos de intermediario:
+con v1 damos r0 por r1, con v2 damos r1 por r2, ..., y con vk damos
+r(k-1) por rk, que es lo que necesitamos. Cada tramo es una oferta normal
+que el otro acepta porque recibe lo que necesita a cambio de lo que le
+sobra; el siguiente tramo se propone cuando llega el recurso del anterior.
+"""
+
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from . import api
+from .config import get_config
+from .game_state import State
+from .letters import build_simple_offer_letter, build_trade_confirmation_letter
+from .protocol import new_trade_id
+
+# Arista del ciclo: (quien da, quien recibe, recurso).
+Arista = Tuple[str, str, str]
+
+# Tope de ciclos por búsqueda (la búsqueda es exponencial en la longitud).
+MAX_CICLOS = 64
+
+
+def _positive(value: Any) -> Dict[str, int]:
+    try:
+        return {k: int(v) for k, v in (value or {}).items() if int(v) > 0}
+    except (AttributeError, TypeError, ValueError):
+        return {}
+
+
+class WantHaveGraph:
+    """Necesidades y excedentes conocidos de cada jugador (con índice recurso -> quién lo necesita)."""
+
+    def __init__(self) -> None:
+        self.needs: Dict[str, Dict[str, int]] = {}
+        self.surplus: Dict[str, Dict[str, int]] = {}
+        self._quieren: Dict[str, Set[str]] = defaultdict(set)
+        self.version = 0
+
+    def observe(
+        self,
+        alias: str,
+        needs: Dict[str, int],
+        surplus: Dict[str, int],
+        parcial: bool = False,
+    ) -> bool:
+        """
+        Actualiza lo que sabemos de `alias`. Con `parcial` (p. ej. una
+        oferta, que solo muestra una parte) se combina con lo anterior en
+        lugar de sustituirlo. Devuelve True si el grafo ha cambiado.
+        """
+        oro = get_config().gold_resource_name
+        needs = {r: c for r, c in _positive(needs).items() if r != oro}
+        surplus = {r: c for r, c in _positive(surplus).items() if r != oro}
+        if parcial:
+            needs = {**self.needs.get(alias, {}), **needs}
+            surplus = {**self.surplus.get(alias, {}), **surplus}
+        if self.needs.get(alias) == needs and self.surplus.get(alias) == surplus:
+            return False
+        for r in self.needs.get(alias, {}):
+            self._quieren[r].discard(alias)
+        self.needs[alias] = needs
+        self.surplus[alias] = surplus
+        for r in needs:
+            self._quieren[r].add(alias)
+        self.version += 1
+        return True
+
+    def load_market(self, market: Dict[str, Dict[str, Dict[str, int]]]) -> None:
+        """Vuelca la tabla del dashboard (ver `State.market`)."""
+        for alias, fila in market.items():
+            self.observe(alias, fila.get("needs", {}), fila.get("surplus", {}))
+
+    def _aristas(self, alias: str) -> List[Tuple[str, str]]:
+        """(recurso, receptor) de las aristas que salen de `alias`."""
+        return [
+            (r, v)
+            for r in sorted(self.surplus.get(alias, {}))
+            for v in sorted(self._quieren.get(r, ()))
+            if v != alias
+        ]
+
+    def cycles(self, origen: str, max_len: int, min_len: int = 3) -> List[List[Arista]]:
+        """
+        Ciclos simples de `min_len` a `max_len` jugadores que empiezan y
+        terminan en `origen`, de más corto a más largo (como mucho
+        MAX_CICLOS).
+        """
+        encontrados: List[List[Arista]] = []
+        camino: List[Arista] = []
+        visitados = {origen}
+
+        def dfs(actual: str) -> None:
+            for recurso, siguiente in self._aristas(actual):
+                if len(encontrados) >= MAX_CICLOS:
+                    return
+                if siguiente == origen:
+                    if len(camino) + 1 >= min_len:
+                        encontrados.append(camino + [(actual, siguiente, recurso)])
+                    continue
+                if siguiente in visitados or len(camino) + 2 > max_len:
+                    continue
+                visitados.add(siguiente)
+                camino.append((actual, siguiente, recurso))
+                dfs(siguiente)
+                camino.pop()
+                visitados.discard(siguiente)
+
+        dfs(origen)
+        return sorted(encontrados, key=len)
+
+
+@dataclass
+class Chain:
+    """Ciclo en curso: tramos (socio, damos, recibimos) y el tramo actual."""
+
+    tramos: List[Tuple[str, str, str]]
+    clave: Tuple[Arista, ...]
+    paso: int = 0
+    enviado: float = 0.0
+    reenviado: bool = False
+    trade_ids: List[str] = field(default_factory=list)
+    # Id de intercambio -> tramo al que corresponde, y tramos ya confirmados.
+    ids_tramo: Dict[str, int] = field(default_factory=dict)
+    recibidos: Set[int] = field(default_factory=set)
+
+
+class CycleCoordinator:
+    """
+    Busca ciclos que pasan por nosotros y, si no hay ningún intercambio
+    bilateral posible, los ejecuta tramo a tramo, con como mucho una cadena
+    abierta. Un tramo sin respuesta se vuelve a
+    proponer a mitad de `timeout` y la cadena se abandona al agotarlo; un
+    ciclo abandonado no se reintenta hasta pasados otros `timeout` segundos.
+    """
+
+    def __init__(
+        self,
+        graph: Optional[WantHaveGraph] = None,
+        max_len: Optional[int] = None,
+        timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        config = get_config()
+        self.graph = graph if graph is not None else WantHaveGraph()
+        self.max_len = max_len if max_len is not None else config.trade_cycle_max_len
+        self.timeout = timeout if timeout is not None else config.trade_cycle_timeout
+        self.clock = clock
+        self.cadena: Optional[Chain] = None
+        self.ciclos_encontrados = 0
+        self.cadenas_iniciadas = 0
+        self.cadenas_completadas = 0
+        self.cadenas_abandonadas = 0
+        self.tramos_completados = 0
+        self._ciclos: List[List[Arista]] = []
+        self._version_buscada: Optional[Tuple[str, int]] = None
+        self._descartados: Dict[Tuple[Arista, ...], float] = {}
+        # Recursos recibidos como intermediarios que aún no hemos pasado.
+        self._intermedios: Counter = Counter()
+        self.intermedios_cedidos = 0
+
+    def observe(self, remitente: str, analisis: Dict[str, Any]) -> None:
+        """
+        Aprende de una carta analizada: estado completo u oferta parcial. Una
+        confirmación con el id de un tramo pendiente lo marca como recibido;
+        una oferta del socio que coincide con un tramo aporta su id (si la
+        aceptamos, su cierre llegará con ese id).
+        """
+        if self.cadena is not None and analisis.get("ids"):
+            self._match_leg(self.cadena, remitente, analisis)
+        if analisis.get("protocolo") == "estado":
+            self.graph.observe(remitente, analisis.get("pide") or {}, analisis.get("oferta") or {})
+        elif analisis.get("tipo") == "oferta":
+            self.graph.observe(
+                remitente, analisis.get("pide") or {}, analisis.get("oferta") or {}, parcial=True
+            )
+
+    def _match_leg(self, cadena: Chain, remitente: str, analisis: Dict[str, Any]) -> None:
+        protocolo = analisis.get("protocolo")
+        for i in range(cadena.paso, len(cadena.tramos)):
+            socio, damos, recibimos = cadena.tramos[i]
+            if remitente != socio:
+                continue
+            if protocolo in ("confirmacion", "cierre"):
+                if (analisis.get("recursos_recibidos") or {}).get(recibimos, 0) > 0 and any(
+                    cadena.ids_tramo.get(trade_id) == i for trade_id in analisis["ids"]
+                ):
+                    cadena.recibidos.add(i)
+                    return
+            elif (
+                protocolo == "oferta"
+                and (analisis.get("oferta") or {}).get(recibimos, 0) > 0
+                and (analisis.get("pide") or {}).get(damos, 0) > 0
+            ):
+                for trade_id in analisis["ids"]:
+                    cadena.ids_tramo[trade_id] = i
+                return
+
+    def _search(self, alias: str) -> List[List[Arista]]:
+        clave = (alias, self.graph.version)
+        if clave != self._version_buscada:
+            self._ciclos = self.graph.cycles(alias, self.max_len, min_len=2)
+            self._version_buscada = clave
+            self.ciclos_encontrados = sum(1 for c in self._ciclos if len(c) > 2)
+        return self._ciclos
+
+    def _send_leg(self, state: State, cadena: Chain) -> bool:
+        socio, damos, recibimos = cadena.tramos[cadena.paso]
+        trade_id = new_trade_id()
+        try:
+            print(f"→ Ciclo (tramo {cadena.paso + 1}/{len(cadena.tramos)}): a {socio} 1 {damos} por 1 {recibimos}")
+            api.send_letter(
+                socio,
+                f"Oferta: 1 {recibimos} por 1 {damos}",
+                build_simple_offer_letter(recibimos, damos, trade_id),
+            )
+        except Exception as e:
+            print(f"ERROR enviando tramo de ciclo a {socio}: {e}")
+            return False
+        cadena.enviado = self.clock()
+        cadena.trade_ids.append(trade_id)
+        cadena.ids_tramo[trade_id] = cadena.paso
+        return True
+
+    def _abandon(self, cadena: Chain, motivo: str) -> None:
+        print(f"Ciclo abandonado: {motivo}")
+        self._descartados[cadena.clave] = self.clock() + self.timeout
+        self.cadenas_abandonadas += 1
+        self.cadena = None
+
+    def _leg_done(self, cadena: Chain) -> None:
+        """Cuenta el tramo actual como recibido y pasa al siguiente (o cierra la cadena)."""
+        _, damos, recibimos = cadena.tramos[cadena.paso]
+        self.tramos_completados += 1
+        if self._intermedios[damos] > 0:
+            self._intermedios[damos] -= 1
+        cadena.paso += 1
+        cadena.reenviado = False
+        if cadena.paso < len(cadena.tramos):
+            self._intermedios[recibimos] += 1
+            return
+        print(f"Ciclo completado: {' -> '.join(s for s, _, _ in cadena.tramos)}")
+        self.cadenas_completadas += 1
+        self.cadena = None
+
+    def _advance(self, state: State, cadena: Chain) -> None:
+        if cadena.paso in cadena.recibidos:
+            self._leg_done(cadena)
+            if self.cadena is None or cadena.paso in cadena.recibidos:
+                return
+            if not self._send_leg(state, cadena):
+                self._abandon(cadena, "no se pudo proponer el siguiente tramo")
+            return
+        espera = self.clock() - cadena.enviado
+        if espera >= self.timeout:
+            self._abandon(cadena, f"sin respuesta de {cadena.tramos[cadena.paso][0]}")
+        elif espera >= self.timeout / 2 and not cadena.reenviado:
+            cadena.reenviado = True
+            self._send_leg(state, cadena)
+
+    def step(self, state: State) -> None:
+        """
+        Actualiza el grafo con nuestro estado y el dashboard, avanza la
+        cadena abierta o, si no hay, inicia la del ciclo más corto viable.
+        """
+        self.graph.observe(state.alias, state.needs, state.surplus)
+        self.graph.load_market(state.market)
+        if self.cadena is not None:
+            self._advance(state, self.cadena)
+            return
+        if not state.needs:
+            return
+        ahora = self.clock()
+        for ciclo in self._search(state.alias):
+            if len(ciclo) == 2:
+                # Hay intercambio bilateral posible: de eso se encarga el flujo normal.
+                return
+            clave = tuple(ciclo)
+            if self._descartados.get(clave, 0.0) > ahora:
+                continue
+            primero, ultimo = ciclo[0][2], ciclo[-1][2]
+            if state.surplus.get(primero, 0) < 1 or state.needs.get(ultimo, 0) < 1:
+                continue
+            # Tramo i: con el receptor de la arista i damos lo que recibe y
+            # pedimos lo que da en la arista i + 1.
+            tramos = [(ciclo[i][1], ciclo[i][2], ciclo[i + 1][2]) for i in range(len(ciclo) - 1)]
+            self.cadena = Chain(tramos, clave)
+            print(f"Ciclo de intercambio encontrado: {' -> '.join(d for d, _, _ in ciclo)} -> {state.alias}")
+            if self._send_leg(state, self.cadena):
+                self.cadenas_iniciadas += 1
+            else:
+                self._abandon(self.cadena, "no se pudo proponer el primer tramo")
+            return
+
+    def release(self, state: State) -> int:
+        """
+        Al cumplir el objetivo: cede los recursos que tenemos solo como
+        intermediarios a quienes los necesitan (primero al socio del tramo
+        pendiente), para no dejar bloqueadas sus cadenas. Devuelve las
+        unidades cedidas. Un tramo ya confirmado cuenta antes de ceder (y, si
+        era el último, la cadena como completada).
+        """
+        while self.cadena is not None and self.cadena.paso in self.cadena.recibidos:
+            self._leg_done(self.cadena)
+        pendiente = self.cadena.tramos[self.cadena.paso][0] if self.cadena is not None else None
+        cedidas = 0
+        for recurso, cant in sorted(self._intermedios.items()):
+            cant = min(cant, state.surplus.get(recurso, 0))
+            quieren = sorted(
+                (alias for alias in self.graph._quieren.get(recurso, ()) if alias != state.alias),
+                key=lambda alias: (alias != pendiente, -self.graph.needs[alias].get(recurso, 0)),
+            )
+            for alias in quieren:
+                if cant == 0:
+                    break
+                envio = {recurso: min(cant, self.graph.needs[alias][recurso])}
+                try:
+                    print(f"→ Cediendo intermediario de ciclo a {alias}: {envio}")
+                    api.send_package(alias, envio)
+                    api.send_letter(
+                        alias,
+                        "Confirmación de envío de recursos",
+                        build_trade_confirmation_letter(envio, {}, cierre=True),
+                    )
+                except Exception as e:
+                    print(f"ERROR cediendo {envio} a {alias}: {e}")
+                    continue
+                cant -= envio[recurso]
+                cedidas += envio[recurso]
+        self._intermedios.clear()
+        self.cadena = None
+        self.intermedios_cedidos += cedidas
+        return cedidas
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jugadores_conocidos": len(self.graph.needs),
+            "ciclos_encontrados": self.ciclos_encontrados,
+            "cadenas_iniciadas": self.cadenas_iniciadas,
+            "cadenas_completadas": self.cadenas_completadas,
+            "cadenas_abandonadas": self.cadenas_abandonadas,
+            "tramos_completados": self.tramos_completados,
+            "intermedios_cedidos": self.intermedios_cedidos,
+            "cadena_abierta": self.cadena is not None,
+        }
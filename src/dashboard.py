@@ -0,0 +1,221 @@
+"""
+Cliente de GET /dashboard: la página para el proyector con el estado de
+todos los puestos. Se descarga como mucho una vez cada `dashboard_ttl`
+segundos y se convierte en una tabla alias -> necesidades/excedentes, de
+modo que podemos dirigir ofertas y descartar ofertas imposibles sin
+esperar (ni analizar con el LLM) las cartas de estado.
+
+La página es HTML sin esquema documentado, así que el parser es tolerante:
+1. JSON incrustado (p. ej. en <script>) con objetos tipo InfoPuesto
+   ("Alias", "Recursos", "Objetivo").
+2. Tablas HTML con una columna de alias y una columna por recurso, con
+   celdas "tiene/objetivo" ("3/5", "3 de 5"); o columnas "Recursos" y
+   "Objetivo" con listas "madera: 3, piedra: 2".
+"""
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import api
+from .config import get_config
+from .game_state import State
+
+_RE_ALIAS = re.compile(r"alias|jugador|puesto|nombre|agente|equipo", re.IGNORECASE)
+_RE_TIENE_OBJETIVO = re.compile(r"^\s*(\d+)\s*(?:/|de|of)\s*(\d+)\s*$", re.IGNORECASE)
+_RE_NUMERO = re.compile(r"^\s*(\d+)\s*$")
+_RE_PARES = re.compile(r"([^\W\d_][\w ]*?)\s*[:=]\s*(\d+)", re.UNICODE)
+
+
+@dataclass
+class PlayerRow:
+    """Estado de un jugador según el dashboard."""
+
+    inventario: Dict[str, int] = field(default_factory=dict)
+    objetivo: Dict[str, int] = field(default_factory=dict)
+    needs: Dict[str, int] = field(default_factory=dict)
+    surplus: Dict[str, int] = field(default_factory=dict)
+
+
+def _row(inventario: Dict[str, int], objetivo: Dict[str, int]) -> PlayerRow:
+    needs, surplus = State._compute_needs_and_surplus(inventario, objetivo)
+    return PlayerRow(inventario, objetivo, needs, surplus)
+
+
+def _int_dict(value: Any) -> Optional[Dict[str, int]]:
+    if not isinstance(value, dict):
+        return None
+    try:
+        return {str(k): int(v) for k, v in value.items()}
+    except (TypeError, ValueError):
+        return None
+
+
+class _PageParser(HTMLParser):
+    """Extrae el texto de los <script> y las celdas de cada <table>."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.scripts: List[str] = []
+        self.tables: List[List[List[Tuple[bool, str]]]] = []
+        self._en_script = False
+        self._tabla: Optional[List[List[Tuple[bool, str]]]] = None
+        self._celda: Optional[List[str]] = None
+        self._es_cabecera = False
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag == "script":
+            self._en_script = True
+            self.scripts.append("")
+        elif tag == "table":
+            self._tabla = []
+            self.tables.append(self._tabla)
+        elif tag == "tr" and self._tabla is not None:
+            self._tabla.append([])
+        elif tag in ("td", "th") and self._tabla is not None:
+            self._celda = []
+            self._es_cabecera = tag == "th"
+        elif tag == "br" and self._celda is not None:
+            self._celda.append(", ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script":
+            self._en_script = False
+        elif tag == "table":
+            self._tabla = None
+        elif tag in ("td", "th") and self._celda is not None and self._tabla:
+            self._tabla[-1].append((self._es_cabecera, " ".join("".join(self._celda).split())))
+            self._celda = None
+
+    def handle_data(self, data: str) -> None:
+        if self._en_script:
+            self.scripts[-1] += data
+        elif self._celda is not None:
+            self._celda.append(data)
+
+
+def _json_objects(texto: str) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    pos = texto.find("{")
+    while pos != -1:
+        try:
+            valor, fin = decoder.raw_decode(texto, pos)
+        except json.JSONDecodeError:
+            pos = texto.find("{", pos + 1)
+            continue
+        yield valor
+        pos = texto.find("{", fin)
+
+
+def _from_json(valor: Any, clave: Optional[str], tabla: Dict[str, PlayerRow]) -> None:
+    """Busca recursivamente objetos tipo InfoPuesto."""
+    if isinstance(valor, list):
+        for item in valor:
+            _from_json(item, None, tabla)
+        return
+    if not isinstance(valor, dict):
+        return
+    recursos = _int_dict(valor.get("Recursos"))
+    objetivo = _int_dict(valor.get("Objetivo"))
+    if recursos is not None and objetivo is not None:
+        alias = valor.get("Alias") or valor.get("alias") or clave
+        if isinstance(alias, list):
+            alias = alias[0] if alias else None
+        if isinstance(alias, str) and alias:
+            tabla[alias] = _row(recursos, objetivo)
+        return
+    for k, v in valor.items():
+        _from_json(v, str(k), tabla)
+
+
+def _pairs(texto: str) -> Dict[str, int]:
+    return {r.strip().lower(): int(c) for r, c in _RE_PARES.findall(texto)}
+
+
+def _from_table(filas: List[List[Tuple[bool, str]]], tabla: Dict[str, PlayerRow]) -> None:
+    if len(filas) < 2:
+        return
+    cabecera = [texto.lower() for _, texto in filas[0]]
+    i_alias = next((i for i, h in enumerate(cabecera) if _RE_ALIAS.search(h)), 0)
+    i_recursos = next((i for i, h in enumerate(cabecera) if "recurso" in h or "inventario" in h), None)
+    i_objetivo = next((i for i, h in enumerate(cabecera) if "objetivo" in h), None)
+    for fila in filas[1:]:
+        celdas = [texto for _, texto in fila]
+        if len(celdas) <= i_alias or not celdas[i_alias]:
+            continue
+        alias = celdas[i_alias]
+        if i_recursos is not None and i_objetivo is not None:
+            if max(i_recursos, i_objetivo) < len(celdas):
+                tabla[alias] = _row(_pairs(celdas[i_recursos]), _pairs(celdas[i_objetivo]))
+            continue
+        inventario: Dict[str, int] = {}
+        objetivo: Dict[str, int] = {}
+        for i, texto in enumerate(celdas):
+            if i == i_alias or i >= len(cabecera) or not cabecera[i]:
+                continue
+            recurso = cabecera[i]
+            m = _RE_TIENE_OBJETIVO.match(texto)
+            if m:
+                inventario[recurso], objetivo[recurso] = int(m.group(1)), int(m.group(2))
+                continue
+            m = _RE_NUMERO.match(texto)
+            if m:
+                # Sin objetivo conocido: lo tratamos como ya cumplido.
+                inventario[recurso] = objetivo[recurso] = int(m.group(1))
+        if inventario:
+            tabla[alias] = _row(inventario, objetivo)
+
+
+def parse_dashboard(html: str) -> Dict[str, PlayerRow]:
+    """Tabla alias -> PlayerRow a partir del HTML de /dashboard."""
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    tabla: Dict[str, PlayerRow] = {}
+    for script in parser.scripts:
+        for valor in _json_objects(script):
+            _from_json(valor, None, tabla)
+    if not tabla:
+        for filas in parser.tables:
+            _from_table(filas, tabla)
+    return tabla
+
+
+class DashboardClient:
+    """Tabla del dashboard con caché de `ttl` segundos."""
+
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl if ttl is not None else get_config().dashboard_ttl
+        self.clock = clock
+        self.descargas = 0
+        self.errores = 0
+        self._tabla: Dict[str, PlayerRow] = {}
+        self._cuando: Optional[float] = None
+
+    def table(self) -> Dict[str, PlayerRow]:
+        """Tabla actual; se vuelve a descargar si ha caducado. Si falla, se sigue con la anterior."""
+        ahora = self.clock()
+        if self._cuando is not None and ahora - self._cuando < self.ttl:
+            return self._tabla
+        self._cuando = ahora
+        try:
+            self._tabla = parse_dashboard(api.get_dashboard())
+            self.descargas += 1
+        except Exception as e:
+            self.errores += 1
+            print(f"ERROR leyendo el dashboard: {e}")
+        return self._tabla
+
+    def stats(self) -> Dict[str, Any]:
+        return {"jugadores": len(self._tabla), "descargas": self.descargas, "errores": self.errores}
+
+    def market(self, yo: str) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Necesidades y excedentes de los demás jugadores (para `State.market`)."""
+        return {
+            alias: {"needs": dict(fila.needs), "surplus": dict(fila.surplus)}
+            for alias, fila in self.table().items()
+            if alias != yo
+        }
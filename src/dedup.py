@@ -0,0 +1,112 @@
+"""
+Detección de cartas casi duplicadas por remitente (SimHash sobre
+shingles de palabras de asunto + cuerpo). Otros bots reenvían la misma
+oferta cambiando solo id/fecha o alguna palabra; con esto se analiza una
+vez y el resto se reutiliza o, si es una oferta, se descarta.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+_RE_PALABRA = re.compile(r"\w+", re.UNICODE)
+# Cantidad y la palabra que la acompaña ("2 piedra", "1 }").
+_RE_CANTIDAD = re.compile(r"(\w+)\W*(\d+)\W*(\w*)", re.UNICODE)
+
+# Distancia de Hamming máxima entre huellas para considerar dos cartas iguales.
+MAX_DISTANCIA = 10
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str, shingle: int = 2) -> int:
+    """Huella SimHash de 64 bits sobre shingles de `shingle` palabras."""
+    palabras = [p.lower() for p in _RE_PALABRA.findall(text)]
+    if len(palabras) < shingle:
+        palabras = palabras + [""] * (shingle - len(palabras))
+    bits = [
+        format(_hash64(" ".join(palabras[i:i + shingle])), "064b")
+        for i in range(len(palabras) - shingle + 1)
+    ]
+    # Bit a 1 si la mayoría de shingles lo tienen a 1 (recuento por columnas).
+    mitad = len(bits) / 2
+    return int("".join("1" if col.count("1") > mitad else "0" for col in zip(*bits)), 2)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Huella de una carta: SimHash del texto y cantidades exactas que cita."""
+
+    simhash: int
+    cantidades: Tuple[str, ...]
+
+    @classmethod
+    def of(cls, carta: Dict[str, Any]) -> "Fingerprint":
+        texto = f"{carta.get('asunto', '')}\n{carta.get('cuerpo', '')}"
+        cantidades = tuple(" ".join(m).lower() for m in _RE_CANTIDAD.findall(texto))
+        return cls(simhash(texto), cantidades)
+
+    def near(self, other: "Fingerprint", max_distancia: int = MAX_DISTANCIA) -> bool:
+        # Las cantidades y sus palabras vecinas deben coincidir: "1 madera" y
+        # "5 madera", o "2 piedra" y "2 lana", no son la misma oferta.
+        return (
+            self.cantidades == other.cantidades
+            and bin(self.simhash ^ other.simhash).count("1") <= max_distancia
+        )
+
+
+@dataclass
+class _Entry:
+    huella: Fingerprint
+    id_carta: str
+    analisis: Dict[str, Any]
+    pasada: int
+
+
+class NearDuplicateDetector:
+    """
+    Últimas `max_por_remitente` cartas analizadas de cada remitente, con su
+    análisis. Memoria acotada: como mucho `max_remitentes` remitentes (LRU).
+    """
+
+    def __init__(self, max_por_remitente: int = 32, max_remitentes: int = 1000) -> None:
+        self.max_por_remitente = max_por_remitente
+        self.max_remitentes = max_remitentes
+        self.pasada = 0
+        self.descartadas = 0
+        self.reutilizadas = 0
+        self._por_remitente: "OrderedDict[str, Deque[_Entry]]" = OrderedDict()
+
+    def new_pass(self) -> None:
+        """Marca el inicio de una nueva pasada del buzón."""
+        self.pasada += 1
+
+    def lookup(self, remitente: str, huella: Fingerprint) -> Optional[_Entry]:
+        """Carta previa del mismo remitente casi idéntica, si la hay."""
+        entradas = self._por_remitente.get(remitente)
+        if not entradas:
+            return None
+        self._por_remitente.move_to_end(remitente)
+        for entrada in reversed(entradas):
+            if entrada.huella.near(huella):
+                return entrada
+        return None
+
+    def add(
+        self, remitente: str, huella: Fingerprint, id_carta: str, analisis: Dict[str, Any]
+    ) -> None:
+        entradas = self._por_remitente.get(remitente)
+        if entradas is None:
+            entradas = deque(maxlen=self.max_por_remitente)
+            self._por_remitente[remitente] = entradas
+        self._por_remitente.move_to_end(remitente)
+        entradas.append(_Entry(huella, id_carta, analisis, self.pasada))
+        while len(self._por_remitente) > self.max_remitentes:
+            self._por_remitente.popitem(last=False)
+
+    def is_current_pass(self, entrada: _Entry) -> bool:
+        return entrada.pasada == self.pasada
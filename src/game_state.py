@@ -3,11 +3,12 @@ Estado del juego: clase State con alias, inventario, objetivo, necesidades,
 excedentes y buzón. Incluye la lógica de extracción y comprobación de objetivo.
 """
 
-from dataclasses import dataclass
-from typing import Any, Dict, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Set, Tuple
 
 from . import api
-from .config import GOLD_RESOURCE_NAME
+from .config import get_config
+from .info_stream import BUZON
 
 
 @dataclass
@@ -20,6 +21,11 @@ class State:
     - needs: lo que nos falta para el objetivo
     - surplus: lo que nos sobra y podemos ofrecer
     - buzon: cartas recibidas (id -> contenido)
+    - market: necesidades y excedentes de los demás según el dashboard
+      (alias -> {"needs": ..., "surplus": ...}); vacío si no se usa
+    - pendientes: campos de /info (Recursos, Objetivo) que aún no han
+      llegado en la lectura en streaming en curso; mientras no esté vacío,
+      inventario, needs y surplus son los de la lectura anterior
     """
 
     alias: str
@@ -28,6 +34,8 @@ class State:
     needs: Dict[str, int]
     surplus: Dict[str, int]
     buzon: Dict[str, Any]
+    market: Dict[str, Dict[str, Dict[str, int]]] = field(default_factory=dict)
+    pendientes: Set[str] = field(default_factory=set)
 
     @classmethod
     def from_info(cls, info: Dict[str, Any]) -> "State":
@@ -78,7 +86,8 @@ class State:
             if recurso not in objetivo and actual > 0:
                 surplus[recurso] = surplus.get(recurso, 0) + actual
 
-        surplus = {k: v for k, v in surplus.items() if k != GOLD_RESOURCE_NAME}
+        oro = get_config().gold_resource_name
+        surplus = {k: v for k, v in surplus.items() if k != oro}
         return needs, surplus
 
     def update(self) -> None:
@@ -98,8 +107,60 @@ class State:
         self.inventario = {k: int(v) for k, v in raw_recursos.items()}
         self.objetivo = {k: int(v) for k, v in raw_objetivo.items()}
         self.buzon = info.get("Buzon") or {}
+        self.pendientes = set()
         self.recompute()
 
+    def stream_update(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Como `update`, pero leyendo /info en streaming. Devuelve un iterador
+        con las cartas del buzón, que se van descargando a medida que se
+        recorren; solo espera a conocer el alias (si no lo sabíamos ya).
+        El orden documentado de /info pone el buzón antes que Recursos y
+        Objetivo: hasta que llegan, `pendientes` los incluye y el estado es
+        el de la lectura anterior; al llegar se aplican y se recalculan
+        needs y surplus. Las cartas no se guardan en `buzon`, que queda vacío.
+        """
+        self.buzon = {}
+        self.pendientes = {"Recursos", "Objetivo"}
+        eventos = api.stream_info()
+        previas: List[Tuple[str, Dict[str, Any]]] = []
+        if not self.alias:
+            for clave, valor in eventos:
+                if clave == BUZON:
+                    previas.append(valor)
+                    continue
+                self._apply_field(clave, valor)
+                if self.alias:
+                    break
+            if not self.alias:
+                raise ValueError("No se ha encontrado el alias en la respuesta de /info")
+        return self._stream_rest(previas, eventos)
+
+    def _stream_rest(
+        self,
+        previas: List[Tuple[str, Dict[str, Any]]],
+        eventos: Iterator[Tuple[str, Any]],
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        yield from previas
+        for clave, valor in eventos:
+            if clave == BUZON:
+                yield valor
+            else:
+                self._apply_field(clave, valor)
+
+    def _apply_field(self, clave: str, valor: Any) -> None:
+        """Aplica un campo de /info (salvo el buzón) al estado."""
+        if clave in ("Alias", "alias") and valor:
+            self.alias = valor[0] if isinstance(valor, list) else valor
+        elif clave == "Recursos":
+            self.inventario = {k: int(v) for k, v in (valor or {}).items()}
+            self.pendientes.discard(clave)
+            self.recompute()
+        elif clave == "Objetivo":
+            self.objetivo = {k: int(v) for k, v in (valor or {}).items()}
+            self.pendientes.discard(clave)
+            self.recompute()
+
     def recompute(self) -> None:
         """
         Recalcula needs y surplus a partir del inventario y el objetivo actuales.
@@ -108,6 +169,16 @@ class State:
             self.inventario, self.objetivo
         )
 
+    def suppliers(self, recurso: str) -> List[str]:
+        """
+        Jugadores a los que les sobra `recurso` según el dashboard, de
+        mayor a menor excedente.
+        """
+        con_excedente = [
+            (fila.get("surplus", {}).get(recurso, 0), alias) for alias, fila in self.market.items()
+        ]
+        return [alias for cant, alias in sorted(con_excedente, key=lambda x: -x[0]) if cant > 0]
+
     def has_reached_objective(self) -> bool:
         """
         Comprueba si ya hemos alcanzado el objetivo de recursos.
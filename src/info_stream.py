@@ -0,0 +1,113 @@
+"""
+Lectura incremental de la respuesta de /info: en lugar de descargar y
+parsear el cuerpo entero (que incluye todo el buzón), se va decodificando
+a medida que llegan los trozos y se emite cada campo en cuanto está
+completo, y cada carta del buzón por separado.
+
+La memoria usada queda acotada por la carta más grande más un trozo de
+red: el texto ya consumido se descarta del búfer.
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Tuple
+
+# Campo de /info cuyo contenido se emite carta a carta.
+BUZON = "Buzon"
+
+_decoder = json.JSONDecoder()
+_BLANCOS = " \t\n\r"
+
+
+class _NeedMore(Exception):
+    """El búfer aún no contiene el siguiente elemento completo."""
+
+
+class _Buffer:
+    """Texto pendiente de parsear sobre un iterador de trozos de bytes."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> None:
+        """Descarta lo consumido y añade el siguiente trozo (o marca el final)."""
+        if self.eof:
+            raise ValueError("Respuesta de /info incompleta")
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.text += self._utf8.decode(chunk)
+                return
+        self.text += self._utf8.decode(b"", final=True)
+        self.eof = True
+
+    def _skip_blank(self) -> None:
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _BLANCOS:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return
+            self.fill()
+
+    def peek(self) -> str:
+        self._skip_blank()
+        return self.text[self.pos]
+
+    def expect(self, *chars: str) -> str:
+        c = self.peek()
+        if c not in chars:
+            raise ValueError(f"JSON de /info inesperado: {c!r} en lugar de {chars}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        """Siguiente valor JSON completo."""
+        self._skip_blank()
+        while True:
+            try:
+                valor, fin = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                self.fill()
+                continue
+            # Un número al final del búfer puede seguir en el próximo trozo.
+            if fin == len(self.text) and not self.eof:
+                self.fill()
+                continue
+            self.pos = fin
+            return valor
+
+
+def _members(buf: _Buffer) -> Iterator[str]:
+    """Claves de un objeto JSON, dejando el búfer al principio de cada valor."""
+    buf.expect("{")
+    if buf.peek() == "}":
+        buf.pos += 1
+        return
+    while True:
+        clave = buf.value()
+        if not isinstance(clave, str):
+            raise ValueError("Clave no válida en el JSON de /info")
+        buf.expect(":")
+        yield clave
+        if buf.expect(",", "}") == "}":
+            return
+
+
+def iter_info(chunks: Iterable[bytes]) -> Iterator[Tuple[str, Any]]:
+    """
+    Recorre un cuerpo de /info en trozos. Emite (campo, valor) para cada
+    campo de primer nivel, salvo el buzón, del que emite (BUZON, (id, carta))
+    por cada carta a medida que se completa.
+    """
+    buf = _Buffer(chunks)
+    for clave in _members(buf):
+        if clave == BUZON and buf.peek() == "{":
+            for uid in _members(buf):
+                yield BUZON, (uid, buf.value())
+        else:
+            yield clave, buf.value()
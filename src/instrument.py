@@ -0,0 +1,40 @@
+"""
+Sustitución temporal de funciones del paquete para instrumentarlas
+(perfilado, grabación y reproducción de partidas).
+"""
+
+import sys
+from typing import Any, Callable, List, Tuple
+
+_PAQUETE = __name__.rsplit(".", 1)[0]
+
+
+class Patcher:
+    """Aplica sustituciones y las deshace en orden inverso con `restore`."""
+
+    def __init__(self) -> None:
+        self._originales: List[Tuple[Any, str, Any]] = []
+
+    def patch(self, modulo: Any, nombre: str, nuevo: Callable[..., Any]) -> None:
+        """
+        Sustituye `modulo.nombre` y las copias importadas con
+        `from ... import nombre` en los demás módulos del paquete.
+        """
+        original = getattr(modulo, nombre)
+        for mod in list(sys.modules.values()):
+            if mod is None or not getattr(mod, "__name__", "").startswith(_PAQUETE):
+                continue
+            if getattr(mod, nombre, None) is original:
+                self.patch_attr(mod, nombre, nuevo)
+        if getattr(modulo, nombre) is original:
+            self.patch_attr(modulo, nombre, nuevo)
+
+    def patch_attr(self, obj: Any, nombre: str, nuevo: Any) -> None:
+        """Sustituye un único atributo (p. ej. `time.sleep`)."""
+        self._originales.append((obj, nombre, getattr(obj, nombre)))
+        setattr(obj, nombre, nuevo)
+
+    def restore(self) -> None:
+        for obj, nombre, original in reversed(self._originales):
+            setattr(obj, nombre, original)
+        self._originales = []
@@ -3,10 +3,14 @@ Generación y análisis de cartas: prompts para Ollama y carta de estado.
 """
 
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from .config import GOLD_RESOURCE_NAME
+from .classifier import get_classifier, record_label
+from .config import get_config
+from .logs import print_bot_dim
 from .ollama_client import ollama
+from .prompts import build_prompt_carta, record_prompt
+from .protocol import append_block, decode, new_trade_id, to_analysis
 
 # JSON Schema para forzar la forma del análisis de cartas (Ollama format).
 ANALIZAR_CARTA_JSON_SCHEMA = {
@@ -45,7 +49,7 @@ def build_status_letter(
     Carta preescrita que enviamos a todos los jugadores con lo que tenemos,
     lo que necesitamos y lo que podemos ofrecer (sin oro).
     """
-    return f"""
+    texto = f"""
 Necesito:
 {json.dumps(needs, ensure_ascii=False, indent=2)}
 
@@ -57,11 +61,13 @@ Si te interesa intercambiar, por favor propón un trato indicando:
 - qué recursos quieres a cambio y cuántas unidades
 - si me has enviado ya recursos (confirmación de envío)
 """.strip()
+    return append_block(texto, "estado", ofrece=surplus, pide=needs)
 
 
 def build_simple_offer_letter(
     recurso_necesario: str,
     recurso_sobrante: str,
+    trade_id: Optional[str] = None,
 ) -> str:
     """
     Genera una 'mini carta' muy simple proponiendo un intercambio 1 a 1:
@@ -70,21 +76,86 @@ def build_simple_offer_letter(
 
     Ejemplo: "Te propongo intercambiar 1 piedra por 1 tela."
     """
-    return (
+    texto = (
         f"Te propongo intercambiar 1 {recurso_necesario} que necesito "
         f"por 1 {recurso_sobrante} que te ofrezco."
     )
+    return append_block(
+        texto,
+        "oferta",
+        ofrece={recurso_sobrante: 1},
+        pide={recurso_necesario: 1},
+        ids=[trade_id or new_trade_id()],
+    )
+
+
+def build_counter_offer_letter(
+    ofrece: Dict[str, int],
+    pide: Dict[str, int],
+    trade_id: str,
+) -> str:
+    """
+    Contraoferta a una oferta que no podemos aceptar tal cual: lo que
+    estamos dispuestos a dar y lo que pedimos a cambio.
+    """
+    texto = f"""
+No puedo aceptar tu oferta tal cual, pero te propongo este intercambio.
+
+Te doy:
+{json.dumps(ofrece, ensure_ascii=False, indent=2)}
+
+A cambio de:
+{json.dumps(pide, ensure_ascii=False, indent=2)}
+
+Si te interesa, envíame tu parte y te mando la mía.
+""".strip()
+    return append_block(texto, "oferta", ofrece=ofrece, pide=pide, ids=[trade_id])
+
+
+def build_gold_offer_letter(
+    recurso: str,
+    cantidad: int,
+    precio: int,
+    trade_id: str,
+) -> str:
+    """
+    Oferta de compra: pagamos `precio` unidades de oro por `cantidad`
+    unidades de `recurso`.
+    """
+    oro = get_config().gold_resource_name
+    texto = (
+        f"Te compro {cantidad} {recurso} por {precio} {oro}. "
+        f"Si aceptas, envíame el {recurso} y te mando el {oro}."
+    )
+    return append_block(
+        texto, "oferta", ofrece={oro: precio}, pide={recurso: cantidad}, ids=[trade_id]
+    )
 
 
 def build_trade_confirmation_letter(
     recursos_enviados: Dict[str, int],
     recursos_esperados: Dict[str, int],
+    trade_ids: Optional[List[str]] = None,
+    cierre: bool = False,
 ) -> str:
     """
     Carta prefabricada para confirmar que hemos aceptado una oferta:
     indicamos qué recursos hemos enviado y cuáles esperamos recibir.
+    Con `cierre`, es la respuesta a una confirmación: enviamos nuestra parte
+    y no esperamos nada más, para que el otro no vuelva a enviar.
     """
-    return f"""
+    if cierre:
+        texto = f"""
+Hemos completado el intercambio.
+
+Te he enviado los recursos acordados:
+{json.dumps(recursos_enviados, ensure_ascii=False, indent=2)}
+
+Ya recibí los tuyos, no tienes que enviar nada más.
+""".strip()
+        return append_block(texto, "cierre", enviado=recursos_enviados, ids=trade_ids)
+
+    texto = f"""
 He aceptado tu oferta.
 
 Te he enviado los recursos que pedías:
@@ -93,6 +164,13 @@ Te he enviado los recursos que pedías:
 Espero recibir a cambio los recursos que ofrecías:
 {json.dumps(recursos_esperados, ensure_ascii=False, indent=2)}
 """.strip()
+    return append_block(
+        texto,
+        "confirmacion",
+        pide=recursos_esperados,
+        enviado=recursos_enviados,
+        ids=trade_ids or [new_trade_id()],
+    )
 
 
 def analizar_carta(
@@ -103,53 +181,32 @@ def analizar_carta(
     """
     Usa Ollama para interpretar una carta y devolver un JSON con
     tipo (oferta|confirmacion|otro), oferta, pide, recursos_recibidos.
+    Si hay un clasificador local entrenado y su confianza supera
+    classifier_threshold, se usa su predicción sin llamar al LLM.
+    Las cartas con bloque de protocolo (#FDI-PROTO) se interpretan
+    directamente, sin clasificador ni LLM.
     """
-    prompt = f"""
-Eres un asistente que ayuda a interpretar cartas de intercambio de recursos
-entre agentes en un juego.
-
-Tu tarea es LEER la carta y devolver un JSON estructurado con esta forma:
-
-{{
-  "tipo": "oferta" | "confirmacion" | "otro",
-  "oferta": {{
-    "recurso": cantidad entero
-  }},
-  "pide": {{
-    "recurso": cantidad entero
-  }},
-  "recursos_recibidos": {{
-    "recurso": cantidad entero
-  }}
-}}
-
-Donde:
-- "tipo" = "oferta" si la carta propone un intercambio (yo te doy X, tú me das Y).
-- "tipo" = "confirmacion" si la carta dice que ya nos han enviado recursos.
-- "tipo" = "otro" si no encaja claramente en ninguno de los casos.
-- "oferta" describe lo que EL OTRO agente nos ofrece.
-- "pide" describe lo que EL OTRO agente quiere que le enviemos.
-- "recursos_recibidos" son los recursos que el agente afirma que YA nos ha enviado.
-
-IMPORTANTE:
-- Devuelve SIEMPRE un JSON VÁLIDO, sin texto adicional.
-- Si algún campo no está claro en la carta, devuélvelo como un objeto vacío {{}}.
-
-OFRECEMOS:
-{json.dumps(surplus, ensure_ascii=False, indent=2)}
-
-NECESITAMOS:
-{json.dumps(needs, ensure_ascii=False, indent=2)}
-
-CARTA RECIBIDA (como JSON bruto de la API):
-{json.dumps(carta_dict, ensure_ascii=False, indent=2)}
-"""
+    mensaje = decode(str(carta_dict.get("cuerpo", "")))
+    if mensaje is not None:
+        print_bot_dim(f"[BOT] Carta con protocolo estructurado ({mensaje['t']})")
+        return to_analysis(mensaje)
+
+    clasificador = get_classifier()
+    if clasificador is not None:
+        analisis, confianza = clasificador.predict(carta_dict)
+        if confianza >= get_config().classifier_threshold:
+            print_bot_dim(f"[BOT] Carta clasificada localmente (confianza {confianza:.2f})")
+            return analisis
+
+    prompt = build_prompt_carta(carta_dict, needs, surplus)
+    record_prompt("analizar_carta", prompt)
     respuesta = ollama(prompt, format=ANALIZAR_CARTA_JSON_SCHEMA)
     
     try:
         data = json.loads(respuesta)
         if not isinstance(data, dict):
             raise ValueError("Respuesta no es un dict")
+        record_label(carta_dict, data)
         return data
     except (json.JSONDecodeError, ValueError):
         print("ERROR: Ollama no devolvió JSON válido al analizar carta")
@@ -0,0 +1,285 @@
+"""
+Router de LLM: reparte las llamadas entre varios backends Ollama con una
+cola de prioridad acotada, plazos por petición, reparto según la carga y
+degradación automática a un modelo de texto más pequeño cuando la cola se
+atasca.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import get_config
+from .ollama_client import BudgetExceeded, generate, remaining
+
+# Prioridades: menor número = se atiende antes.
+PRIORIDAD_ALTA = 0
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_BAJA = 2
+
+# Peso de la última muestra en las medias móviles de latencia.
+_EWMA_ALPHA = 0.2
+
+
+class RouterQueueFull(RuntimeError):
+    """La cola del router ha alcanzado su tamaño máximo."""
+
+
+class DeadlineExceeded(BudgetExceeded):
+    """
+    La petición ha superado su plazo antes de obtener respuesta. Es un
+    BudgetExceeded para que `LetterBudget` la trate como plazo agotado.
+    """
+
+
+@dataclass
+class _Request:
+    prompt: str
+    format: Optional[Dict[str, Any]]
+    deadline: float
+    encolada: float
+    future: "Future[str]" = field(default_factory=Future)
+    cancelada: threading.Event = field(default_factory=threading.Event)
+
+
+@dataclass
+class Backend:
+    """
+    Un servidor Ollama con su modelo principal, un modelo de reserva
+    opcional y sus métricas de carga.
+    """
+
+    url: str
+    model: str
+    fallback_model: Optional[str] = None
+    concurrency: int = 1
+    en_curso: int = 0
+    completadas: int = 0
+    fallidas: int = 0
+    degradadas: int = 0
+    latencia_media: float = 0.0
+    espera_media: float = 0.0
+    _cola: List[Tuple[int, float, int, _Request]] = field(default_factory=list)
+
+    def espera_estimada(self) -> float:
+        """Tiempo estimado hasta que una petición nueva empiece a ejecutarse."""
+        pendientes = len(self._cola) + self.en_curso
+        # Sin muestras aún, suponemos 1 s por petición para repartir por carga.
+        latencia = self.latencia_media or 1.0
+        return pendientes * latencia / max(self.concurrency, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "cola": len(self._cola),
+            "en_curso": self.en_curso,
+            "completadas": self.completadas,
+            "fallidas": self.fallidas,
+            "degradadas": self.degradadas,
+            "latencia_media_s": round(self.latencia_media, 3),
+            "espera_media_s": round(self.espera_media, 3),
+        }
+
+
+class LLMRouter:
+    """
+    Router de peticiones al LLM. Es invocable como backend de
+    `ollama_client` (prompt, format) -> str y arranca un hilo por cada
+    hueco de concurrencia de cada backend.
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        queue_size: int = 64,
+        fallback_latency: float = 20.0,
+        timeout: float = 180,
+    ) -> None:
+        if not backends:
+            raise ValueError("El router necesita al menos un backend")
+        self.backends = backends
+        self.queue_size = queue_size
+        self.fallback_latency = fallback_latency
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._workers = [
+            threading.Thread(target=self._worker, args=(b,), daemon=True)
+            for b in backends
+            for _ in range(max(b.concurrency, 1))
+        ]
+        for w in self._workers:
+            w.start()
+
+    @classmethod
+    def from_config(cls) -> "LLMRouter":
+        """Construye el router a partir de `llm_backends` en config.json."""
+        config = get_config()
+        backends = [
+            Backend(
+                url=b.get("url", config.ollama_url),
+                model=b.get("model", config.model),
+                fallback_model=b.get("fallback_model"),
+                concurrency=int(b.get("concurrency", 1)),
+            )
+            for b in config.llm_backends
+        ]
+        return cls(
+            backends,
+            queue_size=config.llm_queue_size,
+            fallback_latency=config.llm_fallback_latency,
+            timeout=config.llm_timeout,
+        )
+
+    def __call__(self, prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Como backend de `ollama_client`: respeta el plazo activo en el hilo
+        que llama (ver `ollama_client.deadline`). Si vence, la petición se
+        cancela (se descarta de la cola o se corta su generación) y se
+        lanza BudgetExceeded.
+        """
+        restante = remaining()
+        if restante is None:
+            return self.generate(prompt, format)
+        req = self._enqueue(prompt, format, PRIORIDAD_NORMAL, min(restante, self.timeout))
+        try:
+            return req.future.result(timeout=max(restante, 0.0))
+        except FutureTimeout:
+            req.cancelada.set()
+            raise BudgetExceeded("Plazo del LLM agotado esperando al router") from None
+
+    def submit(
+        self,
+        prompt: str,
+        format: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORIDAD_NORMAL,
+        timeout: Optional[float] = None,
+    ) -> "Future[str]":
+        """
+        Encola una petición en el backend con menor espera estimada.
+        Lanza RouterQueueFull si la cola total está llena.
+        """
+        return self._enqueue(prompt, format, priority, timeout).future
+
+    def _enqueue(
+        self,
+        prompt: str,
+        format: Optional[Dict[str, Any]],
+        priority: int,
+        timeout: Optional[float],
+    ) -> _Request:
+        ahora = time.monotonic()
+        req = _Request(
+            prompt=prompt,
+            format=format,
+            deadline=ahora + (timeout if timeout is not None else self.timeout),
+            encolada=ahora,
+        )
+        with self._cond:
+            if sum(len(b._cola) for b in self.backends) >= self.queue_size:
+                raise RouterQueueFull(f"Cola del LLM llena ({self.queue_size} peticiones)")
+            backend = min(self.backends, key=Backend.espera_estimada)
+            heapq.heappush(backend._cola, (priority, req.deadline, next(self._seq), req))
+            self._cond.notify_all()
+        return req
+
+    def generate(
+        self,
+        prompt: str,
+        format: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORIDAD_NORMAL,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Como `submit`, pero espera y devuelve la respuesta del modelo."""
+        return self.submit(prompt, format, priority, timeout).result()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Profundidad de cola y latencias por backend."""
+        with self._cond:
+            return [b.stats() for b in self.backends]
+
+    def _next_request(self, backend: Backend) -> _Request:
+        with self._cond:
+            while True:
+                while not backend._cola:
+                    self._cond.wait()
+                _, deadline, _, req = heapq.heappop(backend._cola)
+                if req.cancelada.is_set() or time.monotonic() >= deadline:
+                    backend.fallidas += 1
+                    req.future.set_exception(
+                        DeadlineExceeded("La petición caducó esperando en la cola del LLM")
+                    )
+                    continue
+                backend.en_curso += 1
+                return req
+
+    def _worker(self, backend: Backend) -> None:
+        while True:
+            req = self._next_request(backend)
+            inicio = time.monotonic()
+            espera = inicio - req.encolada
+            # Si la cola de este backend va lenta, pasamos al modelo pequeño.
+            degradar = (
+                backend.fallback_model is not None
+                and max(espera, backend.espera_media) > self.fallback_latency
+            )
+            try:
+                respuesta = self._call(backend, req, degradar)
+            except Exception as e:
+                with self._cond:
+                    backend.en_curso -= 1
+                    backend.fallidas += 1
+                req.future.set_exception(e)
+                continue
+
+            latencia = time.monotonic() - inicio
+            with self._cond:
+                backend.en_curso -= 1
+                backend.completadas += 1
+                backend.degradadas += int(degradar)
+                backend.latencia_media = _ewma(backend.latencia_media, latencia)
+                backend.espera_media = _ewma(backend.espera_media, espera)
+            req.future.set_result(respuesta)
+
+    def _call(self, backend: Backend, req: _Request, degradar: bool) -> str:
+        restante = req.deadline - time.monotonic()
+        if restante <= 0:
+            raise DeadlineExceeded("La petición caducó antes de enviarse al LLM")
+        if degradar:
+            try:
+                return generate(
+                    req.prompt,
+                    req.format,
+                    url=backend.url,
+                    model=backend.fallback_model,
+                    timeout=restante,
+                    plazo=req.deadline,
+                    cancelar=req.cancelada,
+                )
+            except BudgetExceeded:
+                # Plazo agotado o petición cancelada: no tiene sentido reintentar.
+                raise
+            except Exception as e:
+                # El modelo de reserva puede no estar instalado: volvemos al principal.
+                print(f"ERROR con el modelo de reserva {backend.fallback_model}: {e}")
+                restante = req.deadline - time.monotonic()
+                if restante <= 0:
+                    raise DeadlineExceeded("La petición caducó en el modelo de reserva")
+        return generate(
+            req.prompt,
+            req.format,
+            url=backend.url,
+            model=backend.model,
+            timeout=restante,
+            plazo=req.deadline,
+            cancelar=req.cancelada,
+        )
+
+
+def _ewma(media: float, muestra: float) -> float:
+    return muestra if media == 0.0 else (1 - _EWMA_ALPHA) * media + _EWMA_ALPHA * muestra
@@ -25,7 +25,13 @@ def print_section(title: str) -> None:
 
 
 def print_kv(label: str, value: Any, color: str = CYAN) -> None:
-    """Imprime una línea etiquetada con [BOT] y el color indicado."""
+    """
+    Imprime una línea etiquetada con [BOT] y el color indicado. Los dict y
+    list se muestran como JSON en una línea; se formatean aquí, y no en quien
+    llama, para que el perfilado cuente ese tiempo como de logs.
+    """
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
     print(f"{color}{BOLD}[BOT]{RESET} {BOLD}{label}:{RESET} {value}")
 
 
@@ -0,0 +1,98 @@
+"""
+Seguimiento del buzón entre sondeos: recuerda qué cartas ya se han tratado
+(id + hash del contenido) para analizar con el LLM solo las nuevas y
+reintentar el borrado de las que el servidor sigue devolviendo.
+"""
+
+import hashlib
+import heapq
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# A partir de este número de cartas se ordena con un heap en lugar de sorted().
+HEAP_THRESHOLD = 64
+
+
+def letter_hash(content: Dict[str, Any]) -> str:
+    """Hash estable del contenido de una carta."""
+    data = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def oldest_first(buzon: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Recorre las cartas de más antigua a más nueva. Con buzones grandes usa
+    un heap, de modo que la primera carta sale sin ordenar todo el buzón.
+    """
+    if len(buzon) < HEAP_THRESHOLD:
+        yield from sorted(buzon.items(), key=lambda item: item[1].get("fecha", ""))
+        return
+    heap = [(content.get("fecha", ""), i, uid) for i, (uid, content) in enumerate(buzon.items())]
+    heapq.heapify(heap)
+    while heap:
+        _, _, uid = heapq.heappop(heap)
+        yield uid, buzon[uid]
+
+
+class MailboxTracker:
+    """
+    Conjunto acotado (LRU) de cartas ya tratadas: id -> hash del contenido.
+    Una carta con id conocido pero contenido distinto se considera nueva.
+    """
+
+    def __init__(self, max_ids: int = 10000) -> None:
+        self.max_ids = max_ids
+        self._handled: "OrderedDict[str, str]" = OrderedDict()
+        self.nuevas = 0
+        self.repetidas = 0
+
+    def diff(
+        self, buzon: Dict[str, Any]
+    ) -> Tuple[Iterator[Tuple[str, Dict[str, Any]]], List[str]]:
+        """
+        Compara el buzón recibido con lo ya tratado. Devuelve las cartas
+        nuevas (de más antigua a más nueva) y los ids ya tratados que el
+        servidor sigue devolviendo (borrado fallido o con retraso).
+        """
+        nuevas: Dict[str, Any] = {}
+        repetidas: List[str] = []
+        for uid, content in buzon.items():
+            if self._handled.get(uid) == letter_hash(content):
+                self._handled.move_to_end(uid)
+                repetidas.append(uid)
+            else:
+                nuevas[uid] = content
+        self.nuevas += len(nuevas)
+        self.repetidas += len(repetidas)
+        return oldest_first(nuevas), repetidas
+
+    def diff_stream(
+        self, letters: Iterable[Tuple[str, Dict[str, Any]]], repetidas: List[str]
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Versión de `diff` para cartas que llegan en streaming: deja pasar las
+        nuevas en orden de llegada y añade a `repetidas` los ids ya tratados.
+        """
+        for uid, content in letters:
+            if self._handled.get(uid) == letter_hash(content):
+                self._handled.move_to_end(uid)
+                self.repetidas += 1
+                repetidas.append(uid)
+            else:
+                self.nuevas += 1
+                yield uid, content
+
+    def mark_handled(self, uid: str, content: Dict[str, Any]) -> None:
+        """Registra una carta como tratada (antes de intentar borrarla)."""
+        self.mark_handled_hash(uid, letter_hash(content))
+
+    def mark_handled_hash(self, uid: str, huella: str) -> None:
+        """Como `mark_handled`, con el hash del contenido ya calculado (`letter_hash`)."""
+        self._handled[uid] = huella
+        self._handled.move_to_end(uid)
+        while len(self._handled) > self.max_ids:
+            self._handled.popitem(last=False)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._handled
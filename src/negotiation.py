@@ -0,0 +1,224 @@
+"""
+Negociación por contraoferta: cuando rechazamos una oferta, en vez de
+perder la oportunidad proponemos un intercambio viable con nuestro
+excedente y necesidades actuales. Cada contraparte tiene como mucho un
+hilo de negociación abierto, con número de rondas y plazo de expiración.
+Lo que ofrecemos en una contraoferta queda reservado para esa contraparte
+hasta que la acepta, responde con otra oferta, se abandona o caduca.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import api
+from .config import get_config
+from .letters import build_counter_offer_letter
+from .protocol import new_trade_id
+
+
+@dataclass
+class Thread:
+    """Hilo de negociación con una contraparte."""
+
+    remitente: str
+    trade_id: str
+    ronda: int
+    ofrece: Dict[str, int]
+    pide: Dict[str, int]
+    inicio: float
+    actualizado: float
+    # Excedente apartado para cumplir la contraoferta si se acepta.
+    reservado: Dict[str, int] = field(default_factory=dict)
+
+
+def _to_int_dict(value: Any) -> Dict[str, int]:
+    try:
+        return {k: int(v) for k, v in (value or {}).items() if int(v) > 0}
+    except (AttributeError, TypeError, ValueError):
+        return {}
+
+
+def counter_proposal(
+    oferta: Dict[str, int],
+    pide: Dict[str, int],
+    needs: Dict[str, int],
+    surplus: Dict[str, int],
+) -> Optional[Tuple[Dict[str, int], Dict[str, int]]]:
+    """
+    Contrapropuesta viable (lo que ofrecemos, lo que pedimos) a partir de
+    una oferta rechazada: pedimos solo lo que nos ofrecen y necesitamos, y
+    damos lo que piden si nos sobra o, si no, lo que más nos sobre, 1 a 1.
+    Devuelve None si no hay nada útil que proponer.
+    """
+    queremos = {r: min(c, needs[r]) for r, c in oferta.items() if needs.get(r, 0) > 0}
+    total = sum(queremos.values())
+    if total == 0:
+        return None
+
+    damos: Dict[str, int] = {}
+    disponible = dict(surplus)
+    # Primero lo que nos pidieron, después lo que más nos sobra.
+    candidatos = [r for r in pide if disponible.get(r, 0) > 0]
+    candidatos += sorted(
+        (r for r in disponible if r not in candidatos and disponible[r] > 0),
+        key=lambda r: -disponible[r],
+    )
+    restante = total
+    for r in candidatos:
+        if restante == 0:
+            break
+        c = min(disponible[r], restante, pide.get(r, restante) if r in pide else restante)
+        if c > 0:
+            damos[r] = c
+            restante -= c
+    if not damos:
+        return None
+    # Si no llegamos a igualar, pedimos solo tanto como damos.
+    dar = sum(damos.values())
+    if dar < total:
+        recorte = total - dar
+        for r in sorted(queremos, key=lambda r: -queremos[r]):
+            quita = min(recorte, queremos[r] - 1 if len(queremos) == 1 else queremos[r])
+            queremos[r] -= quita
+            recorte -= quita
+        queremos = {r: c for r, c in queremos.items() if c > 0}
+    if not queremos:
+        return None
+    return damos, queremos
+
+
+class NegotiationManager:
+    """
+    Hilos de negociación abiertos por contraparte y métricas de rondas.
+    `clock` permite usar un reloj simulado.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_rondas: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        config = get_config()
+        self.timeout = timeout if timeout is not None else config.negotiation_timeout
+        self.max_rondas = max_rondas if max_rondas is not None else config.negotiation_max_rounds
+        self.clock = clock
+        self.abiertas: Dict[str, Thread] = {}
+        self.rondas_acuerdo: List[int] = []
+        self.expiradas = 0
+        self.abandonadas = 0
+        self.contraofertas = 0
+
+    def expire(self) -> None:
+        """Cierra los hilos sin respuesta durante más de `timeout` segundos."""
+        ahora = self.clock()
+        for remitente, hilo in list(self.abiertas.items()):
+            if ahora - hilo.actualizado > self.timeout:
+                del self.abiertas[remitente]
+                self.expiradas += 1
+
+    def reserved(self, excepto: Optional[str] = None) -> Dict[str, int]:
+        """Recursos prometidos en contraofertas abiertas (salvo a `excepto`)."""
+        self.expire()
+        total: Dict[str, int] = {}
+        for remitente, hilo in self.abiertas.items():
+            if remitente == excepto:
+                continue
+            for r, c in hilo.reservado.items():
+                total[r] = total.get(r, 0) + c
+        return total
+
+    def available(self, recursos: Dict[str, int], excepto: Optional[str] = None) -> Dict[str, int]:
+        """`recursos` (excedente o inventario) menos lo reservado para otras contrapartes."""
+        reservado = self.reserved(excepto)
+        libres = {r: c - reservado.get(r, 0) for r, c in recursos.items()}
+        return {r: c for r, c in libres.items() if c > 0}
+
+    def release(self, remitente: str) -> None:
+        """
+        La contraparte ha respondido a la contraoferta con otra oferta (la ha
+        rechazado): su reserva se libera, aunque el hilo sigue abierto.
+        """
+        hilo = self.abiertas.get(remitente)
+        if hilo is not None:
+            hilo.reservado = {}
+
+    def counter(
+        self,
+        remitente: str,
+        analisis: Dict[str, Any],
+        needs: Dict[str, int],
+        surplus: Dict[str, int],
+    ) -> bool:
+        """
+        Responde a una oferta rechazada con una contraoferta, si es viable
+        y no se ha agotado el número de rondas. Devuelve True si se envió.
+        """
+        self.expire()
+        hilo = self.abiertas.get(remitente)
+        ronda = hilo.ronda + 1 if hilo else 1
+        if ronda > self.max_rondas:
+            del self.abiertas[remitente]
+            self.abandonadas += 1
+            print(f"Negociación con {remitente} abandonada tras {self.max_rondas} rondas.")
+            return False
+
+        # La nueva ronda sustituye a la reserva de la anterior.
+        propuesta = counter_proposal(
+            _to_int_dict(analisis.get("oferta")),
+            _to_int_dict(analisis.get("pide")),
+            needs,
+            self.available(surplus, excepto=remitente),
+        )
+        if propuesta is None:
+            print(f"No hay contraoferta viable para {remitente}.")
+            return False
+        ofrece, pide = propuesta
+
+        trade_id = hilo.trade_id if hilo else new_trade_id()
+        try:
+            print(f"→ Enviando contraoferta (ronda {ronda}) a {remitente}: doy {ofrece}, pido {pide}")
+            api.send_letter(
+                remitente,
+                f"Contraoferta (ronda {ronda})",
+                build_counter_offer_letter(ofrece, pide, trade_id),
+            )
+        except Exception as e:
+            print(f"ERROR enviando contraoferta a {remitente}: {e}")
+            return False
+
+        ahora = self.clock()
+        self.abiertas[remitente] = Thread(
+            remitente=remitente,
+            trade_id=trade_id,
+            ronda=ronda,
+            ofrece=ofrece,
+            pide=pide,
+            inicio=hilo.inicio if hilo else ahora,
+            actualizado=ahora,
+            reservado=dict(ofrece),
+        )
+        self.contraofertas += 1
+        return True
+
+    def close(self, remitente: str) -> None:
+        """Registra un acuerdo con `remitente` si había un hilo abierto."""
+        hilo = self.abiertas.pop(remitente, None)
+        if hilo is not None:
+            self.rondas_acuerdo.append(hilo.ronda)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "abiertas": len(self.abiertas),
+            "reservado": self.reserved(),
+            "acuerdos": len(self.rondas_acuerdo),
+            "expiradas": self.expiradas,
+            "abandonadas": self.abandonadas,
+            "contraofertas": self.contraofertas,
+            "rondas_medias_hasta_acuerdo": (
+                round(sum(self.rondas_acuerdo) / len(self.rondas_acuerdo), 2)
+                if self.rondas_acuerdo
+                else None
+            ),
+        }
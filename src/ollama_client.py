@@ -3,20 +3,108 @@ Cliente para Ollama (generación con LLM local).
 Soporta JSON Schema en `format` para forzar salida estructurada.
 """
 
-from typing import Any, Dict, Optional
+import contextlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
 
-import requests
+from .config import get_config
 
-from .config import MODEL
+# Backend alternativo (p. ej. un LLM falso del simulador). Si está definido,
+# `ollama` le delega la llamada en lugar de hablar con el servidor.
+LLMBackend = Callable[[str, Optional[Dict[str, Any]]], str]
+_backend: Optional[LLMBackend] = None
+
+# Plazo (time.monotonic) de las llamadas al LLM del hilo actual; ver `deadline`.
+_plazo = threading.local()
+
+
+class BudgetExceeded(TimeoutError):
+    """Se ha agotado el tiempo de LLM de la carta: la generación se cancela."""
+
+
+@contextlib.contextmanager
+def deadline(segundos: Optional[float]) -> Iterator[None]:
+    """
+    Limita a `segundos` las llamadas al LLM hechas desde este hilo dentro
+    del bloque (None = sin límite). Al agotarse, la generación en curso se
+    corta y se lanza BudgetExceeded. Los plazos anidados se combinan.
+    """
+    previo = getattr(_plazo, "limite", None)
+    if segundos is not None:
+        limite = time.monotonic() + segundos
+        _plazo.limite = limite if previo is None else min(previo, limite)
+    try:
+        yield
+    finally:
+        _plazo.limite = previo
+
+
+def current_deadline() -> Optional[float]:
+    """Plazo activo en este hilo (instante de time.monotonic) o None."""
+    return getattr(_plazo, "limite", None)
+
+
+def remaining() -> Optional[float]:
+    """Segundos que quedan del plazo activo en este hilo, o None si no hay."""
+    limite = current_deadline()
+    return None if limite is None else limite - time.monotonic()
+
+
+def set_backend(backend: Optional[LLMBackend]) -> Optional[LLMBackend]:
+    """
+    Sustituye el backend del LLM (None restaura Ollama).
+    Devuelve el backend anterior para poder restaurarlo.
+    """
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
 
 
 def ollama(prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
     """
     Llama al modelo Ollama. Si se pasa `format` (JSON Schema), la respuesta
     se fuerza a cumplir ese esquema (JSON Schema–guided generation).
+    Respeta el plazo activo (ver `deadline`).
     """
+    restante = remaining()
+    if restante is not None and restante <= 0:
+        raise BudgetExceeded("Plazo del LLM agotado antes de enviar la petición")
+    if _backend is not None:
+        return _backend(prompt, format)
+    return generate(prompt, format)
+
+
+def generate(
+    prompt: str,
+    format: Optional[Dict[str, Any]] = None,
+    *,
+    url: Optional[str] = None,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    plazo: Optional[float] = None,
+    cancelar: Optional[threading.Event] = None,
+) -> str:
+    """
+    Llamada HTTP directa a un servidor Ollama, sin pasar por el backend
+    configurado. Por defecto usa ollama_url, model y llm_timeout de la
+    configuración.
+    Con `plazo` (instante de time.monotonic; por defecto el de `deadline`)
+    o `cancelar`, la respuesta se lee en streaming y se cierra la conexión
+    al vencer el plazo o activarse el evento, lo que detiene la generación
+    en el servidor; en ese caso se lanza BudgetExceeded.
+    """
+    # Import diferido: requests solo se carga al hacer la primera llamada.
+    import requests
+
+    config = get_config()
+    url = url or config.ollama_url
+    model = model or config.model
+    timeout = timeout or config.llm_timeout
     payload: Dict[str, Any] = {
-        "model": MODEL,
+        "model": model,
         "prompt": prompt,
         "stream": False,
     }
@@ -24,11 +112,15 @@ def ollama(prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
     if format is not None:
         payload["format"] = format
     """
+    if plazo is None:
+        plazo = current_deadline()
+    if plazo is not None or cancelar is not None:
+        return _generate_stream(url, payload, timeout, plazo, cancelar)
     try:
         r = requests.post(
-            "http://localhost:11434/api/generate",
+            url,
             json=payload,
-            timeout=180,
+            timeout=timeout,
         )
         r.raise_for_status()
         return r.json()["response"]
@@ -41,3 +133,47 @@ def ollama(prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
     except requests.exceptions.ConnectionError:
         print("ERROR: Ollama no está corriendo (ollama serve)")
         raise
+
+
+def _generate_stream(
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float,
+    plazo: Optional[float],
+    cancelar: Optional[threading.Event],
+) -> str:
+    """Generación en streaming, cancelable entre trozos (ver `generate`)."""
+    import requests
+
+    def cortar() -> bool:
+        return (cancelar is not None and cancelar.is_set()) or (
+            plazo is not None and time.monotonic() >= plazo
+        )
+
+    if plazo is not None:
+        # Ninguna lectura puede bloquear más allá del plazo.
+        timeout = min(timeout, max(plazo - time.monotonic(), 0.001))
+    partes = []
+    try:
+        with requests.post(url, json={**payload, "stream": True}, stream=True, timeout=timeout) as r:
+            if r.status_code >= 400:
+                print("ERROR HTTP OLLAMA:", r.status_code)
+                print(r.text)
+                r.raise_for_status()
+            for linea in r.iter_lines():
+                if cortar():
+                    # Al salir del with se cierra la conexión y Ollama deja de generar.
+                    raise BudgetExceeded("Generación cancelada: plazo del LLM agotado")
+                if not linea:
+                    continue
+                trozo = json.loads(linea)
+                partes.append(trozo.get("response", ""))
+                if trozo.get("done"):
+                    break
+    except requests.exceptions.RequestException as e:
+        if cortar():
+            raise BudgetExceeded("Generación cancelada: plazo del LLM agotado") from e
+        if isinstance(e, requests.exceptions.ConnectionError):
+            print("ERROR: Ollama no está corriendo (ollama serve)")
+        raise
+    return "".join(partes)
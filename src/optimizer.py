@@ -0,0 +1,242 @@
+"""
+Optimizador de ofertas: en lugar de aceptar cada oferta de forma aislada y
+en orden de llegada, elige de una vez el conjunto de aceptaciones (totales
+o parciales, a escala) que más necesidades cubre sin pasarse del
+excedente. Es una mochila multidimensional de elección múltiple resuelta
+por búsqueda exhaustiva con memoización; si hay demasiadas ofertas, o la
+búsqueda visita demasiados estados, se usa una heurística voraz.
+"""
+
+from functools import lru_cache
+from math import gcd
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import get_config
+from .pricing import PricingEngine
+
+# Número máximo de ofertas para la búsqueda exacta (con 4 necesidades, 4
+# excedentes y ofertas parciales de un recurso, 6 ofertas ya rondan 100 ms).
+MAX_EXACT_OFFERS = 6
+
+# Estados distintos que puede visitar la búsqueda exacta antes de
+# abandonarla por la voraz (por debajo de 100 ms en los casos medidos).
+MAX_EXACT_STATES = 5000
+
+# Opción de aceptación: (escala, lo que recibimos, lo que enviamos).
+_Option = Tuple[int, Dict[str, int], Dict[str, int]]
+
+
+def _to_int_dict(value: Any) -> Optional[Dict[str, int]]:
+    if not isinstance(value, dict):
+        return None
+    try:
+        return {k: int(v) for k, v in value.items() if int(v) > 0}
+    except (TypeError, ValueError):
+        return None
+
+
+def _options(
+    oferta: Dict[str, int],
+    pide: Dict[str, int],
+    needs: Dict[str, int],
+    surplus: Dict[str, int],
+    pricing: Optional[PricingEngine] = None,
+) -> List[_Option]:
+    """
+    Aceptaciones posibles de una oferta: la oferta completa y sus fracciones
+    enteras (p. ej. "4 madera por 2 piedra" admite 2 por 1). Descarta las que
+    piden oro, recursos que necesitamos o más de lo que nos sobra, y las
+    que nos hacen enviar más de lo útil que recibimos (salvo que cubran
+    todas las necesidades). Con `pricing`, las que piden oro se admiten si
+    no pagan más que el valor de mercado de lo que recibimos (el oro
+    sobrante debe venir en `surplus`).
+    """
+    oro = get_config().gold_resource_name
+    paga_oro = pide.get(oro, 0) > 0
+    if not oferta or not pide or (paga_oro and pricing is None):
+        return []
+    if any(needs.get(r, 0) > 0 for r in pide):
+        return []
+
+    g = 0
+    for cant in list(oferta.values()) + list(pide.values()):
+        g = gcd(g, cant)
+    opciones: List[_Option] = []
+    for k in range(1, g + 1):
+        recibe = {r: c * k // g for r, c in oferta.items()}
+        envia = {r: c * k // g for r, c in pide.items()}
+        if any(surplus.get(r, 0) < c for r, c in envia.items()):
+            continue
+        util = sum(min(c, needs.get(r, 0)) for r, c in recibe.items())
+        if util == 0:
+            continue
+        if paga_oro:
+            if pricing is not None and envia[oro] > pricing.max_payment(recibe, needs):
+                continue
+            opciones.append((k, recibe, envia))
+            continue
+        completa = all(recibe.get(r, 0) >= c for r, c in needs.items())
+        if sum(envia.values()) > util and not completa:
+            continue
+        opciones.append((k, recibe, envia))
+    return opciones
+
+
+class _SearchLimit(Exception):
+    """La búsqueda exacta ha superado `MAX_EXACT_STATES`."""
+
+
+def _solve_exact(
+    opciones: List[List[_Option]],
+    recursos_need: List[str],
+    recursos_surplus: List[str],
+    needs: Dict[str, int],
+    surplus: Dict[str, int],
+) -> Optional[List[Optional[_Option]]]:
+    """Solución óptima, o None si se superan `MAX_EXACT_STATES` estados."""
+    estados = 0
+
+    @lru_cache(maxsize=None)
+    def best(
+        i: int, need_rest: Tuple[int, ...], surplus_rest: Tuple[int, ...]
+    ) -> Tuple[Tuple[int, int], Tuple[int, ...]]:
+        # Valor = (unidades de necesidad cubiertas, -unidades enviadas).
+        nonlocal estados
+        estados += 1
+        if estados > MAX_EXACT_STATES:
+            raise _SearchLimit
+        if i == len(opciones):
+            return (0, 0), ()
+        mejor_valor, mejor_resto = best(i + 1, need_rest, surplus_rest)
+        mejor = (mejor_valor, (-1,) + mejor_resto)
+        for j, (_, recibe, envia) in enumerate(opciones[i]):
+            nuevo_surplus = tuple(
+                s - envia.get(r, 0) for r, s in zip(recursos_surplus, surplus_rest)
+            )
+            if any(s < 0 for s in nuevo_surplus):
+                continue
+            cubierto = 0
+            nuevo_need = []
+            for r, n in zip(recursos_need, need_rest):
+                c = min(n, recibe.get(r, 0))
+                cubierto += c
+                nuevo_need.append(n - c)
+            if cubierto == 0:
+                continue
+            valor, resto = best(i + 1, tuple(nuevo_need), nuevo_surplus)
+            total = (valor[0] + cubierto, valor[1] - sum(envia.values()))
+            if total > mejor[0]:
+                mejor = (total, (j,) + resto)
+        return mejor
+
+    try:
+        _, elecciones = best(
+            0,
+            tuple(needs[r] for r in recursos_need),
+            tuple(surplus[r] for r in recursos_surplus),
+        )
+    except _SearchLimit:
+        return None
+    return [None if j < 0 else opciones[i][j] for i, j in enumerate(elecciones)]
+
+
+def _solve_greedy(
+    opciones: List[List[_Option]], needs: Dict[str, int], surplus: Dict[str, int]
+) -> List[Optional[_Option]]:
+    """Voraz: mejor relación cubierto/enviado primero, con lo que quede."""
+    need_rest = dict(needs)
+    surplus_rest = dict(surplus)
+    elegidas: List[Optional[_Option]] = [None] * len(opciones)
+
+    def ratio(i: int) -> float:
+        k, recibe, envia = opciones[i][-1]
+        util = sum(min(c, needs.get(r, 0)) for r, c in recibe.items())
+        return util / max(sum(envia.values()), 1)
+
+    for i in sorted((i for i in range(len(opciones)) if opciones[i]), key=ratio, reverse=True):
+        for opcion in reversed(opciones[i]):
+            _, recibe, envia = opcion
+            if any(surplus_rest.get(r, 0) < c for r, c in envia.items()):
+                continue
+            if not any(min(c, need_rest.get(r, 0)) for r, c in recibe.items()):
+                continue
+            for r, c in envia.items():
+                surplus_rest[r] -= c
+            for r, c in recibe.items():
+                if r in need_rest:
+                    need_rest[r] = max(need_rest[r] - c, 0)
+            elegidas[i] = opcion
+            break
+    return elegidas
+
+
+def choose_offers(
+    ofertas: Dict[str, Dict[str, Any]],
+    needs: Dict[str, int],
+    surplus: Dict[str, int],
+    pricing: Optional[PricingEngine] = None,
+    presupuesto_oro: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Decide a la vez todas las ofertas analizadas de una pasada del buzón
+    (id de carta -> análisis con "oferta" y "pide"). Devuelve, por id, una
+    decisión con la misma forma que `analizar_oferta`:
+    {"decision": "aceptada"|"rechazada", "oferta": {...}, "pide": {...}}.
+    Con `pricing` se puede pagar hasta `presupuesto_oro` de oro y vender
+    excedente por oro a precio de mercado.
+    """
+    oro = get_config().gold_resource_name
+    if pricing is not None and presupuesto_oro > 0:
+        surplus = dict(surplus, **{oro: presupuesto_oro})
+    ids = list(ofertas)
+    parsed = []
+    for uid in ids:
+        analisis = ofertas[uid]
+        parsed.append(
+            (_to_int_dict(analisis.get("oferta")) or {}, _to_int_dict(analisis.get("pide")) or {})
+        )
+    opciones = [_options(o, p, needs, surplus, pricing) for o, p in parsed]
+
+    recursos_need = sorted(r for r, n in needs.items() if n > 0)
+    recursos_surplus = sorted(surplus)
+    elegidas: Optional[List[Optional[_Option]]] = None
+    # La búsqueda exacta recorre solo las ofertas con alguna opción (una
+    # llamada recursiva por oferta).
+    con_opciones = [i for i, o in enumerate(opciones) if o]
+    if len(con_opciones) <= MAX_EXACT_OFFERS:
+        exactas = _solve_exact(
+            [opciones[i] for i in con_opciones], recursos_need, recursos_surplus, needs, surplus
+        )
+        if exactas is not None:
+            elegidas = [None] * len(opciones)
+            for i, elegida in zip(con_opciones, exactas):
+                elegidas[i] = elegida
+    if elegidas is None:
+        elegidas = _solve_greedy(opciones, needs, surplus)
+
+    if pricing is not None:
+        # Ventas por oro con el excedente que no se haya comprometido.
+        restante = dict(surplus)
+        restante.pop(oro, None)
+        for elegida in elegidas:
+            if elegida is not None:
+                for r, c in elegida[2].items():
+                    restante[r] = restante.get(r, 0) - c
+        for i, (oferta, pide) in enumerate(parsed):
+            if elegidas[i] is not None or set(oferta) != {oro} or not pide:
+                continue
+            if all(restante.get(r, 0) >= c for r, c in pide.items()) and pricing.sale_ok(
+                oferta[oro], pide
+            ):
+                for r, c in pide.items():
+                    restante[r] -= c
+                elegidas[i] = (1, oferta, pide)
+
+    decisiones: Dict[str, Dict[str, Any]] = {}
+    for uid, (oferta, pide), elegida in zip(ids, parsed, elegidas):
+        if elegida is None:
+            decisiones[uid] = {"decision": "rechazada", "oferta": oferta, "pide": pide}
+        else:
+            _, recibe, envia = elegida
+            decisiones[uid] = {"decision": "aceptada", "oferta": recibe, "pide": envia}
+    return decisiones
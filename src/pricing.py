@@ -0,0 +1,253 @@
+"""
+Precios de mercado en oro y compra con el oro sobrante.
+
+El valor de cada recurso (en unidades de oro) se estima con una media
+móvil exponencial sobre las ofertas observadas: las que incluyen oro dan
+su precio directamente y las de trueque lo reparten según los precios
+actuales. El oro que tenemos por encima del objetivo se puede gastar en
+comprar necesidades, nunca el necesario para el objetivo; el que hemos
+ofrecido en compras aún abiertas queda reservado hasta que se liquidan o
+caducan.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import api
+from .config import get_config
+from .letters import build_gold_offer_letter
+from .protocol import new_trade_id
+
+# Compras ofrecidas que se recuerdan para honrar su precio al confirmarse.
+MAX_COMPRAS_ABIERTAS = 256
+
+
+def _to_int_dict(value: Any) -> Dict[str, int]:
+    try:
+        return {k: int(v) for k, v in (value or {}).items() if int(v) > 0}
+    except (AttributeError, TypeError, ValueError):
+        return {}
+
+
+class PricingEngine:
+    """
+    Libro de precios por recurso y reglas para pagar o cobrar en oro.
+    `objetivo_oro` es el oro que exige nuestro objetivo: nunca se gasta.
+    """
+
+    def __init__(
+        self,
+        objetivo_oro: int = 0,
+        precio_inicial: Optional[float] = None,
+        alpha: Optional[float] = None,
+        margen: Optional[float] = None,
+        intervalo: Optional[float] = None,
+        caducidad: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        config = get_config()
+        self.oro = config.gold_resource_name
+        self.objetivo_oro = objetivo_oro
+        self.precio_inicial = precio_inicial if precio_inicial is not None else config.gold_price_initial
+        self.alpha = alpha if alpha is not None else config.gold_price_alpha
+        self.margen = margen if margen is not None else config.gold_price_margin
+        self.intervalo = intervalo if intervalo is not None else config.gold_offer_interval
+        self.caducidad = caducidad if caducidad is not None else config.gold_offer_ttl
+        self.clock = clock
+        self.precios: Dict[str, float] = {}
+        self.observaciones = 0
+        self.compras_ofrecidas = 0
+        self.oro_gastado = 0
+        self.oro_ingresado = 0
+        self._ultima_oferta: Optional[float] = None
+        self._turno_destino = 0
+        # Compras ofrecidas aún abiertas: id de intercambio -> (recurso, oro, caduca).
+        self._compras: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+
+    # -- Precios ------------------------------------------------------------
+
+    def price(self, recurso: str) -> float:
+        """Valor estimado de una unidad de `recurso` en oro."""
+        if recurso == self.oro:
+            return 1.0
+        return self.precios.get(recurso, self.precio_inicial)
+
+    def value(self, recursos: Dict[str, int]) -> float:
+        return sum(self.price(r) * c for r, c in recursos.items())
+
+    def _update(self, recurso: str, precio: float) -> None:
+        if recurso == self.oro or precio <= 0:
+            return
+        anterior = self.price(recurso)
+        self.precios[recurso] = anterior + self.alpha * (precio - anterior)
+
+    def observe(self, analisis: Dict[str, Any]) -> None:
+        """Actualiza los precios con una oferta observada (oferta <-> pide)."""
+        oferta = _to_int_dict(analisis.get("oferta"))
+        pide = _to_int_dict(analisis.get("pide"))
+        if not oferta or not pide:
+            return
+        self.observaciones += 1
+        # Cada lado vale lo que el otro, a los precios anteriores.
+        valor_oferta, valor_pide = self.value(oferta), self.value(pide)
+        for lado, valor_otro in ((oferta, valor_pide), (pide, valor_oferta)):
+            unidades = sum(c for r, c in lado.items() if r != self.oro)
+            if not unidades:
+                continue
+            precio_unidad = (valor_otro - lado.get(self.oro, 0)) / unidades
+            for recurso in lado:
+                self._update(recurso, precio_unidad)
+
+    # -- Reglas de pago -----------------------------------------------------
+
+    def _expire(self) -> None:
+        ahora = self.clock()
+        for trade_id in [t for t, (_, _, caduca) in self._compras.items() if caduca <= ahora]:
+            del self._compras[trade_id]
+
+    def committed_gold(self) -> int:
+        """Oro prometido en compras ofrecidas que aún no se han liquidado ni caducado."""
+        self._expire()
+        return sum(oro for _, oro, _ in self._compras.values())
+
+    def gold_budget(self, inventario: Dict[str, int]) -> int:
+        """Oro que podemos gastar sin bajar del objetivo ni tocar el de compras abiertas."""
+        return max(inventario.get(self.oro, 0) - self.objetivo_oro - self.committed_gold(), 0)
+
+    def max_payment(self, recibe: Dict[str, int], needs: Dict[str, int]) -> int:
+        """Oro máximo que pagamos por `recibe`: solo cuenta lo que necesitamos."""
+        util = {r: min(c, needs.get(r, 0)) for r, c in recibe.items()}
+        return math.floor(self.value(util) * (1.0 + self.margen))
+
+    def check_payment(
+        self,
+        envia: Dict[str, int],
+        recibe: Dict[str, int],
+        needs: Dict[str, int],
+        inventario: Dict[str, int],
+    ) -> Optional[str]:
+        """
+        Comprueba un pago en oro (`envia` incluye oro) a cambio de `recibe`.
+        Devuelve el motivo del rechazo, o None si el pago es aceptable.
+        """
+        oro = envia.get(self.oro, 0)
+        presupuesto = self.gold_budget(inventario)
+        if oro > presupuesto:
+            return f"El pago de {oro} {self.oro} supera el oro sobrante ({presupuesto})."
+        maximo = self.max_payment(recibe, needs)
+        if oro > maximo:
+            return f"El pago de {oro} {self.oro} supera el valor de mercado de lo recibido ({maximo})."
+        return None
+
+    def check_settlement(
+        self,
+        ids: List[str],
+        envia: Dict[str, int],
+        recibido: Dict[str, int],
+        needs: Dict[str, int],
+        inventario: Dict[str, int],
+    ) -> Optional[str]:
+        """
+        Comprueba el pago en oro que pide una confirmación. Si responde a una
+        compra que ofrecimos (por id) se paga el precio acordado; si no, se
+        aplican las reglas de `check_payment`.
+        """
+        self._expire()
+        for trade_id in ids:
+            compra = self._compras.get(trade_id)
+            if compra is None:
+                continue
+            recurso, precio, _ = compra
+            if recibido.get(recurso, 0) < 1:
+                return f"La compra {trade_id} no incluye el {recurso} acordado."
+            if envia.get(self.oro, 0) > precio:
+                return f"Piden más {self.oro} del acordado para la compra {trade_id} ({precio})."
+            # Esta compra puede usar el oro que tenía reservado.
+            presupuesto = self.gold_budget(inventario) + precio
+            if envia.get(self.oro, 0) > presupuesto:
+                return f"El pago supera el oro sobrante ({presupuesto})."
+            del self._compras[trade_id]
+            return None
+        return self.check_payment(envia, recibido, needs, inventario)
+
+    def sale_ok(self, oro_recibido: int, envia: Dict[str, int]) -> bool:
+        """Vender excedente por oro compensa si se paga al menos su valor de mercado."""
+        return oro_recibido > 0 and oro_recibido >= math.floor(self.value(envia))
+
+    # -- Compras --------------------------------------------------------------
+
+    def purchases(self, needs: Dict[str, int], inventario: Dict[str, int]) -> List[Tuple[str, int]]:
+        """
+        Compras a proponer con el oro sobrante: (recurso, oro) de una unidad
+        cada una, de la necesidad más barata a la más cara, sin pasarse.
+        """
+        presupuesto = self.gold_budget(inventario)
+        compras: List[Tuple[str, int]] = []
+        for recurso in sorted((r for r, n in needs.items() if n > 0 and r != self.oro), key=self.price):
+            precio = max(1, math.ceil(self.price(recurso)))
+            if precio > presupuesto:
+                break
+            compras.append((recurso, precio))
+            presupuesto -= precio
+        return compras
+
+    def send_offers(
+        self,
+        needs: Dict[str, int],
+        inventario: Dict[str, int],
+        people: List[str],
+        market: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None,
+    ) -> int:
+        """
+        Envía ofertas de compra en oro (como mucho una tanda cada `intervalo`
+        segundos), rotando el destinatario. Con `market` (ver `State.market`)
+        se rota solo entre quienes tienen excedente del recurso, si hay
+        alguno. Devuelve las cartas enviadas.
+        """
+        ahora = self.clock()
+        if not people or (self._ultima_oferta is not None and ahora - self._ultima_oferta < self.intervalo):
+            return 0
+        compras = self.purchases(needs, inventario)
+        if not compras:
+            return 0
+        self._ultima_oferta = ahora
+        enviadas = 0
+        for recurso, oro in compras:
+            destinos = [
+                p for p in people if (market or {}).get(p, {}).get("surplus", {}).get(recurso, 0) > 0
+            ] or people
+            dest = destinos[self._turno_destino % len(destinos)]
+            self._turno_destino += 1
+            trade_id = new_trade_id()
+            try:
+                print(f"→ Ofreciendo a {dest} comprar 1 {recurso} por {oro} {self.oro}")
+                api.send_letter(
+                    dest,
+                    f"Compra: 1 {recurso} por {oro} {self.oro}",
+                    build_gold_offer_letter(recurso, 1, oro, trade_id),
+                )
+            except Exception as e:
+                print(f"ERROR enviando oferta de compra a {dest}: {e}")
+                continue
+            enviadas += 1
+            self._compras[trade_id] = (recurso, oro, ahora + self.caducidad)
+            while len(self._compras) > MAX_COMPRAS_ABIERTAS:
+                self._compras.popitem(last=False)
+        self.compras_ofrecidas += enviadas
+        return enviadas
+
+    def record_trade(self, envia: Dict[str, int], recibe: Dict[str, int]) -> None:
+        self.oro_gastado += envia.get(self.oro, 0)
+        self.oro_ingresado += recibe.get(self.oro, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "precios": {r: round(p, 2) for r, p in sorted(self.precios.items())},
+            "observaciones": self.observaciones,
+            "compras_ofrecidas": self.compras_ofrecidas,
+            "oro_gastado": self.oro_gastado,
+            "oro_ingresado": self.oro_ingresado,
+            "oro_reservado": self.committed_gold(),
+        }
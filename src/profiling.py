@@ -0,0 +1,240 @@
+"""
+Modo perfilado (`python -m src --profile`): ejecuta el bot bajo cProfile
+y un muestreador de pilas, y mide por iteración del bucle principal cuánto
+tiempo real se va en HTTP (`api`), en el LLM (`ollama`), en formatear
+logs (`logs`) y esperando (`time.sleep`). Con partidas largas toma
+instantáneas de tracemalloc.
+
+Ficheros generados (con el prefijo indicado):
+- PREFIJO.prof: perfil estándar de cProfile (pstats, snakeviz...).
+- PREFIJO.collapsed: pilas muestreadas en formato "a;b;c N" (flamegraph.pl,
+  speedscope, inferno).
+- PREFIJO.iterations.jsonl: desglose de tiempo real por iteración.
+- PREFIJO.memory.txt: mayores crecimientos de memoria entre instantáneas.
+
+Se vuelcan al terminar y, en sistemas con SIGUSR1, al recibir esa señal.
+"""
+
+import cProfile
+import functools
+import json
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional
+
+from . import api, logs, ollama_client
+from .instrument import Patcher
+
+CATEGORIAS = ("http", "llm", "logs", "espera")
+_API_HTTP = ("get_info", "stream_info", "get_people", "get_dashboard", "set_alias", "send_letter", "send_package", "delete_letter")
+
+
+class Sampler(threading.Thread):
+    """Muestreador de la pila del hilo principal cada `intervalo` segundos."""
+
+    def __init__(self, intervalo: float = 0.005) -> None:
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.intervalo = intervalo
+        self.pilas: Counter = Counter()
+        self._objetivo = threading.main_thread().ident
+        self._parar = threading.Event()
+
+    @staticmethod
+    def _collapse(frame: Optional[FrameType]) -> str:
+        partes: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            partes.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(partes))
+
+    def run(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self._objetivo)
+            if frame is not None:
+                self.pilas[self._collapse(frame)] += 1
+
+    def stop(self) -> None:
+        self._parar.set()
+
+
+class Profiler:
+    """Instrumentación de una ejecución del bot y volcado de resultados."""
+
+    def __init__(self, prefijo: str = "fdi_profile", intervalo: float = 0.005, memoria_cada: int = 50) -> None:
+        self.prefijo = prefijo
+        self.memoria_cada = memoria_cada
+        self.profile = cProfile.Profile()
+        self.sampler = Sampler(intervalo)
+        self.iteraciones = 0
+        self._actual: Dict[str, float] = dict.fromkeys(CATEGORIAS, 0.0)
+        self._llamadas: Counter = Counter()
+        self._inicio_iteracion: Optional[float] = None
+        self._filas: List[Dict[str, Any]] = []
+        self._local = threading.local()
+        self._patcher = Patcher()
+        self._snapshot_base: Optional[tracemalloc.Snapshot] = None
+        self._memoria: List[str] = []
+        self._lock = threading.Lock()
+        self._perfilando = False
+
+    # -- Instrumentación --------------------------------------------------
+
+    def _timed(self, categoria: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # Solo cuenta la categoría más externa (un log dentro de HTTP es HTTP).
+            if getattr(self._local, "dentro", False):
+                return fn(*args, **kwargs)
+            self._local.dentro = True
+            inicio = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.dentro = False
+                self._add(categoria, time.perf_counter() - inicio)
+
+        return wrapper
+
+    def _timed_stream(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Para generadores (stream_info): solo cuenta el tiempo dentro de next()."""
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            it = fn(*args, **kwargs)
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self._add("http", time.perf_counter() - inicio)
+                    return
+                self._add("http", time.perf_counter() - inicio)
+                yield item
+
+        return wrapper
+
+    def _add(self, categoria: str, segundos: float) -> None:
+        with self._lock:
+            self._actual[categoria] += segundos
+            self._llamadas[categoria] += 1
+
+    def _iteration(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Cada llamada a process_mailbox inicia una iteración del bucle."""
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            self._close_iteration()
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    def _close_iteration(self) -> None:
+        ahora = time.perf_counter()
+        with self._lock:
+            if self._inicio_iteracion is not None:
+                total = ahora - self._inicio_iteracion
+                fila: Dict[str, Any] = {"iteracion": self.iteraciones, "total_s": round(total, 4)}
+                for categoria in CATEGORIAS:
+                    fila[f"{categoria}_s"] = round(self._actual[categoria], 4)
+                    fila[f"{categoria}_llamadas"] = self._llamadas[categoria]
+                fila["resto_s"] = round(total - sum(self._actual.values()), 4)
+                self._filas.append(fila)
+                self.iteraciones += 1
+            self._actual = dict.fromkeys(CATEGORIAS, 0.0)
+            self._llamadas = Counter()
+            self._inicio_iteracion = ahora
+        if self.memoria_cada and self.iteraciones and self.iteraciones % self.memoria_cada == 0:
+            self._memory_snapshot()
+
+    def install(self) -> None:
+        """Instrumenta api, ollama y logs. Importa app para poder envolver su bucle."""
+        from . import app
+
+        for nombre in _API_HTTP:
+            if nombre == "stream_info":
+                self._patcher.patch(api, nombre, self._timed_stream(getattr(api, nombre)))
+            else:
+                self._patcher.patch(api, nombre, self._timed("http", getattr(api, nombre)))
+        self._patcher.patch(ollama_client, "ollama", self._timed("llm", ollama_client.ollama))
+        for nombre in dir(logs):
+            if nombre.startswith("print_"):
+                self._patcher.patch(logs, nombre, self._timed("logs", getattr(logs, nombre)))
+        self._patcher.patch(app, "process_mailbox", self._iteration(app.process_mailbox))
+        self._patcher.patch_attr(time, "sleep", self._timed("espera", time.sleep))
+
+    def uninstall(self) -> None:
+        self._patcher.restore()
+
+    # -- Memoria ------------------------------------------------------------
+
+    def _memory_snapshot(self) -> None:
+        snapshot = tracemalloc.take_snapshot()
+        if self._snapshot_base is None:
+            self._snapshot_base = snapshot
+            return
+        actual, pico = tracemalloc.get_traced_memory()
+        lineas = [f"# iteración {self.iteraciones}: actual {actual / 2**20:.2f} MB, pico {pico / 2**20:.2f} MB"]
+        for stat in snapshot.compare_to(self._snapshot_base, "lineno")[:10]:
+            lineas.append(str(stat))
+        self._memoria.append("\n".join(lineas))
+
+    # -- Ejecución y volcado ------------------------------------------------
+
+    def dump(self) -> None:
+        """Escribe los ficheros de resultados (se puede llamar en marcha)."""
+        self.profile.disable()
+        try:
+            self.profile.dump_stats(f"{self.prefijo}.prof")
+        finally:
+            if self._perfilando:
+                self.profile.enable()
+        with open(f"{self.prefijo}.collapsed", "w", encoding="utf-8") as f:
+            for pila, n in sorted(self.sampler.pilas.items()):
+                f.write(f"{pila} {n}\n")
+        with open(f"{self.prefijo}.iterations.jsonl", "w", encoding="utf-8") as f:
+            for fila in self._filas:
+                f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        if tracemalloc.is_tracing():
+            self._memory_snapshot()
+        with open(f"{self.prefijo}.memory.txt", "w", encoding="utf-8") as f:
+            f.write("\n\n".join(self._memoria) + "\n")
+        print(f"Perfil escrito en {self.prefijo}.{{prof,collapsed,iterations.jsonl,memory.txt}}", file=sys.stderr)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totales de tiempo real por categoría sobre todas las iteraciones."""
+        total = sum(f["total_s"] for f in self._filas)
+        resumen: Dict[str, Any] = {"iteraciones": len(self._filas), "total_s": round(total, 3)}
+        for categoria in CATEGORIAS + ("resto",):
+            resumen[f"{categoria}_s"] = round(sum(f[f"{categoria}_s"] for f in self._filas), 3)
+        return resumen
+
+    def run(self, target: Callable[[], Any]) -> Any:
+        """Ejecuta `target` perfilado; vuelca los resultados al terminar."""
+        self.install()
+        usr1 = getattr(signal, "SIGUSR1", None)
+        previo = signal.signal(usr1, lambda *_: self.dump()) if usr1 is not None else None
+        tracemalloc.start()
+        self._memory_snapshot()
+        self._inicio_iteracion = time.perf_counter()
+        self.sampler.start()
+        self._perfilando = True
+        self.profile.enable()
+        try:
+            return target()
+        finally:
+            self._perfilando = False
+            self.profile.disable()
+            self.sampler.stop()
+            self._close_iteration()
+            self.dump()
+            tracemalloc.stop()
+            if usr1 is not None:
+                signal.signal(usr1, previo)
+            self.uninstall()
+            print(json.dumps(self.summary(), ensure_ascii=False), file=sys.stderr)
@@ -0,0 +1,114 @@
+"""
+Construcción de prompts compactos para Ollama: solo los campos relevantes
+de la carta, JSON sin espacios, cuerpos largos recortados y recuento
+aproximado de tokens por llamada.
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+from .config import get_config
+from .logs import print_bot_dim
+
+# Campos de la carta que aportan algo a la clasificación.
+CAMPOS_CARTA = ("asunto", "cuerpo")
+
+_RECORTE = " […] "
+_RE_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# Estadísticas de tokens por tipo de prompt: nombre -> {llamadas, tokens, ultimo}.
+PROMPT_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def compact_json(value: Any) -> str:
+    """Serializa sin sangría ni espacios superfluos."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def truncate_body(text: str, max_chars: Optional[int] = None) -> str:
+    """
+    Recorta un cuerpo demasiado largo conservando el principio y el final
+    (donde suelen ir las cantidades y la firma), sin partir palabras.
+    Por defecto usa prompt_max_body_chars de la configuración.
+    """
+    if max_chars is None:
+        max_chars = get_config().prompt_max_body_chars
+    if len(text) <= max_chars:
+        return text
+    cabeza = max_chars * 2 // 3
+    cola = max_chars - cabeza - len(_RECORTE)
+    inicio = text[:cabeza].rsplit(None, 1)[0] if " " in text[:cabeza] else text[:cabeza]
+    fin = text[-cola:] if cola > 0 else ""
+    if fin and " " in fin:
+        fin = fin.split(None, 1)[-1]
+    return inicio + _RECORTE + fin
+
+
+def strip_letter(carta: Dict[str, Any]) -> Dict[str, Any]:
+    """Se queda con asunto y cuerpo (recortado) de la carta de la API."""
+    reducida = {k: carta.get(k, "") for k in CAMPOS_CARTA if carta.get(k)}
+    if "cuerpo" in reducida:
+        reducida["cuerpo"] = truncate_body(str(reducida["cuerpo"]))
+    return reducida
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimación barata de tokens: palabras y signos, contando las palabras
+    largas como varios tokens (≈ 4 caracteres por token).
+    """
+    return sum((len(t) + 3) // 4 for t in _RE_TOKEN.findall(text))
+
+
+def record_prompt(nombre: str, prompt: str) -> int:
+    """Registra el tamaño del prompt en PROMPT_STATS y lo muestra en consola."""
+    tokens = count_tokens(prompt)
+    stats = PROMPT_STATS.setdefault(nombre, {"llamadas": 0, "tokens": 0, "ultimo": 0})
+    stats["llamadas"] += 1
+    stats["tokens"] += tokens
+    stats["ultimo"] = tokens
+    print_bot_dim(f"[LLM] Prompt {nombre}: ~{tokens} tokens")
+    return tokens
+
+
+def build_prompt_carta(
+    carta_dict: Dict[str, Any],
+    needs: Dict[str, Any],
+    surplus: Dict[str, int],
+) -> str:
+    """Prompt de analizar_carta con la carta reducida y JSON compacto."""
+    return f"""Interpreta una carta de intercambio de recursos entre agentes de un juego.
+Devuelve SOLO un JSON válido:
+{{"tipo":"oferta"|"confirmacion"|"otro","oferta":{{recurso:entero}},"pide":{{recurso:entero}},"recursos_recibidos":{{recurso:entero}}}}
+- tipo "oferta": propone un intercambio (yo te doy X, tú me das Y).
+- tipo "confirmacion": dice que ya nos ha enviado recursos.
+- tipo "otro": no encaja claramente.
+- oferta: lo que EL OTRO nos ofrece. pide: lo que EL OTRO quiere que le enviemos.
+- recursos_recibidos: lo que afirma que YA nos ha enviado.
+- Campo poco claro: {{}}.
+OFRECEMOS: {compact_json(surplus)}
+NECESITAMOS: {compact_json(needs)}
+CARTA RECIBIDA: {compact_json(strip_letter(carta_dict))}"""
+
+
+def build_prompt_oferta(
+    oferta: Dict[str, Any],
+    needs: Dict[str, Any],
+    surplus: Dict[str, int],
+) -> str:
+    """Prompt de analizar_oferta con solo oferta/pide y JSON compacto."""
+    reducida = {"oferta": oferta.get("oferta") or {}, "pide": oferta.get("pide") or {}}
+    return f"""Decide si aceptar una oferta de intercambio.
+Devuelve SOLO un JSON válido:
+{{"decision":"aceptada"|"rechazada","oferta":{{recurso:entero}},"pide":{{recurso:entero}}}}
+"aceptada" si se cumplen TODAS:
+a) necesitamos los recursos que ofrece para el objetivo
+b) no pide recursos que necesitemos
+c) podemos dar lo que pide
+d) enviamos como máximo tantos recursos como recibimos, salvo que la oferta complete el objetivo al 100%
+Si no, "rechazada". Se puede aceptar parcialmente solo lo que cumpla las condiciones.
+oferta: lo que EL OTRO nos ofrece. pide: lo que EL OTRO quiere que le enviemos.
+NECESITAMOS: {compact_json(needs)}
+PODEMOS OFRECER: {compact_json(surplus)}
+OFERTA: {compact_json(reducida)}"""
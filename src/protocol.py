@@ -0,0 +1,127 @@
+"""
+Protocolo estructurado de intercambio: una línea etiquetada con JSON
+compacto que se añade al final de todas nuestras cartas, de modo que
+cualquier bot que la entienda (incluidas otras copias de este) puede
+interpretarlas sin LLM y correlacionar los intercambios por id.
+
+Formato (una línea al final del cuerpo):
+  #FDI-PROTO {"v":1,"t":"oferta","ofrece":{...},"pide":{...},"enviado":{...},"ids":[...]}
+
+Tipos (siempre desde el punto de vista del remitente):
+- estado: "ofrece" = lo que le sobra, "pide" = lo que necesita.
+- oferta: propone dar "ofrece" a cambio de "pide".
+- confirmacion: ya ha enviado "enviado" y espera "pide" a cambio.
+- cierre: ha enviado "enviado" para completar un intercambio; no espera nada.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+VERSION = 1
+PREFIX = "#FDI-PROTO"
+TIPOS = ("estado", "oferta", "confirmacion", "cierre")
+
+_RE_BLOQUE = re.compile(r"^" + re.escape(PREFIX) + r" (\{.*\})\s*$", re.MULTILINE)
+
+# Tipo del protocolo -> tipo de analizar_carta.
+_TIPO_ANALISIS = {
+    "estado": "otro",
+    "oferta": "oferta",
+    "confirmacion": "confirmacion",
+    "cierre": "confirmacion",
+}
+
+
+def new_trade_id() -> str:
+    return uuid4().hex[:12]
+
+
+def encode(
+    tipo: str,
+    ofrece: Optional[Dict[str, int]] = None,
+    pide: Optional[Dict[str, int]] = None,
+    enviado: Optional[Dict[str, int]] = None,
+    ids: Optional[List[str]] = None,
+) -> str:
+    """Línea del protocolo para un mensaje de tipo `tipo`."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de mensaje de protocolo desconocido: {tipo}")
+    bloque: Dict[str, Any] = {"v": VERSION, "t": tipo}
+    for clave, valor in (("ofrece", ofrece), ("pide", pide), ("enviado", enviado)):
+        if valor:
+            bloque[clave] = {k: int(v) for k, v in valor.items()}
+    if ids:
+        bloque["ids"] = list(ids)
+    return f"{PREFIX} {json.dumps(bloque, ensure_ascii=False, separators=(',', ':'))}"
+
+
+def append_block(cuerpo: str, *args: Any, **kwargs: Any) -> str:
+    """Añade al cuerpo de una carta su línea de protocolo (ver `encode`)."""
+    return f"{cuerpo}\n\n{encode(*args, **kwargs)}"
+
+
+def strip_block(cuerpo: str) -> str:
+    """Cuerpo de la carta sin su línea de protocolo (solo el texto libre)."""
+    if PREFIX not in cuerpo:
+        return cuerpo
+    return _RE_BLOQUE.sub("", cuerpo).rstrip()
+
+
+def _resources(value: Any) -> Optional[Dict[str, int]]:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        return None
+    recursos: Dict[str, int] = {}
+    for k, v in value.items():
+        if not isinstance(k, str) or isinstance(v, bool) or not isinstance(v, int) or v < 0:
+            return None
+        recursos[k] = v
+    return recursos
+
+
+def decode(cuerpo: str) -> Optional[Dict[str, Any]]:
+    """
+    Extrae y valida el bloque de protocolo de un cuerpo de carta.
+    Devuelve None si no hay bloque o no es válido (se usará el LLM).
+    """
+    if PREFIX not in cuerpo:
+        return None
+    m = _RE_BLOQUE.search(cuerpo)
+    if not m:
+        return None
+    try:
+        bloque = json.loads(m.group(1))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(bloque, dict) or bloque.get("v") != VERSION or bloque.get("t") not in TIPOS:
+        return None
+    mensaje: Dict[str, Any] = {"t": bloque["t"]}
+    for clave in ("ofrece", "pide", "enviado"):
+        recursos = _resources(bloque.get(clave))
+        if recursos is None:
+            return None
+        mensaje[clave] = recursos
+    ids = bloque.get("ids") or []
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return None
+    mensaje["ids"] = ids
+    return mensaje
+
+
+def to_analysis(mensaje: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte un mensaje decodificado al análisis que devolvería
+    analizar_carta (desde nuestro punto de vista), más los ids del intercambio.
+    """
+    tipo = mensaje["t"]
+    return {
+        "tipo": _TIPO_ANALISIS[tipo],
+        "oferta": dict(mensaje["ofrece"]),
+        "pide": {} if tipo == "cierre" else dict(mensaje["pide"]),
+        "recursos_recibidos": dict(mensaje["enviado"]),
+        "ids": list(mensaje["ids"]),
+        "protocolo": tipo,
+    }
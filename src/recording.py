@@ -0,0 +1,237 @@
+"""
+Grabación y reproducción de partidas.
+
+`--record FICHERO` envuelve las funciones de `api` y `ollama` y guarda cada
+llamada (argumentos, respuesta o error, instante y duración) como una
+línea JSON compacta. `--replay FICHERO` vuelve a ejecutar `app.main` sin
+servidor ni Ollama: las lecturas (/info, /gente) y las respuestas del LLM
+salen de la grabación, las escrituras (cartas, paquetes, borrados) solo se
+cuentan, y las latencias y esperas se reproducen a la velocidad pedida.
+
+Formato de cada línea:
+  {"t": 1.234, "d": 0.05, "f": "get_info", "a": [...], "r": {...}}
+con "e" en lugar de "r" si la llamada falló. Para "ollama", "a" es el prompt.
+"""
+
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from . import api, ollama_client
+from .instrument import Patcher
+
+LECTURAS = ("get_info", "stream_info", "get_people", "get_dashboard")
+ESCRITURAS = ("set_alias", "send_letter", "send_package", "delete_letter")
+
+
+class ReplayFinished(Exception):
+    """La grabación no tiene más lecturas: la reproducción termina."""
+
+
+class Recorder:
+    """Graba las llamadas a la API y al LLM en un fichero JSONL."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._f = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._inicio = time.perf_counter()
+        self._patcher = Patcher()
+
+    def _write(self, entrada: Dict[str, Any]) -> None:
+        linea = json.dumps(entrada, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._f.write(linea + "\n")
+            self._f.flush()
+
+    def _wrap(self, nombre: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # De ollama solo se guarda el prompt: el esquema es fijo.
+            argumentos = list(args[:1]) if nombre == "ollama" else list(args)
+            entrada: Dict[str, Any] = {"t": 0.0, "d": 0.0, "f": nombre, "a": argumentos}
+            inicio = time.perf_counter()
+            try:
+                resultado = fn(*args, **kwargs)
+                entrada["r"] = resultado
+                return resultado
+            except Exception as e:
+                entrada["e"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                entrada["t"] = round(inicio - self._inicio, 4)
+                entrada["d"] = round(time.perf_counter() - inicio, 4)
+                self._write(entrada)
+
+        return wrapper
+
+    def _wrap_stream(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """stream_info se graba como la lista de eventos emitidos."""
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            inicio = time.perf_counter()
+            eventos: List[Any] = []
+            entrada: Dict[str, Any] = {"t": round(inicio - self._inicio, 4), "f": "stream_info", "a": []}
+            try:
+                for evento in fn(*args, **kwargs):
+                    eventos.append(evento)
+                    yield evento
+                entrada["r"] = eventos
+            except Exception as e:
+                entrada["e"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                # También si se deja de leer a medias: se guarda lo emitido.
+                entrada["d"] = round(time.perf_counter() - inicio, 4)
+                if "e" not in entrada:
+                    entrada["r"] = eventos
+                self._write(entrada)
+
+        return wrapper
+
+    def install(self) -> None:
+        for nombre in LECTURAS + ESCRITURAS:
+            fn = getattr(api, nombre)
+            envoltura = self._wrap_stream(fn) if nombre == "stream_info" else self._wrap(nombre, fn)
+            self._patcher.patch(api, nombre, envoltura)
+        self._patcher.patch(ollama_client, "ollama", self._wrap("ollama", ollama_client.ollama))
+
+    def close(self) -> None:
+        self._patcher.restore()
+        self._f.close()
+
+
+class Replayer:
+    """
+    Sirve una grabación a `app.main`. `velocidad` escala latencias y
+    esperas (2.0 = el doble de rápido; 0 = sin esperas).
+    """
+
+    def __init__(self, path: str, velocidad: float = 1.0) -> None:
+        self.velocidad = velocidad
+        self._por_funcion: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._llm_por_prompt: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._llm: Deque[Dict[str, Any]] = deque()
+        with open(path, encoding="utf-8") as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                entrada = json.loads(linea)
+                if entrada["f"] == "ollama":
+                    self._llm.append(entrada)
+                    self._llm_por_prompt[entrada["a"][0]].append(entrada)
+                else:
+                    self._por_funcion[entrada["f"]].append(entrada)
+        self.llamadas: Counter = Counter()
+        self.llm_sin_grabar = 0
+        self.escrituras_sin_grabar = 0
+        self._usadas: set = set()
+        self._patcher = Patcher()
+        self._sleep = time.sleep
+
+    def _wait(self, segundos: float) -> None:
+        if self.velocidad > 0 and segundos > 0:
+            self._sleep(segundos / self.velocidad)
+
+    def _serve(self, entrada: Dict[str, Any]) -> Any:
+        self._wait(entrada.get("d", 0.0))
+        if "e" in entrada:
+            if entrada["e"].startswith(f"{ollama_client.BudgetExceeded.__name__}:"):
+                # Los plazos agotados se reproducen como tales (ver budget).
+                raise ollama_client.BudgetExceeded(f"(grabado) {entrada['e']}")
+            raise RuntimeError(f"(grabado) {entrada['e']}")
+        return entrada.get("r")
+
+    def _read(self, nombre: str) -> Callable[..., Any]:
+        def leer(*args: Any, **kwargs: Any) -> Any:
+            cola = self._por_funcion[nombre]
+            if not cola:
+                raise ReplayFinished(f"No quedan respuestas grabadas de {nombre}")
+            self.llamadas[nombre] += 1
+            return self._serve(cola.popleft())
+
+        return leer
+
+    def _stream(self, *args: Any, **kwargs: Any) -> Any:
+        cola = self._por_funcion["stream_info"]
+        if not cola:
+            raise ReplayFinished("No quedan respuestas grabadas de stream_info")
+        self.llamadas["stream_info"] += 1
+        for clave, valor in self._serve(cola.popleft()) or []:
+            yield clave, tuple(valor) if clave == "Buzon" else valor
+
+    def _write(self, nombre: str) -> Callable[..., Any]:
+        def escribir(*args: Any, **kwargs: Any) -> Any:
+            self.llamadas[nombre] += 1
+            cola = self._por_funcion[nombre]
+            if not cola:
+                self.escrituras_sin_grabar += 1
+                return {}
+            return self._serve(cola.popleft())
+
+        return escribir
+
+    def _ollama(self, prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
+        """Respuesta grabada para el mismo prompt; si no la hay, la siguiente sin usar."""
+        self.llamadas["ollama"] += 1
+        cola = self._llm_por_prompt.get(prompt)
+        while cola and id(cola[0]) in self._usadas:
+            cola.popleft()
+        if cola:
+            entrada = cola.popleft()
+        else:
+            self.llm_sin_grabar += 1
+            while self._llm and id(self._llm[0]) in self._usadas:
+                self._llm.popleft()
+            if not self._llm:
+                return "{}"
+            entrada = self._llm.popleft()
+        self._usadas.add(id(entrada))
+        return self._serve(entrada)
+
+    def install(self) -> None:
+        for nombre in LECTURAS:
+            servir = self._stream if nombre == "stream_info" else self._read(nombre)
+            self._patcher.patch(api, nombre, servir)
+        for nombre in ESCRITURAS:
+            self._patcher.patch(api, nombre, self._write(nombre))
+        self._patcher.patch(ollama_client, "ollama", self._ollama)
+        self._patcher.patch_attr(time, "sleep", self._wait)
+
+    def close(self) -> None:
+        self._patcher.restore()
+
+    def report(self, segundos: float) -> Dict[str, Any]:
+        return {
+            "tiempo_real_s": round(segundos, 3),
+            "llamadas_http": sum(n for f, n in self.llamadas.items() if f != "ollama"),
+            "llamadas_llm": self.llamadas["ollama"],
+            "por_funcion": dict(sorted(self.llamadas.items())),
+            "llm_sin_respuesta_grabada": self.llm_sin_grabar,
+            "escrituras_sin_grabar": self.escrituras_sin_grabar,
+        }
+
+
+def record(path: str, target: Callable[[], Any]) -> Any:
+    """Ejecuta `target` grabando sus llamadas en `path`."""
+    recorder = Recorder(path)
+    recorder.install()
+    try:
+        return target()
+    finally:
+        recorder.close()
+
+
+def replay(path: str, target: Callable[[], Any], velocidad: float = 1.0) -> Dict[str, Any]:
+    """Reproduce `target` contra la grabación `path` y devuelve sus métricas."""
+    replayer = Replayer(path, velocidad)
+    replayer.install()
+    inicio = time.perf_counter()
+    try:
+        target()
+    except ReplayFinished:
+        pass
+    finally:
+        replayer.close()
+    return replayer.report(time.perf_counter() - inicio)
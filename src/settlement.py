@@ -0,0 +1,106 @@
+"""
+Liquidación agrupada: durante una pasada del buzón los intercambios
+aprobados se acumulan por destinatario y al final se envía un único
+paquete y una única carta de confirmación a cada uno.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from . import api
+from .game_state import State
+from .letters import build_trade_confirmation_letter
+
+
+def _merge(total: Dict[str, int], recursos: Dict[str, int]) -> None:
+    for recurso, cant in recursos.items():
+        total[recurso] = total.get(recurso, 0) + int(cant)
+
+
+@dataclass
+class _Pending:
+    enviados: Dict[str, int] = field(default_factory=dict)
+    esperados: Dict[str, int] = field(default_factory=dict)
+    asuntos: List[str] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+
+
+class Settlement:
+    """
+    Envíos pendientes de una pasada, agrupados por destinatario.
+    Lo reservado se descuenta del inventario (`apply_reservations`) para
+    que las siguientes cartas se validen contra lo que realmente quedará.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, _Pending] = {}
+
+    def add(
+        self,
+        dest: str,
+        enviados: Dict[str, int],
+        esperados: Dict[str, int],
+        asunto: str,
+        trade_ids: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Apunta un intercambio aprobado para enviarlo en `flush`. `esperados`
+        vacío indica que cerramos un intercambio (ya recibimos su parte).
+        """
+        pendiente = self._pending.setdefault(dest, _Pending())
+        _merge(pendiente.enviados, enviados)
+        _merge(pendiente.esperados, esperados)
+        pendiente.asuntos.append(asunto)
+        pendiente.ids.extend(trade_ids or [])
+
+    def reserved(self) -> Dict[str, int]:
+        """Total de recursos comprometidos y aún no enviados."""
+        total: Dict[str, int] = {}
+        for pendiente in self._pending.values():
+            _merge(total, pendiente.enviados)
+        return total
+
+    def apply_reservations(self, state: State, inventario_base: Dict[str, int]) -> None:
+        """
+        Fija el inventario del estado a `inventario_base` menos lo ya
+        comprometido y recalcula needs y surplus.
+        """
+        inventario = dict(inventario_base)
+        for recurso, cant in self.reserved().items():
+            inventario[recurso] = inventario.get(recurso, 0) - cant
+        state.inventario = inventario
+        state.recompute()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Envía un paquete y una carta por destinatario. Devuelve el número
+        de paquetes enviados con éxito.
+        """
+        enviados = 0
+        pendientes, self._pending = self._pending, {}
+        for dest, pendiente in pendientes.items():
+            n = len(pendiente.asuntos)
+            try:
+                print(f"Liquidando {n} intercambio(s) con {dest}. Enviando paquete: {pendiente.enviados}")
+                api.send_package(dest, pendiente.enviados)
+            except Exception as e:
+                print(f"ERROR enviando paquete agrupado a {dest}: {e}")
+                continue
+            enviados += 1
+
+            asunto = pendiente.asuntos[0] if n == 1 else f"Confirmación de {n} intercambios"
+            try:
+                carta = build_trade_confirmation_letter(
+                    recursos_enviados=pendiente.enviados,
+                    recursos_esperados=pendiente.esperados,
+                    trade_ids=pendiente.ids or None,
+                    cierre=not pendiente.esperados,
+                )
+                print(f"→ Enviando carta de confirmación agrupada a {dest}...")
+                api.send_letter(dest, asunto, carta)
+            except Exception as e:
+                print(f"ERROR enviando carta de confirmación agrupada a {dest}: {e}")
+        return enviados
@@ -0,0 +1,561 @@
+"""
+Simulador de partidas en proceso: muchos agentes con Recursos/Objetivo
+aleatorios, cartas y paquetes enrutados en memoria y nuestra lógica de
+trader/letters ejecutada con un LLM enchufable (determinista por defecto).
+
+Uso: python -m src.simulator --agentes 8 --turnos 2000 --semilla 1
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from . import api
+from . import ollama_client
+from .app import process_mailbox
+from .coalition import Coalition, MemoryChannel
+from .config import configure, get_config
+from .cycles import CycleCoordinator
+from .dashboard import DashboardClient
+from .dedup import NearDuplicateDetector
+from .game_state import State
+from .letters import ANALIZAR_CARTA_JSON_SCHEMA, build_simple_offer_letter
+from .mailbox import MailboxTracker
+from .negotiation import NegotiationManager
+from .pricing import PricingEngine
+from .protocol import strip_block
+
+RECURSOS_SIMULADOS = ["madera", "piedra", "tela", "trigo", "hierro", "lana"]
+SEGUNDOS_POR_TURNO = 5.0
+_FECHA_BASE = datetime(2026, 1, 1)
+
+_RE_OFERTA_SIMPLE = re.compile(
+    r"intercambiar (\d+) (.+?) que necesito por (\d+) (.+?) que te ofrezco"
+)
+
+
+def _json_after(text: str, marker: str) -> Any:
+    """Decodifica el primer valor JSON que aparece tras `marker` en `text`."""
+    pos = text.find(marker)
+    if pos < 0:
+        return None
+    pos = text.find("{", pos + len(marker))
+    if pos < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, pos)
+    except json.JSONDecodeError:
+        return None
+    return value
+
+
+class DeterministicLLM:
+    """
+    LLM falso y determinista: interpreta los prompts de analizar_carta y
+    analizar_oferta aplicando en Python las mismas reglas que se le piden
+    al modelo. Entiende las cartas que generan letters.py y el simulador.
+    """
+
+    def __init__(self) -> None:
+        self.llamadas = 0
+
+    def __call__(self, prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
+        self.llamadas += 1
+        if format is ANALIZAR_CARTA_JSON_SCHEMA or "CARTA RECIBIDA" in prompt:
+            return json.dumps(self._analizar_carta(prompt), ensure_ascii=False)
+        return json.dumps(self._analizar_oferta(prompt), ensure_ascii=False)
+
+    @staticmethod
+    def _analizar_carta(prompt: str) -> Dict[str, Any]:
+        vacio = {"tipo": "otro", "oferta": {}, "pide": {}, "recursos_recibidos": {}}
+        carta = _json_after(prompt, "CARTA RECIBIDA")
+        if not isinstance(carta, dict):
+            return vacio
+        cuerpo = carta.get("cuerpo", "")
+
+        m = _RE_OFERTA_SIMPLE.search(cuerpo)
+        if m:
+            return {
+                "tipo": "oferta",
+                "oferta": {m.group(4): int(m.group(3))},
+                "pide": {m.group(2): int(m.group(1))},
+                "recursos_recibidos": {},
+            }
+
+        enviados = _json_after(cuerpo, "Te he enviado")
+        if isinstance(enviados, dict):
+            esperados = _json_after(cuerpo, "Espero recibir")
+            return {
+                "tipo": "confirmacion",
+                "oferta": {},
+                "pide": esperados if isinstance(esperados, dict) else {},
+                "recursos_recibidos": enviados,
+            }
+        return vacio
+
+    @staticmethod
+    def _analizar_oferta(prompt: str) -> Dict[str, Any]:
+        needs = _json_after(prompt, "NECESITAMOS") or {}
+        surplus = _json_after(prompt, "PODEMOS OFRECER") or {}
+        analisis = _json_after(prompt, "OFERTA:") or {}
+        oferta = analisis.get("oferta") or {}
+        pide = analisis.get("pide") or {}
+
+        oferta_util = {
+            k: min(int(v), needs[k]) for k, v in oferta.items() if needs.get(k, 0) > 0
+        }
+        pide_posible = all(
+            needs.get(k, 0) == 0 and surplus.get(k, 0) >= int(v) for k, v in pide.items()
+        )
+        completa = all(oferta_util.get(k, 0) >= v for k, v in needs.items())
+        equilibrada = sum(pide.values()) <= sum(oferta_util.values()) or completa
+
+        if oferta_util and pide and pide_posible and equilibrada:
+            return {"decision": "aceptada", "oferta": oferta_util, "pide": pide}
+        return {"decision": "rechazada", "oferta": oferta, "pide": pide}
+
+
+@dataclass
+class SimAgent:
+    """Agente simulado: su puesto en el servidor y sus métricas."""
+
+    alias: str
+    inventario: Dict[str, int]
+    objetivo: Dict[str, int]
+    buzon: Dict[str, Any] = field(default_factory=dict)
+    state: Optional[State] = None
+    tracker: MailboxTracker = field(default_factory=MailboxTracker)
+    detector: NearDuplicateDetector = field(default_factory=NearDuplicateDetector)
+    negotiator: Optional[NegotiationManager] = None
+    pricing: Optional[PricingEngine] = None
+    coalition: Optional[Coalition] = None
+    dashboard: Optional[DashboardClient] = None
+    cycles: Optional[CycleCoordinator] = None
+    turno_objetivo: Optional[int] = None
+
+    def info(self) -> Dict[str, Any]:
+        """Respuesta equivalente a GET /info para este agente."""
+        return {
+            "Alias": [self.alias],
+            "Buzon": dict(self.buzon),
+            "Recursos": dict(self.inventario),
+            "Objetivo": dict(self.objetivo),
+        }
+
+
+class SimWorld:
+    """
+    Servidor del juego en memoria: enruta cartas y paquetes entre agentes.
+    Las funciones de `api` se redirigen a este mundo mientras actúa un agente.
+    Con `texto_plano`, las cartas se entregan sin el bloque #FDI-PROTO, de
+    modo que todas pasan por el LLM (p. ej. para generar etiquetas).
+    """
+
+    def __init__(self, agents: List[SimAgent], texto_plano: bool = False) -> None:
+        self.agents = {a.alias: a for a in agents}
+        self.texto_plano = texto_plano
+        self.turno = 0
+        self._seq = 0
+        self.cartas_enviadas = 0
+        self.paquetes_enviados = 0
+
+    def _fecha(self) -> str:
+        self._seq += 1
+        instante = _FECHA_BASE + timedelta(
+            seconds=self.turno * SEGUNDOS_POR_TURNO, microseconds=self._seq
+        )
+        return instante.isoformat()
+
+    def send_letter(self, remi: str, dest: str, asunto: str, cuerpo: str) -> Any:
+        destino = self.agents.get(dest)
+        if destino is None:
+            raise ValueError(f"Destinatario desconocido: {dest}")
+        if self.texto_plano:
+            cuerpo = strip_block(cuerpo)
+        uid = str(uuid4())
+        destino.buzon[uid] = {
+            "remi": remi,
+            "dest": dest,
+            "asunto": asunto,
+            "cuerpo": cuerpo,
+            "id": uid,
+            "fecha": self._fecha(),
+        }
+        self.cartas_enviadas += 1
+        return {}
+
+    def send_package(self, remi: str, dest: str, resources: Dict[str, int]) -> Any:
+        origen = self.agents[remi]
+        destino = self.agents.get(dest)
+        if destino is None:
+            raise ValueError(f"Destinatario desconocido: {dest}")
+        for recurso, cant in resources.items():
+            if cant < 0 or origen.inventario.get(recurso, 0) < cant:
+                raise ValueError(f"{remi} no tiene {cant} de '{recurso}'")
+        for recurso, cant in resources.items():
+            origen.inventario[recurso] -= cant
+            destino.inventario[recurso] = destino.inventario.get(recurso, 0) + cant
+        self.paquetes_enviados += 1
+        return {}
+
+    def delete_letter(self, alias: str, uid: str) -> Any:
+        self.agents[alias].buzon.pop(uid, None)
+        return {}
+
+    def dashboard(self) -> str:
+        """HTML equivalente a GET /dashboard: una fila por agente, "tiene/objetivo" por recurso."""
+        recursos = sorted({r for a in self.agents.values() for r in list(a.inventario) + list(a.objetivo)})
+        filas = ["<tr><th>Alias</th>" + "".join(f"<th>{r}</th>" for r in recursos) + "</tr>"]
+        for a in self.agents.values():
+            celdas = "".join(
+                f"<td>{a.inventario.get(r, 0)}/{a.objetivo.get(r, 0)}</td>" for r in recursos
+            )
+            filas.append(f"<tr><td>{a.alias}</td>{celdas}</tr>")
+        return "<html><body><table>" + "".join(filas) + "</table></body></html>"
+
+    @contextlib.contextmanager
+    def acting_as(self, agent: SimAgent) -> Iterator[None]:
+        """Redirige las funciones de `api` al mundo simulado en nombre de `agent`."""
+        overrides: Dict[str, Callable[..., Any]] = {
+            "get_info": agent.info,
+            "get_people": lambda: list(self.agents),
+            "get_dashboard": self.dashboard,
+            "set_alias": lambda nombre: {},
+            "send_letter": lambda to, subject, body: self.send_letter(
+                agent.alias, to, subject, body
+            ),
+            "send_package": lambda to, resources: self.send_package(
+                agent.alias, to, resources
+            ),
+            "delete_letter": lambda uid: self.delete_letter(agent.alias, uid),
+        }
+        originals = {name: getattr(api, name) for name in overrides}
+        for name, fn in overrides.items():
+            setattr(api, name, fn)
+        try:
+            yield
+        finally:
+            for name, fn in originals.items():
+                setattr(api, name, fn)
+
+
+def random_agents(n: int, rng: random.Random) -> List[SimAgent]:
+    """
+    Genera `n` agentes con Recursos/Objetivo aleatorios (esquema de /info).
+    Los objetivos se reparten a partir del total de recursos de la partida,
+    de modo que siempre existe una asignación que cumple todos los objetivos.
+    """
+    inventarios = [
+        {r: rng.randint(0, 6) for r in RECURSOS_SIMULADOS} for _ in range(n)
+    ]
+    objetivos: List[Dict[str, int]] = [{} for _ in range(n)]
+    for recurso in RECURSOS_SIMULADOS:
+        total = sum(inv[recurso] for inv in inventarios)
+        for _ in range(total):
+            elegido = rng.randrange(n)
+            objetivos[elegido][recurso] = objetivos[elegido].get(recurso, 0) + 1
+
+    agents = []
+    for i, (inventario, objetivo) in enumerate(zip(inventarios, objetivos)):
+        # Parte del oro puede sobrar respecto al objetivo y gastarse.
+        oro = rng.randint(0, 5)
+        inventario[get_config().gold_resource_name] = oro
+        objetivo[get_config().gold_resource_name] = rng.randint(0, oro)
+        agents.append(SimAgent(alias=f"agente{i}", inventario=inventario, objetivo=objetivo))
+    return agents
+
+
+def cyclic_agents(n: int) -> List[SimAgent]:
+    """
+    Partida bloqueada sin intercambios bilaterales: el agente i tiene una
+    unidad del recurso i y necesita una del recurso i - 1, así que solo se
+    resuelve con un ciclo entre los `n` agentes (n >= 3).
+    """
+    recursos = [
+        RECURSOS_SIMULADOS[i] if i < len(RECURSOS_SIMULADOS) else f"recurso{i}" for i in range(n)
+    ]
+    return [
+        SimAgent(
+            alias=f"agente{i}",
+            inventario={recursos[i]: 1},
+            objetivo={recursos[i - 1]: 1},
+        )
+        for i in range(n)
+    ]
+
+
+class Simulator:
+    """
+    Ejecuta turnos de partida: en cada turno cada agente activo puede enviar
+    una mini oferta y después procesa su buzón con `app.process_mailbox`.
+    """
+
+    def __init__(
+        self,
+        agents: List[SimAgent],
+        llm: Optional[ollama_client.LLMBackend] = None,
+        seed: int = 0,
+        prob_oferta: float = 0.5,
+        coalicion: int = 0,
+        texto_plano: bool = False,
+    ) -> None:
+        self.world = SimWorld(agents, texto_plano)
+        self.llm = llm if llm is not None else DeterministicLLM()
+        self.rng = random.Random(seed)
+        self.prob_oferta = prob_oferta
+        self.decisiones = 0
+        self.cpu_por_decision: List[float] = []
+        self.turnos_jugados = 0
+        self.tiempo_real = 0.0
+        if get_config().negotiation_enabled:
+            # Los plazos de negociación se miden en tiempo de partida.
+            for agent in agents:
+                if agent.negotiator is None:
+                    agent.negotiator = NegotiationManager(
+                        clock=lambda: self.world.turno * SEGUNDOS_POR_TURNO
+                    )
+        if get_config().trade_cycles_enabled:
+            for agent in agents:
+                if agent.cycles is None:
+                    agent.cycles = CycleCoordinator(
+                        clock=lambda: self.world.turno * SEGUNDOS_POR_TURNO
+                    )
+        # Los `coalicion` primeros agentes comparten estado en memoria.
+        canal = MemoryChannel()
+        for agent in agents[:coalicion]:
+            agent.coalition = Coalition(canal, clock=lambda: self.world.turno * SEGUNDOS_POR_TURNO)
+
+    def _send_random_offer(self, agent: SimAgent) -> None:
+        state = agent.state
+        if not state or not state.needs or not state.surplus:
+            return
+        otros = [a for a in self.world.agents if a != agent.alias]
+        if not otros:
+            return
+        necesario = self.rng.choice(sorted(state.needs))
+        sobrante = self.rng.choice(sorted(state.surplus))
+        api.send_letter(
+            self.rng.choice(otros),
+            f"Oferta: 1 {necesario} por 1 {sobrante}",
+            build_simple_offer_letter(necesario, sobrante),
+        )
+
+    def _agent_turn(self, agent: SimAgent) -> None:
+        with self.world.acting_as(agent):
+            if agent.state is None:
+                agent.state = State.from_info(api.get_info())
+                if get_config().gold_pricing_enabled:
+                    agent.pricing = PricingEngine(
+                        objetivo_oro=agent.objetivo.get(get_config().gold_resource_name, 0),
+                        clock=lambda: self.world.turno * SEGUNDOS_POR_TURNO,
+                    )
+                if get_config().dashboard_enabled:
+                    agent.dashboard = DashboardClient(clock=lambda: self.world.turno * SEGUNDOS_POR_TURNO)
+            else:
+                agent.state.update()
+            if agent.dashboard is not None:
+                agent.state.market = agent.dashboard.market(agent.alias)
+            if agent.coalition is not None:
+                agent.coalition.exchange(agent.state)
+            if self.rng.random() < self.prob_oferta:
+                self._send_random_offer(agent)
+            if agent.pricing is not None:
+                otros = [a for a in self.world.agents if a != agent.alias]
+                self.rng.shuffle(otros)
+                agent.pricing.send_offers(
+                    agent.state.needs, agent.state.inventario, otros, agent.state.market
+                )
+
+            # El CPU se mide por pasada de buzón y se reparte entre sus cartas.
+            cartas = sum(1 for c in agent.state.buzon.values() if c.get("remi") != agent.alias)
+            inicio = time.process_time()
+            process_mailbox(
+                agent.state,
+                agent.tracker,
+                agent.detector,
+                agent.negotiator,
+                agent.pricing,
+                cycles=agent.cycles,
+            )
+            if cartas:
+                self.decisiones += cartas
+                self.cpu_por_decision.extend(
+                    [(time.process_time() - inicio) / cartas] * cartas
+                )
+
+            agent.state.update()
+            if agent.cycles is not None:
+                agent.cycles.step(agent.state)
+            if agent.state.has_reached_objective():
+                agent.turno_objetivo = self.world.turno
+                if agent.cycles is not None:
+                    agent.cycles.release(agent.state)
+
+    def run(self, turnos: int) -> Dict[str, Any]:
+        """Juega hasta `turnos` turnos (o hasta que todos cumplan el objetivo)."""
+        previous = ollama_client.set_backend(self.llm)
+        inicio = time.perf_counter()
+        try:
+            with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+                for _ in range(turnos):
+                    activos = [
+                        a for a in self.world.agents.values() if a.turno_objetivo is None
+                    ]
+                    if not activos:
+                        break
+                    self.rng.shuffle(activos)
+                    for agent in activos:
+                        self._agent_turn(agent)
+                    self.world.turno += 1
+                    self.turnos_jugados += 1
+        finally:
+            ollama_client.set_backend(previous)
+            self.tiempo_real += time.perf_counter() - inicio
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """Métricas de la simulación: tiempo hasta objetivo, intercambios y CPU."""
+        agentes = list(self.world.agents.values())
+        turnos_objetivo = [a.turno_objetivo for a in agentes if a.turno_objetivo is not None]
+        minutos = self.turnos_jugados * SEGUNDOS_POR_TURNO / 60.0
+        cpu_us = sorted(t * 1e6 for t in self.cpu_por_decision)
+        negociadores = [a.negotiator for a in agentes if a.negotiator is not None]
+        rondas = [r for n in negociadores for r in n.rondas_acuerdo]
+        precios = [a.pricing for a in agentes if a.pricing is not None]
+        miembros = [a for a in agentes if a.coalition is not None]
+        ciclos = [a.cycles for a in agentes if a.cycles is not None]
+        return {
+            "agentes": len(agentes),
+            "agentes_con_objetivo": len(turnos_objetivo),
+            "turnos_jugados": self.turnos_jugados,
+            "turnos_medios_hasta_objetivo": (
+                statistics.mean(turnos_objetivo) if turnos_objetivo else None
+            ),
+            "segundos_medios_hasta_objetivo": (
+                statistics.mean(turnos_objetivo) * SEGUNDOS_POR_TURNO
+                if turnos_objetivo
+                else None
+            ),
+            "intercambios": self.world.paquetes_enviados,
+            "intercambios_por_minuto": (
+                self.world.paquetes_enviados / minutos if minutos else 0.0
+            ),
+            "cartas_enviadas": self.world.cartas_enviadas,
+            "contraofertas": sum(n.contraofertas for n in negociadores),
+            "acuerdos_negociados": len(rondas),
+            "rondas_medias_hasta_acuerdo": statistics.mean(rondas) if rondas else None,
+            "compras_con_oro_ofrecidas": sum(p.compras_ofrecidas for p in precios),
+            "oro_gastado": sum(p.oro_gastado for p in precios),
+            "coalicion_con_objetivo": sum(1 for a in miembros if a.turno_objetivo is not None),
+            "paquetes_de_coalicion": sum(a.coalition.enviados for a in miembros),
+            "cadenas_en_ciclo_iniciadas": sum(c.cadenas_iniciadas for c in ciclos),
+            "cadenas_en_ciclo_completadas": sum(c.cadenas_completadas for c in ciclos),
+            "decisiones": self.decisiones,
+            "cpu_us_por_decision_media": statistics.mean(cpu_us) if cpu_us else 0.0,
+            "cpu_us_por_decision_p95": (
+                cpu_us[int(0.95 * (len(cpu_us) - 1))] if cpu_us else 0.0
+            ),
+            "turnos_por_segundo": (
+                self.turnos_jugados * len(agentes) / self.tiempo_real
+                if self.tiempo_real
+                else 0.0
+            ),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulador de partidas en memoria")
+    parser.add_argument("--agentes", type=int, default=8)
+    parser.add_argument("--turnos", type=int, default=2000)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--prob-oferta", type=float, default=0.5)
+    parser.add_argument(
+        "--llm",
+        choices=["determinista", "ollama"],
+        default="determinista",
+        help="LLM a usar: falso determinista o el servidor Ollama real",
+    )
+    parser.add_argument(
+        "--etiquetas",
+        default="",
+        help="Fichero JSONL donde guardar las respuestas del LLM para entrenar el clasificador (implica --texto-plano)",
+    )
+    parser.add_argument(
+        "--texto-plano",
+        action="store_true",
+        help="Enviar las cartas sin bloque de protocolo, para que todas las analice el LLM",
+    )
+    parser.add_argument(
+        "--coalicion",
+        type=int,
+        default=0,
+        help="Número de agentes (los primeros) que forman una coalición",
+    )
+    parser.add_argument(
+        "--sin-oro",
+        action="store_true",
+        help="No gastar el oro sobrante en comprar recursos",
+    )
+    parser.add_argument(
+        "--sin-negociacion",
+        action="store_true",
+        help="Rechazar ofertas sin enviar contraofertas",
+    )
+    parser.add_argument(
+        "--escenario",
+        choices=["aleatorio", "ciclo"],
+        default="aleatorio",
+        help="Partida aleatoria o bloqueada en un ciclo (solo se resuelve con intercambios en cadena)",
+    )
+    parser.add_argument(
+        "--sin-ciclos",
+        action="store_true",
+        help="No buscar intercambios en ciclo entre tres o más agentes",
+    )
+    parser.add_argument(
+        "--sin-dashboard",
+        action="store_true",
+        help="No consultar el dashboard para dirigir y descartar ofertas",
+    )
+    args = parser.parse_args()
+
+    # Sin clasificador local (resultados deterministas) y sin escribir
+    # etiquetas salvo que se pida.
+    configure(
+        classifier_model="",
+        classifier_dataset=args.etiquetas,
+        offer_optimizer=True,
+        negotiation_enabled=not args.sin_negociacion,
+        gold_pricing_enabled=not args.sin_oro,
+        dashboard_enabled=not args.sin_dashboard,
+        trade_cycles_enabled=not args.sin_ciclos,
+    )
+
+    rng = random.Random(args.semilla)
+    if args.escenario == "ciclo":
+        agents = cyclic_agents(args.agentes)
+    else:
+        agents = random_agents(args.agentes, rng)
+    llm = DeterministicLLM() if args.llm == "determinista" else ollama_client.generate
+    sim = Simulator(
+        agents,
+        llm=llm,
+        seed=args.semilla,
+        prob_oferta=args.prob_oferta,
+        coalicion=args.coalicion,
+        texto_plano=args.texto_plano or bool(args.etiquetas),
+    )
+    print(json.dumps(sim.run(args.turnos), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from . import api
-from .config import GOLD_RESOURCE_NAME
+from .config import get_config
 from .letters import build_trade_confirmation_letter
+from .negotiation import NegotiationManager
+from .pricing import PricingEngine
 from .ollama_client import ollama
+from .prompts import build_prompt_oferta, record_prompt
+from .settlement import Settlement
 
 # JSON Schema para forzar la forma de la decisión de oferta (Ollama format).
 ANALIZAR_OFERTA_JSON_SCHEMA = {
@@ -28,6 +32,38 @@ ANALIZAR_OFERTA_JSON_SCHEMA = {
 }
 
 
+def _int_dict(value: Any) -> Dict[str, int]:
+    try:
+        return {k: int(v) for k, v in (value or {}).items()}
+    except (AttributeError, TypeError, ValueError):
+        return {}
+
+
+def prescore_offer(
+    remitente: str,
+    analisis: Dict[str, Any],
+    market: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None,
+) -> Optional[str]:
+    """
+    Valoración previa de una oferta con el dashboard (ver `State.market`),
+    sin consultar al LLM: devuelve el motivo para rechazarla si el
+    remitente no tiene de sobra lo que ofrece, o None si no se descarta.
+    El oro no se comprueba: el dashboard no lo cuenta como excedente.
+    """
+    fila = (market or {}).get(remitente)
+    if fila is None:
+        return None
+    oro = get_config().gold_resource_name
+    sobra = fila.get("surplus", {})
+    for recurso, cant in _int_dict(analisis.get("oferta")).items():
+        if recurso != oro and cant > sobra.get(recurso, 0):
+            return (
+                f"Según el dashboard a {remitente} le sobran {sobra.get(recurso, 0)} "
+                f"'{recurso}' y ofrece {cant}."
+            )
+    return None
+
+
 def analizar_oferta(
     oferta: Dict[str, Any],
     needs: Dict[str, Any],
@@ -37,46 +73,8 @@ def analizar_oferta(
     Usa Ollama para decidir si aceptar o rechazar una oferta.
     Devuelve un JSON con decision (aceptada|rechazada), oferta y pide.
     """
-    prompt = f"""
-Eres un asistente que toma decisiones sobre ofertas recibidas.
-
-Tu tarea es LEER la oferta y devolver un JSON estructurado con esta forma:
-
-{{
-  "decision": "aceptada" | "rechazada",
-  "oferta": {{
-    "recurso": cantidad entero
-  }},
-  "pide": {{
-    "recurso": cantidad entero
-  }},
-
-}}
-
-Donde:
-- "decision" = "aceptada" si se cumplen TODAS las condiciones siguientes:
-    a) los recursos que ofrece los necesitamos para cumplir el objetivo
-    b) no pide recursos que necesitemos para nuestro objetivo
-    c) podemos dar los recursos que pide
-    d) se envían como máximo el mismo número de recursos que se reciben, salvo que con la oferta completemos el objetivo al 100%
-
-- "decision" = "rechazada" si no se cumple alguna de las condiciones anteriores
-- "oferta" describe lo que EL OTRO agente nos ofrece.
-- "pide" describe lo que EL OTRO agente quiere que le enviemos.
-- No hace falta aceptar la oferta al completo, se puede aceptar parcialmente solo los recursos que nos interesen y que cumplan las condiciones anteriores.
-IMPORTANTE:
-- Devuelve SIEMPRE un JSON VÁLIDO, sin texto adicional.
-
-NECESITAMOS:
-{json.dumps(needs, ensure_ascii=False, indent=2)}
-
-PODEMOS OFRECER:
-{json.dumps(surplus, ensure_ascii=False, indent=2)}
-
-OFERTA:
-{json.dumps(oferta, ensure_ascii=False, indent=2)}
-
-"""
+    prompt = build_prompt_oferta(oferta, needs, surplus)
+    record_prompt("analizar_oferta", prompt)
     respuesta = ollama(prompt, format=ANALIZAR_OFERTA_JSON_SCHEMA)
     try:
         data = json.loads(respuesta)
@@ -94,10 +92,15 @@ def process_offer(
     needs: Dict[str, Any],
     surplus: Dict[str, int],
     inventario: Dict[str, int],
+    decision: Optional[Dict[str, Any]] = None,
+    pricing: Optional[PricingEngine] = None,
 ) -> Dict[str, Any]:
     """
     Procesa una oferta: decide si se acepta y comprueba todas las condiciones
     (no enviar oro, no enviar lo que necesitamos, tener stock suficiente).
+    Si se pasa `decision` (p. ej. del optimizador), se usa en lugar de
+    preguntar a analizar_oferta. Con `pricing` se permite pagar con el oro
+    sobrante si el precio no supera el valor de mercado de lo que recibimos.
 
     Estructura devuelta:
     {
@@ -120,7 +123,8 @@ def process_offer(
             "recursos_a_enviar": {},
         }
 
-    decision = analizar_oferta(analisis, needs, surplus)
+    if decision is None:
+        decision = analizar_oferta(analisis, needs, surplus)
 
     if decision.get("decision") != "aceptada":
         return {
@@ -146,14 +150,23 @@ def process_offer(
         }
 
     # Comprobaciones de condiciones antes de aceptar
-    if GOLD_RESOURCE_NAME in recursos_a_enviar and recursos_a_enviar.get(GOLD_RESOURCE_NAME, 0) > 0:
-        return {
-            "aceptada": False,
-            "motivo": "No enviamos oro.",
-            "oferta": oferta_decidida,
-            "pide": pide_decidido,
-            "recursos_a_enviar": {},
-        }
+    oro = get_config().gold_resource_name
+    if recursos_a_enviar.get(oro, 0) > 0:
+        motivo = (
+            "No enviamos oro."
+            if pricing is None
+            else pricing.check_payment(
+                recursos_a_enviar, _int_dict(oferta_decidida), needs, inventario
+            )
+        )
+        if motivo is not None:
+            return {
+                "aceptada": False,
+                "motivo": motivo,
+                "oferta": oferta_decidida,
+                "pide": pide_decidido,
+                "recursos_a_enviar": {},
+            }
 
     for recurso, cant in recursos_a_enviar.items():
         if needs.get(recurso, 0) > 0:
@@ -186,11 +199,13 @@ def process_confirmation(
     analisis: Dict[str, Any],
     inventario: Dict[str, int],
     needs: Dict[str, Any],
+    pricing: Optional[PricingEngine] = None,
 ) -> Dict[str, Any]:
     """
     Procesa una confirmación de envío: extrae qué nos han enviado y qué piden
     a cambio, y comprueba las condiciones (no enviar oro, no enviar lo que
     necesitamos, tener stock suficiente) antes de autorizar el envío.
+    Con `pricing`, el oro se puede enviar como en `process_offer`.
 
     Estructura devuelta:
     {
@@ -242,16 +257,29 @@ def process_confirmation(
         }
 
     # Comprobaciones de condiciones antes de autorizar el envío
-    if GOLD_RESOURCE_NAME in recursos_a_enviar and recursos_a_enviar.get(GOLD_RESOURCE_NAME, 0) > 0:
-        return {
-            "tiene_recursos_recibidos": True,
-            "es_regalo": False,
-            "puede_enviar": False,
-            "motivo": "No enviamos oro en confirmación.",
-            "recursos_recibidos": recursos_recibidos,
-            "pide": pide,
-            "recursos_a_enviar": {},
-        }
+    oro = get_config().gold_resource_name
+    if recursos_a_enviar.get(oro, 0) > 0:
+        motivo = (
+            "No enviamos oro en confirmación."
+            if pricing is None
+            else pricing.check_settlement(
+                analisis.get("ids") or [],
+                recursos_a_enviar,
+                _int_dict(recursos_recibidos),
+                needs,
+                inventario,
+            )
+        )
+        if motivo is not None:
+            return {
+                "tiene_recursos_recibidos": True,
+                "es_regalo": False,
+                "puede_enviar": False,
+                "motivo": motivo,
+                "recursos_recibidos": recursos_recibidos,
+                "pide": pide,
+                "recursos_a_enviar": {},
+            }
 
     for recurso, cant in recursos_a_enviar.items():
         if needs.get(recurso, 0) > 0:
@@ -292,17 +320,39 @@ def handle_offer(
     needs: Dict[str, Any],
     surplus: Dict[str, int],
     inventario: Dict[str, int],
+    settlement: Optional[Settlement] = None,
+    decision: Optional[Dict[str, Any]] = None,
+    negotiator: Optional[NegotiationManager] = None,
+    pricing: Optional[PricingEngine] = None,
+    market: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None,
 ) -> bool:
     """
     Procesa una oferta: decide, comprueba condiciones, envía paquete y carta
     de confirmación si se acepta. Devuelve True si nuestros recursos cambiaron.
+    Con `settlement`, el envío se apunta para liquidarlo agrupado al final
+    de la pasada en lugar de hacerse en el momento. Con `negotiator`, una
+    oferta rechazada recibe una contraoferta en lugar de quedar sin respuesta.
+    Con `pricing` se admiten pagos con el oro sobrante (ver `process_offer`).
+    Con `market`, las ofertas que el remitente no puede cumplir se rechazan
+    sin decidir ni contraofertar (ver `prescore_offer`).
     """
-    resultado = process_offer(analisis, needs, surplus, inventario)
+    motivo = prescore_offer(remitente, analisis, market)
+    if motivo is not None:
+        print(f"Oferta descartada: {motivo}")
+        return False
+    if negotiator is not None:
+        # Una oferta nueva del remitente responde (y descarta) nuestra
+        # contraoferta; lo reservado para otros no se puede usar.
+        negotiator.release(remitente)
+    libre = negotiator.available(surplus) if negotiator is not None else surplus
+    resultado = process_offer(analisis, needs, libre, inventario, decision, pricing)
     print("Decisión sobre la oferta:")
     print(json.dumps(resultado, ensure_ascii=False, indent=2))
 
     if not resultado.get("aceptada"):
         print(f"Oferta rechazada: {resultado.get('motivo')}")
+        if negotiator is not None:
+            negotiator.counter(remitente, analisis, needs, surplus)
         return False
 
     oferta = resultado.get("oferta") or {}
@@ -310,6 +360,21 @@ def handle_offer(
     if not recursos_a_enviar:
         print("Oferta aceptada pero sin recursos a enviar (resultado vacío), no se realiza envío.")
         return False
+    if negotiator is not None:
+        negotiator.close(remitente)
+    if pricing is not None:
+        pricing.record_trade(recursos_a_enviar, oferta)
+
+    if settlement is not None:
+        print(f"Aceptando oferta de {remitente}. Envío agrupado pendiente: {recursos_a_enviar}")
+        settlement.add(
+            remitente,
+            recursos_a_enviar,
+            oferta,
+            "Confirmación de oferta aceptada",
+            analisis.get("ids"),
+        )
+        return True
 
     try:
         print(f"Aceptando oferta de {remitente}. Enviando paquete: {recursos_a_enviar}")
@@ -322,6 +387,7 @@ def handle_offer(
         carta_confirmacion = build_trade_confirmation_letter(
             recursos_enviados=recursos_a_enviar,
             recursos_esperados=oferta,
+            trade_ids=analisis.get("ids"),
         )
         print(f"→ Enviando carta de confirmación de oferta aceptada a {remitente}...")
         api.send_letter(remitente, "Confirmación de oferta aceptada", carta_confirmacion)
@@ -336,18 +402,28 @@ def handle_confirmation(
     analisis: Dict[str, Any],
     inventario: Dict[str, int],
     needs: Dict[str, Any],
+    settlement: Optional[Settlement] = None,
+    negotiator: Optional[NegotiationManager] = None,
+    pricing: Optional[PricingEngine] = None,
 ) -> bool:
     """
     Procesa una confirmación: decide, comprueba condiciones, envía paquete
     y carta de confirmación si aplica. Devuelve True si nuestros recursos cambiaron.
+    Con `settlement`, el envío se agrupa como en `handle_offer`; con
+    `negotiator`, la confirmación cierra la negociación abierta con el remitente.
     """
-    resultado = process_confirmation(analisis, inventario, needs)
+    if negotiator is not None:
+        # Lo prometido a otros en contraofertas no se usa para pagar esta.
+        inventario = negotiator.available(inventario, excepto=remitente)
+    resultado = process_confirmation(analisis, inventario, needs, pricing)
     print("Decisión sobre la confirmación:")
     print(json.dumps(resultado, ensure_ascii=False, indent=2))
 
     if not resultado.get("tiene_recursos_recibidos"):
         print(f"No se procesan recursos: {resultado.get('motivo')}")
         return False
+    if negotiator is not None:
+        negotiator.close(remitente)
 
     recursos_recibidos = resultado.get("recursos_recibidos") or {}
     recursos_a_enviar = resultado.get("recursos_a_enviar") or {}
@@ -359,6 +435,16 @@ def handle_confirmation(
     if not resultado.get("puede_enviar") or not recursos_a_enviar:
         print(f"No se envía paquete de confirmación: {resultado.get('motivo', 'sin recursos a enviar')}.")
         return False
+    if pricing is not None:
+        pricing.record_trade(recursos_a_enviar, recursos_recibidos)
+
+    if settlement is not None:
+        print(f"Confirmación correcta de {remitente}. Envío agrupado pendiente: {recursos_a_enviar}")
+        # Ya hemos recibido su parte: no esperamos nada a cambio (cierre).
+        settlement.add(
+            remitente, recursos_a_enviar, {}, "Confirmación de envío de recursos", analisis.get("ids")
+        )
+        return True
 
     try:
         print(f"Confirmación correcta de {remitente}. Enviando paquete de vuelta: {recursos_a_enviar}")
@@ -370,7 +456,9 @@ def handle_confirmation(
     try:
         carta_confirmacion = build_trade_confirmation_letter(
             recursos_enviados=recursos_a_enviar,
-            recursos_esperados=recursos_recibidos,
+            recursos_esperados={},
+            trade_ids=analisis.get("ids"),
+            cierre=True,
         )
         print(f"→ Enviando carta de confirmación de envío de recursos a {remitente}...")
         api.send_letter(remitente, "Confirmación de envío de recursos", carta_confirmacion)
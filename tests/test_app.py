@@ -0,0 +1,80 @@
+import io
+import unittest
+from unittest import mock
+
+from src import app, protocol
+from src.dedup import NearDuplicateDetector
+from src.game_state import State
+
+
+class ProcessMailboxStreamingTest(unittest.TestCase):
+    def test_actua_cuando_llegan_recursos_y_objetivo(self):
+        state = State(alias="yo", inventario={}, objetivo={}, needs={}, surplus={}, buzon={})
+        state.pendientes = {"Recursos", "Objetivo"}
+        inventarios = []
+
+        def cartas():
+            yield "c1", {"remi": "ana", "cuerpo": "gracias"}
+            state.inventario = {"madera": 3}
+            state.pendientes = set()
+            yield "c2", {"remi": "luis", "cuerpo": "gracias"}
+
+        def actuar(state, id_carta, *args, **kwargs):
+            inventarios.append((id_carta, dict(state.inventario)))
+
+        with mock.patch.object(app, "analyze_letter", return_value={"tipo": "confirmacion"}), \
+                mock.patch.object(app, "act_on_letter", side_effect=actuar):
+            app.process_mailbox(state, letters=cartas())
+        # La carta que llegó antes que el inventario se trata con el inventario ya leído.
+        self.assertEqual(inventarios, [("c1", {"madera": 3}), ("c2", {"madera": 3})])
+
+
+class ProcessMailboxDedupTest(unittest.TestCase):
+    CUERPO = "Te propongo intercambiar 2 piedra que me sobran por 1 madera que necesito, si te interesa."
+
+    def setUp(self):
+        self.state = State(alias="yo", inventario={}, objetivo={}, needs={}, surplus={}, buzon={})
+        self.actuadas = []
+
+        def actuar(state, id_carta, *args, **kwargs):
+            self.actuadas.append(id_carta)
+
+        for patcher in (
+            mock.patch.object(app, "act_on_letter", side_effect=actuar),
+            mock.patch.object(app.api, "delete_letter"),
+            mock.patch("sys.stdout", new_callable=io.StringIO),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _procesar(self, cartas, tipo):
+        with mock.patch.object(app, "analyze_letter", return_value={"tipo": tipo}) as analizar:
+            app.process_mailbox(self.state, detector=NearDuplicateDetector(), letters=iter(cartas))
+        return analizar.call_count
+
+    def test_descarta_ofertas_casi_identicas(self):
+        cartas = [
+            ("c1", {"remi": "bea", "cuerpo": self.CUERPO}),
+            ("c2", {"remi": "bea", "cuerpo": self.CUERPO + " Gracias"}),
+        ]
+        self.assertEqual(self._procesar(cartas, "oferta"), 1)
+        self.assertEqual(self.actuadas, ["c1"])
+        app.api.delete_letter.assert_called_once_with("c2")
+
+    def test_las_que_no_son_ofertas_reutilizan_el_analisis(self):
+        cartas = [
+            ("c1", {"remi": "bea", "cuerpo": self.CUERPO}),
+            ("c2", {"remi": "bea", "cuerpo": self.CUERPO + " Gracias"}),
+        ]
+        self.assertEqual(self._procesar(cartas, "confirmacion"), 1)
+        self.assertEqual(self.actuadas, ["c1", "c2"])
+
+    def test_las_cartas_del_protocolo_no_se_descartan(self):
+        cuerpo = protocol.append_block(self.CUERPO, "oferta", {"piedra": 2}, {"madera": 1}, ids=["t1"])
+        cartas = [("c1", {"remi": "bea", "cuerpo": cuerpo}), ("c2", {"remi": "bea", "cuerpo": cuerpo})]
+        self.assertEqual(self._procesar(cartas, "oferta"), 2)
+        self.assertEqual(self.actuadas, ["c1", "c2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import unittest
+from unittest import mock
+
+from src.budget import LetterBudget
+from src.ollama_client import BudgetExceeded
+
+OTRO = {"tipo": "otro", "oferta": {}, "pide": {}, "recursos_recibidos": {}}
+
+
+def _agota(*args):
+    raise BudgetExceeded("presupuesto agotado")
+
+
+class LetterBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.budget = LetterBudget(segundos=1.0, reintentos=2)
+        silencio = mock.patch("sys.stdout", new_callable=io.StringIO)
+        silencio.start()
+        self.addCleanup(silencio.stop)
+
+    def test_reintenta_y_luego_trata_como_otro(self):
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertEqual(self.budget.analyze("c1", _agota), OTRO)
+        self.assertEqual(self.budget.diferidas, 2)
+        self.assertEqual(self.budget.conservadoras, 1)
+        # Tras tratarla como "otro" el contador vuelve a empezar.
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+
+    def test_un_analisis_a_tiempo_reinicia_los_reintentos(self):
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertEqual(self.budget.analyze("c1", lambda: {"tipo": "oferta"}), {"tipo": "oferta"})
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+
+    def test_los_reintentos_son_por_carta(self):
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertIsNone(self.budget.analyze("c1", _agota))
+        self.assertIsNone(self.budget.analyze("c2", _agota))
+
+    def test_decision_fuera_de_plazo_usa_el_optimizador(self):
+        analisis = {"tipo": "oferta", "oferta": {"madera": 1}, "pide": {"piedra": 1}}
+        with mock.patch("src.budget.analizar_oferta", side_effect=_agota):
+            decision = self.budget.decide_offer("c1", analisis, {"madera": 1}, {"piedra": 2}, {"piedra": 2})
+        self.assertEqual(decision["decision"], "aceptada")
+        self.assertEqual(self.budget.excedidas_decision, 1)
+
+    def test_oferta_sin_datos_no_consulta_al_llm(self):
+        with mock.patch("src.budget.analizar_oferta") as llm:
+            self.assertIsNone(self.budget.decide_offer("c1", {"tipo": "oferta"}, {}, {}, {}))
+        llm.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from src.coalition import Coalition, MemoryChannel, match
+from src.game_state import State
+
+
+def _state(alias, inventario, objetivo):
+    needs, surplus = State._compute_needs_and_surplus(inventario, objetivo)
+    return State(alias, dict(inventario), dict(objetivo), needs, surplus, {})
+
+
+class CoalitionTest(unittest.TestCase):
+    def test_match_reparte_excedentes_por_alias(self):
+        miembros = {
+            "a": {"needs": {}, "surplus": {"madera": 3}},
+            "b": {"needs": {"madera": 2}, "surplus": {}},
+            "c": {"needs": {"madera": 2}, "surplus": {}},
+        }
+        self.assertEqual(match(miembros), [("a", "b", "madera", 2), ("a", "c", "madera", 1)])
+
+    def test_version_solo_cambia_con_el_estado(self):
+        coalicion = Coalition(MemoryChannel(), clock=lambda: 0.0)
+        state = _state("a", {"madera": 3}, {"madera": 1, "piedra": 1})
+        coalicion.publish(state)
+        coalicion.publish(state)
+        self.assertEqual(coalicion.version, 1)
+        state.inventario["piedra"] = 1
+        state.recompute()
+        coalicion.publish(state)
+        self.assertEqual(coalicion.version, 2)
+
+    def test_no_reenvia_a_un_estado_ya_atendido(self):
+        canal = MemoryChannel()
+        donante = Coalition(canal, clock=lambda: 0.0)
+        receptor = Coalition(canal, clock=lambda: 0.0)
+        estado_donante = _state("a", {"madera": 5}, {"madera": 1})
+        estado_receptor = _state("b", {}, {"madera": 2})
+        receptor.publish(estado_receptor)
+        with mock.patch("src.coalition.api.send_package") as enviar:
+            donante.exchange(estado_donante)
+            # El receptor vuelve a publicar sin haber leído aún su inventario.
+            receptor.publish(estado_receptor)
+            donante.exchange(estado_donante)
+        enviar.assert_called_once_with("b", {"madera": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import unittest
+from unittest import mock
+
+from src import config
+from src.config import ConfigError, configure, get_config
+
+
+class ConfigTest(unittest.TestCase):
+    def setUp(self):
+        # Sin variables FDI_* del entorno real ni sobrescrituras de otros tests.
+        entorno = {k: v for k, v in os.environ.items() if not k.startswith("FDI_")}
+        for patcher in (
+            mock.patch.dict(os.environ, entorno, clear=True),
+            mock.patch.object(config, "_overrides", {}),
+            mock.patch.object(config, "_config", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_por_defecto_las_funciones_nuevas_estan_apagadas(self):
+        c = get_config()
+        self.assertEqual(c.llm_backends, [])
+        self.assertEqual(c.llm_letter_budget, 0)
+        self.assertFalse(c.offer_optimizer)
+        self.assertFalse(c.dashboard_enabled)
+
+    def test_booleanos_estrictos(self):
+        for texto, valor in (("1", True), ("Sí", True), (" false ", False), ("no", False)):
+            with self.subTest(texto=texto):
+                self.assertIs(config._coerce("x", bool, texto), valor)
+        for invalido in ("2", "tal vez", "", 2, 0.5):
+            with self.subTest(invalido=invalido):
+                with self.assertRaises(ConfigError):
+                    config._coerce("x", bool, invalido)
+
+    def test_numeros_y_listas_desde_el_entorno(self):
+        os.environ["FDI_LLM_LETTER_BUDGET"] = "2.5"
+        os.environ["FDI_LLM_BACKENDS"] = '[{"url": "http://otro:11434"}]'
+        c = get_config()
+        self.assertEqual(c.llm_letter_budget, 2.5)
+        self.assertEqual(c.llm_backends[0]["url"], "http://otro:11434")
+
+    def test_valor_de_entorno_invalido(self):
+        os.environ["FDI_LLM_QUEUE_SIZE"] = "muchos"
+        with self.assertRaises(ConfigError):
+            get_config()
+
+    def test_prioridad_linea_de_comandos_entorno_json(self):
+        self.assertEqual(get_config().model, config._load_config(config._CONFIG_PATH)["model"])
+        os.environ["FDI_MODEL"] = "modelo-entorno"
+        os.environ["FDI_OFFER_OPTIMIZER"] = "true"
+        config._config = None
+        self.assertEqual(get_config().model, "modelo-entorno")
+        c = configure(model="modelo-cli", offer_optimizer=None)
+        self.assertEqual(c.model, "modelo-cli")
+        # None no sobrescribe: sigue valiendo el entorno.
+        self.assertTrue(c.offer_optimizer)
+
+    def test_sobrescrituras_persisten_entre_llamadas(self):
+        configure(model="modelo-cli")
+        self.assertEqual(configure(alias="yo").model, "modelo-cli")
+
+    def test_clave_desconocida(self):
+        with self.assertRaises(ConfigError):
+            configure(no_existe=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import unittest
+from unittest import mock
+
+from src.cycles import CycleCoordinator
+from src.game_state import State
+
+
+def _cierre(recurso, ids):
+    return {
+        "tipo": "confirmacion",
+        "protocolo": "cierre",
+        "oferta": {},
+        "pide": {},
+        "recursos_recibidos": {recurso: 1},
+        "ids": ids,
+    }
+
+
+class CycleCoordinatorTest(unittest.TestCase):
+    # yo -madera-> bea -piedra-> carlos -tela-> yo: ningún intercambio bilateral.
+    def setUp(self):
+        self.ahora = 0.0
+        self.coordinador = CycleCoordinator(max_len=4, timeout=10, clock=lambda: self.ahora)
+        self.coordinador.graph.observe("bea", {"madera": 1}, {"piedra": 1})
+        self.coordinador.graph.observe("carlos", {"piedra": 1}, {"tela": 1})
+        self.state = State("yo", {"madera": 1}, {"tela": 1}, {"tela": 1}, {"madera": 1}, {})
+        patcher = mock.patch("src.cycles.api.send_letter")
+        self.enviar = patcher.start()
+        self.addCleanup(patcher.stop)
+        silencio = mock.patch("sys.stdout", new_callable=io.StringIO)
+        silencio.start()
+        self.addCleanup(silencio.stop)
+
+    def test_inicia_la_cadena_con_el_primer_tramo(self):
+        self.coordinador.step(self.state)
+        cadena = self.coordinador.cadena
+        self.assertEqual(cadena.tramos, [("bea", "madera", "piedra"), ("carlos", "piedra", "tela")])
+        self.assertEqual(self.enviar.call_args[0][0], "bea")
+
+    def test_solo_cuenta_el_cierre_con_el_id_del_tramo(self):
+        self.coordinador.step(self.state)
+        cadena = self.coordinador.cadena
+        # Mismo socio y recurso, pero de otro intercambio.
+        self.coordinador.observe("bea", _cierre("piedra", ["otro"]))
+        self.assertEqual(cadena.recibidos, set())
+        self.coordinador.observe("bea", _cierre("piedra", cadena.trade_ids))
+        self.assertEqual(cadena.recibidos, {0})
+
+    def test_la_oferta_del_socio_aporta_su_id(self):
+        self.coordinador.step(self.state)
+        cadena = self.coordinador.cadena
+        oferta = {
+            "tipo": "oferta",
+            "protocolo": "oferta",
+            "oferta": {"piedra": 1},
+            "pide": {"madera": 1},
+            "ids": ["suyo"],
+        }
+        self.coordinador.observe("bea", oferta)
+        self.assertEqual(cadena.ids_tramo["suyo"], 0)
+        self.coordinador.observe("bea", _cierre("piedra", ["suyo"]))
+        self.assertEqual(cadena.recibidos, {0})
+
+    def test_cuenta_el_ultimo_tramo_y_completa(self):
+        self.coordinador.step(self.state)
+        cadena = self.coordinador.cadena
+        self.coordinador.observe("bea", _cierre("piedra", cadena.trade_ids))
+        self.coordinador.step(self.state)
+        self.assertEqual(self.enviar.call_args[0][0], "carlos")
+        self.coordinador.observe("carlos", _cierre("tela", cadena.trade_ids[-1:]))
+        self.coordinador.step(self.state)
+        self.assertIsNone(self.coordinador.cadena)
+        self.assertEqual(self.coordinador.tramos_completados, 2)
+        self.assertEqual(self.coordinador.cadenas_completadas, 1)
+
+    def test_sin_respuesta_se_abandona(self):
+        self.coordinador.step(self.state)
+        self.ahora = 10.0
+        self.coordinador.step(self.state)
+        self.assertIsNone(self.coordinador.cadena)
+        self.assertEqual(self.coordinador.cadenas_abandonadas, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from src.dedup import Fingerprint, NearDuplicateDetector, simhash
+
+CUERPO = (
+    "Hola, soy bea. Te propongo intercambiar 2 piedra que me sobran por 1 madera "
+    "que necesito. Si te interesa, envíame la madera y te mando la piedra enseguida."
+)
+
+
+def _carta(cuerpo, asunto="Oferta de intercambio"):
+    return {"asunto": asunto, "cuerpo": cuerpo}
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_simhash_estable(self):
+        self.assertEqual(simhash(CUERPO), simhash(CUERPO))
+
+    def test_casi_identicas(self):
+        reenviada = Fingerprint.of(_carta(CUERPO.replace("enseguida", "en seguida")))
+        self.assertTrue(Fingerprint.of(_carta(CUERPO)).near(reenviada))
+
+    def test_otras_cantidades_no_son_la_misma_oferta(self):
+        original = Fingerprint.of(_carta(CUERPO))
+        self.assertFalse(original.near(Fingerprint.of(_carta(CUERPO.replace("2 piedra", "5 piedra")))))
+        self.assertFalse(original.near(Fingerprint.of(_carta(CUERPO.replace("2 piedra", "2 lana")))))
+
+    def test_texto_distinto(self):
+        otra = Fingerprint.of(_carta("Gracias, ya te he enviado los recursos que acordamos ayer."))
+        self.assertFalse(Fingerprint.of(_carta(CUERPO)).near(otra))
+
+
+class NearDuplicateDetectorTest(unittest.TestCase):
+    def test_solo_compara_con_el_mismo_remitente(self):
+        detector = NearDuplicateDetector()
+        huella = Fingerprint.of(_carta(CUERPO))
+        detector.new_pass()
+        detector.add("bea", huella, "c1", {"tipo": "oferta"})
+        self.assertEqual(detector.lookup("bea", huella).id_carta, "c1")
+        self.assertIsNone(detector.lookup("luis", huella))
+
+    def test_pasadas(self):
+        detector = NearDuplicateDetector()
+        huella = Fingerprint.of(_carta(CUERPO))
+        detector.new_pass()
+        detector.add("bea", huella, "c1", {"tipo": "oferta"})
+        self.assertTrue(detector.is_current_pass(detector.lookup("bea", huella)))
+        detector.new_pass()
+        self.assertFalse(detector.is_current_pass(detector.lookup("bea", huella)))
+
+    def test_memoria_acotada(self):
+        detector = NearDuplicateDetector(max_por_remitente=2, max_remitentes=2)
+        huellas = [Fingerprint.of(_carta(f"{CUERPO} {i} hierro")) for i in range(3)]
+        for i, huella in enumerate(huellas):
+            detector.add("bea", huella, f"c{i}", {})
+        self.assertIsNone(detector.lookup("bea", huellas[0]))
+        detector.add("luis", huellas[0], "l", {})
+        detector.add("eva", huellas[0], "e", {})
+        self.assertIsNone(detector.lookup("bea", huellas[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+from src.game_state import State
+
+
+def _carta(id_carta):
+    return id_carta, {"remi": "ana", "asunto": "Oferta", "cuerpo": "", "id": id_carta}
+
+
+# Orden de campos documentado en api_doc.txt: el buzón antes que Recursos/Objetivo.
+EVENTOS = [
+    ("Alias", ["yo"]),
+    ("Buzon", _carta("c1")),
+    ("Buzon", _carta("c2")),
+    ("Recursos", {"madera": 3}),
+    ("Objetivo", {"madera": 1, "piedra": 2}),
+]
+
+
+class StreamUpdateTest(unittest.TestCase):
+    def _estado(self):
+        return State(alias="", inventario={}, objetivo={}, needs={}, surplus={}, buzon={})
+
+    def test_entrega_las_cartas_antes_de_recursos_y_objetivo(self):
+        state = self._estado()
+        with mock.patch("src.game_state.api.stream_info", return_value=iter(EVENTOS)):
+            cartas = state.stream_update()
+            self.assertEqual(state.alias, "yo")
+            self.assertEqual(next(cartas)[0], "c1")
+            self.assertEqual(state.pendientes, {"Recursos", "Objetivo"})
+            self.assertEqual([c[0] for c in cartas], ["c2"])
+        self.assertEqual(state.pendientes, set())
+        self.assertEqual(state.needs, {"piedra": 2})
+        self.assertEqual(state.surplus, {"madera": 2})
+
+    def test_sin_alias_falla(self):
+        with mock.patch("src.game_state.api.stream_info", return_value=iter(EVENTOS[1:])):
+            with self.assertRaises(ValueError):
+                self._estado().stream_update()
+
+
+if __name__ == "__main__":
+    unittest.main()
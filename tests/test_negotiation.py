@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+from src.negotiation import NegotiationManager, counter_proposal
+
+
+class CounterProposalTest(unittest.TestCase):
+    def test_da_lo_que_piden_si_sobra(self):
+        self.assertEqual(
+            counter_proposal({"piedra": 2}, {"madera": 2}, {"piedra": 2}, {"madera": 1, "tela": 3}),
+            ({"madera": 1, "tela": 1}, {"piedra": 2}),
+        )
+
+    def test_sin_nada_util_no_hay_contrapropuesta(self):
+        self.assertIsNone(counter_proposal({"piedra": 2}, {"madera": 2}, {"tela": 1}, {"madera": 3}))
+
+
+class NegotiationManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.ahora = 0.0
+        self.manager = NegotiationManager(timeout=10, max_rondas=3, clock=lambda: self.ahora)
+        patcher = mock.patch("src.negotiation.api.send_letter")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _counter(self, remitente, surplus):
+        analisis = {"oferta": {"piedra": 1}, "pide": {"madera": 1}}
+        return self.manager.counter(remitente, analisis, {"piedra": 1}, surplus)
+
+    def test_contraoferta_reserva_lo_ofrecido(self):
+        self.assertTrue(self._counter("ana", {"madera": 1}))
+        self.assertEqual(self.manager.reserved(), {"madera": 1})
+        self.assertEqual(self.manager.available({"madera": 1, "tela": 2}), {"tela": 2})
+        # La reserva de "ana" sí está disponible para cumplir con "ana".
+        self.assertEqual(self.manager.available({"madera": 1}, excepto="ana"), {"madera": 1})
+
+    def test_segunda_negociacion_no_usa_lo_reservado(self):
+        self.assertTrue(self._counter("ana", {"madera": 1}))
+        self.assertFalse(self._counter("luis", {"madera": 1}))
+        self.assertNotIn("luis", self.manager.abiertas)
+
+    def test_nueva_ronda_sustituye_la_reserva(self):
+        self._counter("ana", {"madera": 1})
+        self.assertTrue(self._counter("ana", {"madera": 1}))
+        self.assertEqual(self.manager.reserved(), {"madera": 1})
+
+    def test_rechazo_acuerdo_y_caducidad_liberan(self):
+        self._counter("ana", {"madera": 2})
+        self.manager.release("ana")
+        self.assertEqual(self.manager.reserved(), {})
+
+        self._counter("luis", {"madera": 2})
+        self.manager.close("luis")
+        self.assertEqual(self.manager.reserved(), {})
+
+        self._counter("eva", {"madera": 2})
+        self.ahora = 11.0
+        self.assertEqual(self.manager.reserved(), {})
+        # Caducan "eva" y el hilo de "ana", que seguía abierto sin reserva.
+        self.assertEqual(self.manager.expiradas, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from src import optimizer
+from src.optimizer import MAX_EXACT_OFFERS, choose_offers
+
+
+def _aceptadas(decisiones):
+    return {uid for uid, d in decisiones.items() if d["decision"] == "aceptada"}
+
+
+def _cubierto(decisiones, needs):
+    resto = dict(needs)
+    for d in decisiones.values():
+        if d["decision"] == "aceptada":
+            for r, c in d["oferta"].items():
+                resto[r] = resto.get(r, 0) - min(c, resto.get(r, 0))
+    return sum(needs.values()) - sum(resto.values())
+
+
+class ChooseOffersTest(unittest.TestCase):
+    # La voraz acepta primero la oferta 0 y gasta una "x" que la 1 necesita;
+    # la exacta cubre las 3 necesidades pagando la "a" con "y".
+    NEEDS = {"a": 1, "b": 3}
+    SURPLUS = {"x": 2, "y": 3}
+    OFERTAS = {
+        "0": {"oferta": {"a": 2}, "pide": {"x": 1}},
+        "1": {"oferta": {"b": 3}, "pide": {"x": 3}},
+        "2": {"oferta": {"a": 2}, "pide": {"y": 1}},
+    }
+
+    def test_exacta_mejora_a_la_voraz(self):
+        decisiones = choose_offers(self.OFERTAS, self.NEEDS, self.SURPLUS)
+        self.assertEqual(_aceptadas(decisiones), {"1", "2"})
+        # Aceptación parcial a escala: 2 b por 2 x (solo sobran 2 x).
+        self.assertEqual(decisiones["1"]["oferta"], {"b": 2})
+        self.assertEqual(decisiones["1"]["pide"], {"x": 2})
+        self.assertEqual(_cubierto(decisiones, self.NEEDS), 3)
+
+        with mock.patch.object(optimizer, "MAX_EXACT_OFFERS", 0):
+            voraz = choose_offers(self.OFERTAS, self.NEEDS, self.SURPLUS)
+        self.assertIn("0", _aceptadas(voraz))
+        self.assertEqual(_cubierto(voraz, self.NEEDS), 2)
+
+    def test_no_envia_mas_del_excedente(self):
+        decisiones = choose_offers(self.OFERTAS, self.NEEDS, self.SURPLUS)
+        enviado = {}
+        for d in decisiones.values():
+            if d["decision"] == "aceptada":
+                for r, c in d["pide"].items():
+                    enviado[r] = enviado.get(r, 0) + c
+        for r, c in enviado.items():
+            self.assertLessEqual(c, self.SURPLUS[r])
+
+    def test_rechaza_si_piden_lo_que_necesitamos(self):
+        decisiones = choose_offers(
+            {"0": {"oferta": {"a": 1}, "pide": {"b": 1}}}, {"a": 1, "b": 1}, {"x": 1}
+        )
+        self.assertEqual(decisiones["0"]["decision"], "rechazada")
+
+    def test_por_encima_del_limite_usa_la_voraz(self):
+        ofertas = {
+            str(i): {"oferta": {"a": 1}, "pide": {"x": 1}} for i in range(MAX_EXACT_OFFERS + 1)
+        }
+        with mock.patch.object(optimizer, "_solve_exact", wraps=optimizer._solve_exact) as exacta, \
+                mock.patch.object(optimizer, "_solve_greedy", wraps=optimizer._solve_greedy) as voraz:
+            decisiones = choose_offers(ofertas, {"a": 3}, {"x": 10})
+        exacta.assert_not_called()
+        voraz.assert_called_once()
+        self.assertEqual(len(_aceptadas(decisiones)), 3)
+
+    def test_en_el_limite_usa_la_exacta(self):
+        ofertas = {str(i): {"oferta": {"a": 1}, "pide": {"x": 1}} for i in range(MAX_EXACT_OFFERS)}
+        with mock.patch.object(optimizer, "_solve_greedy", wraps=optimizer._solve_greedy) as voraz:
+            choose_offers(ofertas, {"a": 3}, {"x": 10})
+        voraz.assert_not_called()
+
+    def test_limite_de_estados_usa_la_voraz(self):
+        with mock.patch.object(optimizer, "MAX_EXACT_STATES", 1), \
+                mock.patch.object(optimizer, "_solve_greedy", wraps=optimizer._solve_greedy) as voraz:
+            decisiones = choose_offers(self.OFERTAS, self.NEEDS, self.SURPLUS)
+        voraz.assert_called_once()
+        self.assertEqual(set(decisiones), set(self.OFERTAS))
+
+    def test_ofertas_sin_opciones_no_recursan(self):
+        ofertas = {str(i): {"oferta": {"z": 1}, "pide": {"x": 1}} for i in range(3000)}
+        ofertas["util"] = {"oferta": {"a": 1}, "pide": {"x": 1}}
+        decisiones = choose_offers(ofertas, {"a": 1}, {"x": 1})
+        self.assertEqual(_aceptadas(decisiones), {"util"})
+
+
+if __name__ == "__main__":
+    unittest.main()
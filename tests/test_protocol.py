@@ -0,0 +1,50 @@
+import unittest
+
+from src import protocol
+
+
+class ProtocolTest(unittest.TestCase):
+    def test_ida_y_vuelta(self):
+        cuerpo = protocol.append_block(
+            "Hola, te propongo un cambio.", "oferta", {"madera": 2}, {"piedra": 1}, ids=["abc"]
+        )
+        self.assertEqual(
+            protocol.decode(cuerpo),
+            {"t": "oferta", "ofrece": {"madera": 2}, "pide": {"piedra": 1}, "enviado": {}, "ids": ["abc"]},
+        )
+        self.assertEqual(protocol.strip_block(cuerpo), "Hola, te propongo un cambio.")
+
+    def test_cierre_no_pide_nada(self):
+        mensaje = protocol.decode(protocol.encode("cierre", pide={"piedra": 1}, enviado={"madera": 1}))
+        analisis = protocol.to_analysis(mensaje)
+        self.assertEqual(analisis["tipo"], "confirmacion")
+        self.assertEqual(analisis["pide"], {})
+        self.assertEqual(analisis["recursos_recibidos"], {"madera": 1})
+
+    def test_tipo_desconocido_no_se_codifica(self):
+        with self.assertRaises(ValueError):
+            protocol.encode("regalo")
+
+    def test_rechaza_bloques_invalidos(self):
+        invalidos = [
+            "sin bloque",
+            f"{protocol.PREFIX} {{no es json}}",
+            f'{protocol.PREFIX} {{"v":2,"t":"oferta"}}',
+            f'{protocol.PREFIX} {{"v":1,"t":"regalo"}}',
+            f'{protocol.PREFIX} {{"v":1,"t":"oferta","ofrece":{{"madera":-1}}}}',
+            f'{protocol.PREFIX} {{"v":1,"t":"oferta","ofrece":{{"madera":true}}}}',
+            f'{protocol.PREFIX} {{"v":1,"t":"oferta","ofrece":["madera"]}}',
+            f'{protocol.PREFIX} {{"v":1,"t":"oferta","ids":[1]}}',
+            # El bloque tiene que ir en su propia línea.
+            f'texto {protocol.PREFIX} {{"v":1,"t":"oferta"}}',
+        ]
+        for cuerpo in invalidos:
+            with self.subTest(cuerpo=cuerpo):
+                self.assertIsNone(protocol.decode(cuerpo))
+
+    def test_strip_block_sin_bloque_no_cambia_el_cuerpo(self):
+        self.assertEqual(protocol.strip_block("Hola  \n"), "Hola  \n")
+
+
+if __name__ == "__main__":
+    unittest.main()